@@ -0,0 +1,229 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import dataset_manifest # Partitions of the folder (falls back to glob without a manifest)
+
+# --- Configuration ---
+TEMP_OSM_DATA_FOLDER = "temp_osm_data" # Folder with raw OSM CSV files (output of Phase 1)
+LOGS_FOLDER = "logs" # Folder for log files
+DEDUP_REPORT_FILE = os.path.join(LOGS_FOLDER, "dedup_report.json") # Summary of removed duplicates
+RAW_FILE_PATTERN = "ev_chargers_osm_raw_*.csv"
+
+# OSM stores coordinates with 7 decimal places, so rounding to 7 places only merges identical positions
+COORDINATE_PRECISION = 7
+
+# If True, distinct OSM objects sitting at exactly the same coordinates are treated as duplicates
+# (typically the same charger mapped twice as a node and as a way, or imported twice)
+DROP_COORDINATE_DUPLICATES = True
+
+# Element type assumed for raw files written before the 'type' column existed
+DEFAULT_OSM_TYPE = "node"
+
+logger = logging.getLogger("Dedup_OSM_data")
+
+
+def _compact_hash(*parts):
+    """
+    Returns a 64-bit integer hash of the given string parts.
+    Storing 8-byte integers instead of full keys keeps the global 'seen' sets small,
+    so memory grows only with the number of unique chargers, never with file sizes.
+    """
+    digest = hashlib.blake2b("|".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def detect_delimiter(filepath):
+    """
+    Detects whether a CSV file uses ',' or ';' by looking at its header line only.
+    """
+    with open(filepath, 'r', newline='', encoding='utf-8') as infile:
+        header_line = infile.readline()
+    return ';' if header_line.count(';') > header_line.count(',') else ','
+
+
+class OsmDeduplicator:
+    """
+    Streaming deduplicator for raw OSM charger files.
+
+    Keeps global state across files, so an element that appears in several grid squares,
+    several country parts or several countries is written only once (first occurrence wins).
+    Files are processed row by row and rewritten atomically, so only the compact hash sets
+    are held in memory.
+    """
+    def __init__(self, drop_coordinate_duplicates=DROP_COORDINATE_DUPLICATES, precision=COORDINATE_PRECISION):
+        self.drop_coordinate_duplicates = drop_coordinate_duplicates
+        self.precision = precision
+        self.seen_ids = set()
+        self.seen_coordinates = set()
+        self.rows_in = 0
+        self.rows_out = 0
+        self.id_duplicates = 0
+        self.coordinate_duplicates = 0
+        self.file_stats = []
+
+    def _coordinate_hash(self, lat, lon):
+        """
+        Returns the hash of rounded coordinates, or None if the coordinates are not numeric.
+        """
+        try:
+            lat_val = round(float(lat), self.precision)
+            lon_val = round(float(lon), self.precision)
+        except (ValueError, TypeError):
+            return None
+        return _compact_hash(f"{lat_val:.{self.precision}f}", f"{lon_val:.{self.precision}f}")
+
+    def is_duplicate(self, row):
+        """
+        Checks a single row against everything seen so far and registers it if it is new.
+        Returns None for a new row, or the duplicate class ('id' or 'coordinates').
+        """
+        osm_type = row.get('type') or DEFAULT_OSM_TYPE
+        id_hash = _compact_hash(osm_type, str(row.get('id')))
+        if id_hash in self.seen_ids:
+            return 'id'
+
+        coordinate_hash = None
+        if self.drop_coordinate_duplicates:
+            coordinate_hash = self._coordinate_hash(row.get('lat'), row.get('lon'))
+            if coordinate_hash is not None and coordinate_hash in self.seen_coordinates:
+                # Register the id as well, so later copies of this object are counted as id duplicates
+                self.seen_ids.add(id_hash)
+                return 'coordinates'
+
+        self.seen_ids.add(id_hash)
+        if coordinate_hash is not None:
+            self.seen_coordinates.add(coordinate_hash)
+        return None
+
+    def dedup_file(self, filepath):
+        """
+        Removes duplicate rows from one raw CSV file in place.
+        The file is streamed into a temporary file which then atomically replaces the original,
+        so a crash never leaves a truncated file behind.
+        Returns a dictionary with per-file statistics.
+        """
+        delimiter = detect_delimiter(filepath)
+        temp_filepath = filepath + ".dedup.tmp"
+        rows_in = rows_out = id_duplicates = coordinate_duplicates = 0
+
+        with open(filepath, 'r', newline='', encoding='utf-8') as infile, \
+             open(temp_filepath, 'w', newline='', encoding='utf-8') as outfile:
+            reader = csv.DictReader(infile, delimiter=delimiter)
+            writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames or [], delimiter=delimiter)
+            writer.writeheader()
+            for row in reader:
+                rows_in += 1
+                duplicate_class = self.is_duplicate(row)
+                if duplicate_class == 'id':
+                    id_duplicates += 1
+                elif duplicate_class == 'coordinates':
+                    coordinate_duplicates += 1
+                else:
+                    writer.writerow(row)
+                    rows_out += 1
+
+        if rows_out == rows_in:
+            # Nothing removed, keep the original file untouched
+            os.remove(temp_filepath)
+        else:
+            os.replace(temp_filepath, filepath)
+
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.id_duplicates += id_duplicates
+        self.coordinate_duplicates += coordinate_duplicates
+
+        file_stat = {
+            'file': os.path.basename(filepath),
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+            'id_duplicates': id_duplicates,
+            'coordinate_duplicates': coordinate_duplicates,
+        }
+        self.file_stats.append(file_stat)
+        return file_stat
+
+    def report(self):
+        """
+        Returns a summary of the deduplication with duplicate rates.
+        """
+        removed = self.id_duplicates + self.coordinate_duplicates
+        return {
+            'files': len(self.file_stats),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'id_duplicates': self.id_duplicates,
+            'coordinate_duplicates': self.coordinate_duplicates,
+            'duplicate_rate': round(removed / self.rows_in, 4) if self.rows_in else 0.0,
+            'per_file': self.file_stats,
+        }
+
+
+def dedup_file_order(filepaths):
+    """
+    Returns the raw files in the order they are deduplicated: sorted by file name, so repeated runs
+    keep the same first occurrence. The parts of one country sort next to each other, which lets
+    the download pipeline deduplicate whole countries in the same order (see Scrap_API_Oper_pass_geo.py).
+    """
+    return sorted(filepaths, key=os.path.basename)
+
+
+def dedup_raw_files(temp_folder=TEMP_OSM_DATA_FOLDER, report_file=DEDUP_REPORT_FILE,
+                    drop_coordinate_duplicates=DROP_COORDINATE_DUPLICATES):
+    """
+    Deduplicates all raw OSM files in the folder across files.
+    The files are taken from the dataset manifest (dataset_manifest.resolve_partitions)
+    and processed in dedup_file_order.
+    Returns the report dictionary.
+    """
+    partitions = dataset_manifest.resolve_partitions(temp_folder, RAW_FILE_PATTERN)
+    raw_files = dedup_file_order(partition['path'] for partition in partitions)
+    if not raw_files:
+        logger.warning(f"No raw OSM files found in '{temp_folder}'. Nothing to deduplicate.")
+        return None
+
+    logger.info(f"Deduplicating {len(raw_files)} raw OSM files in '{temp_folder}'...")
+    start_time = time.time()
+    deduplicator = OsmDeduplicator(drop_coordinate_duplicates=drop_coordinate_duplicates)
+    for filepath in raw_files:
+        try:
+            file_stat = deduplicator.dedup_file(filepath)
+            removed = file_stat['id_duplicates'] + file_stat['coordinate_duplicates']
+            if removed:
+                logger.info(f"  {file_stat['file']}: removed {removed} duplicates "
+                      f"({file_stat['id_duplicates']} by id, {file_stat['coordinate_duplicates']} by coordinates).")
+        except (IOError, csv.Error) as e:
+            logger.error(f"  Error deduplicating '{filepath}': {e}")
+
+    report = deduplicator.report()
+    logger.info(f"Deduplication finished in {time.time() - start_time:.2f} seconds: "
+          f"{report['rows_in']} rows in, {report['rows_out']} rows out, "
+          f"duplicate rate {report['duplicate_rate'] * 100:.2f} % "
+          f"({report['id_duplicates']} by id, {report['coordinate_duplicates']} by coordinates).")
+
+    if report_file:
+        save_dedup_report(report, report_file)
+    return report
+
+
+def save_dedup_report(report, report_file=DEDUP_REPORT_FILE):
+    """
+    Saves the deduplication report as JSON.
+    """
+    try:
+        os.makedirs(os.path.dirname(report_file) or ".", exist_ok=True)
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        logger.info(f"Deduplication report saved to '{report_file}'.")
+    except IOError as e:
+        logger.error(f"Error saving deduplication report to {report_file}: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    folder = sys.argv[1] if len(sys.argv) > 1 else TEMP_OSM_DATA_FOLDER
+    dedup_raw_files(folder)
@@ -160,28 +160,510 @@
 # print("Hotovo! Upravené soubory jsou v:", output_folder)
 
 #################//////////////////  4  /////////////////###########################################
-# Seřadí soubory podle názvu (pokud chceš, můžeme změnit na jiné třídění).
-# Zachová původní název souboru (např. openchargemap_AD).
-# Přidá k němu číslo v hranatých závorkách ([1], [2], …).
-# Zachová příponu .csv.
+# Zaregistruje CSV soubory ve složce do manifestu datasetu (dataset_manifest.json) místo přejmenování.
+# Každý soubor dostane stabilní ID podle země a obsahu (hash) - názvy souborů se nemění.
+# Opakované spuštění nic nemění, nový soubor dostane ID jen sám a ostatní ID zůstanou stejná.
+# (Dřívější přejmenování na nazev[1].csv, nazev[2].csv… posouvalo čísla při každém novém souboru.)
 #################/////////////////////////////////////###########################################
 
 import os
-import glob
+import csv
+import json
+import re
+import time
+import shutil
+import tempfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from Dedup_OSM_data import detect_delimiter
+import dataset_manifest
 
 # cesta ke složce s CSV soubory
 cesta = r"C:\Users\mlaut\Documents\Git\Engeto_project\Power_BI\Sources\openchargemap_country"
 
-# načteme všechny CSV soubory (setřídíme podle názvu)
-soubory = sorted(glob.glob(os.path.join(cesta, "*.csv")))
+def register_partitions(cesta, pattern="*.csv"):
+    # zaregistrujeme nové a změněné soubory (nezměněné se znovu nečtou)
+    oddily = dataset_manifest.resolve_partitions(cesta, pattern)
+    for oddil in oddily:
+        print(f"{oddil['partition_id']}: {oddil['file']}")
+    print(f"Hotovo! 🎉 V manifestu je {len(oddily)} souborů.")
 
-# projdeme soubory a přejmenujeme je
-for idx, soubor in enumerate(soubory, start=1):
-    nazev = os.path.basename(soubor)
-    nazev_bez_pripony, pripona = os.path.splitext(nazev)
-    nove_jmeno = f"{nazev_bez_pripony}[{idx}]{pripona}"
-    nova_cesta = os.path.join(cesta, nove_jmeno)
-    os.rename(soubor, nova_cesta)
-    print(f"Přejmenováno: {nazev} -> {nove_jmeno}")
 
-print("Hotovo! 🎉")
+#################//////////////////  5  /////////////////###########################################
+# Spojí všechny geokódované CSV (ev_chargers_geocoded_*.csv) do jednoho výstupu (CSV nebo Parquet).
+# Každý soubor se čte jen jednou a řádek po řádku, takže paměť nezávisí na velikosti dat.
+# Sloupce se srovnají podle ALL_FIELDNAMES (chybějící = 'N/A', přebytečné se zahodí).
+# Soubory lze zpracovat paralelně - výsledky se ale zapisují vždy v pořadí vstupních souborů.
+# Použití: python Merge_CSV.py merge <vstupni_slozka> <vystupni_soubor.csv|.parquet> [--workers N]
+#################/////////////////////////////////////###########################################
+
+# Schéma výstupu - stejné jako ALL_FIELDNAMES v Scrap_API_Oper_pass_geo.py a geo_coder.py
+ALL_FIELDNAMES = [
+    'id', 'type', 'lat', 'lon', 'amenity',
+    'city', 'state', 'country', 'scraped_country_code', 'scraped_country_name',
+    'authentication:nfc', 'capacity', 'capacity:car', 'motorcar', 'operator',
+    'operator:wikidata', 'socket:schuko', 'socket:schuko:current',
+    'socket:schuko:voltage', 'socket:type2', 'socket:type2:current',
+    'socket:type2:voltage', 'ref', 'addr:housenumber', 'addr:street',
+    'addr:postcode', 'brand', 'charge', 'opening_hours', 'fee'
+]
+
+MERGE_PATTERN = "ev_chargers_geocoded_*.csv" # které soubory ve složce spojit
+PARQUET_BLOCK_SIZE = 16 * 1024 * 1024 # velikost bloku (v bajtech) při převodu do Parquet = velikost jedné row group
+
+def normalize_csv_file(filepath, part_filepath, fieldnames=ALL_FIELDNAMES):
+    """
+    Přečte jeden CSV soubor (oddělovač ',' nebo ';') řádek po řádku a zapíše ho
+    do dočasného souboru bez hlavičky se sloupci přesně podle fieldnames.
+    Vrací počet zapsaných řádků.
+    """
+    delimiter = detect_delimiter(filepath)
+    row_count = 0
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as infile, \
+         open(part_filepath, 'w', newline='', encoding='utf-8') as outfile:
+        reader = csv.DictReader(infile, delimiter=delimiter, restval='N/A')
+        reader.fieldnames = [nazev.strip() for nazev in reader.fieldnames or []] # očistí mezery v hlavičce
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames, restval='N/A', extrasaction='ignore')
+        for row in reader:
+            writer.writerow(row)
+            row_count += 1
+    return row_count
+
+class CsvSink:
+    """
+    Výstup do jednoho CSV: hlavička + postupně připojované normalizované části.
+    """
+    def __init__(self, filepath, fieldnames):
+        self.file = open(filepath, 'w', newline='', encoding='utf-8')
+        csv.writer(self.file).writerow(fieldnames)
+
+    def append_part(self, part_filepath):
+        with open(part_filepath, 'r', newline='', encoding='utf-8') as part:
+            shutil.copyfileobj(part, self.file, 1024 * 1024)
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    """
+    Výstup do jednoho Parquet souboru. Potřebuje balíček pyarrow.
+    Bez column_types jsou všechny sloupce text; s column_types ('int' / 'float' / 'string')
+    mají sloupce skutečné typy a prázdné hodnoty se ukládají jako null.
+    Části se čtou po blocích, takže v paměti je vždy jen jeden blok.
+    """
+    def __init__(self, filepath, fieldnames, column_types=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pa_csv
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Pro výstup do Parquet je potřeba balíček pyarrow (pip install pyarrow).")
+        self.pa, self.pa_csv = pa, pa_csv
+        self.fieldnames = fieldnames
+        arrow_types = {'int': pa.int64(), 'float': pa.float64()}
+        self.column_types = {nazev: arrow_types.get((column_types or {}).get(nazev), pa.string()) for nazev in fieldnames}
+        self.null_values = [''] if column_types else []
+        self.schema = pa.schema(list(self.column_types.items()))
+        self.writer = pq.ParquetWriter(filepath, self.schema)
+
+    def append_part(self, part_filepath):
+        reader = self.pa_csv.open_csv(
+            part_filepath,
+            read_options=self.pa_csv.ReadOptions(column_names=self.fieldnames, block_size=PARQUET_BLOCK_SIZE),
+            convert_options=self.pa_csv.ConvertOptions(column_types=self.column_types, null_values=self.null_values,
+                                                       strings_can_be_null=bool(self.null_values)))
+        for batch in reader:
+            self.writer.write_table(self.pa.Table.from_batches([batch], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def merge_csv_files(input_files, output_filepath, output_format=None, workers=1, fieldnames=ALL_FIELDNAMES):
+    """
+    Spojí input_files do output_filepath s konstantní pamětí.
+    output_format je 'csv' nebo 'parquet' (výchozí podle přípony výstupu).
+    S workers > 1 se soubory normalizují paralelně do dočasných částí, které se připojují
+    ve stejném pořadí jako input_files (najednou rozpracováno nejvýš workers * 2 souborů).
+    Výstup se zapisuje do .tmp souboru a až na konci se přejmenuje, takže nikdy nezůstane napůl zapsaný.
+    Vrací (počet řádků, seznam souborů, které se nepodařilo načíst).
+    """
+    job_args = [(fieldnames,)] * len(input_files)
+    return ordered_merge(input_files, output_filepath, fieldnames, normalize_csv_file, job_args, output_format, workers)
+
+def ordered_merge(input_files, output_filepath, fieldnames, job, job_args, output_format=None, workers=1, column_types=None,
+                  reports=None):
+    """
+    Společná část bloků 5 a 7: job(soubor, dočasná_část, *job_args[idx]) převede jeden vstupní soubor
+    na část bez hlavičky a vrátí počet řádků, nebo dvojici (počet řádků, hlášení); hlášení se uloží
+    do slovníku reports pod názvem souboru. Části se připojují do výstupu v pořadí input_files.
+    column_types (sloupec -> 'int' / 'float' / 'string') se použijí jen pro typy v Parquet.
+    """
+    if output_format is None:
+        output_format = 'parquet' if output_filepath.lower().endswith('.parquet') else 'csv'
+    output_folder = os.path.dirname(os.path.abspath(output_filepath))
+    os.makedirs(output_folder, exist_ok=True)
+    temp_output_filepath = output_filepath + ".tmp"
+    if output_format == 'parquet':
+        sink = ParquetSink(temp_output_filepath, fieldnames, column_types)
+    else:
+        sink = CsvSink(temp_output_filepath, fieldnames)
+    temp_folder = tempfile.mkdtemp(prefix="merge_parts_", dir=output_folder)
+    part_filepaths = [os.path.join(temp_folder, f"{idx:06d}.csv") for idx in range(len(input_files))]
+
+    total_rows = 0
+    failed_files = []
+
+    def commit(idx, row_count):
+        # připojí hotovou část do výstupu a smaže ji
+        nonlocal total_rows
+        if isinstance(row_count, tuple):
+            row_count, report = row_count
+            if reports is not None:
+                reports[input_files[idx]] = report
+        if row_count is None:
+            failed_files.append(input_files[idx])
+        elif row_count > 0:
+            sink.append_part(part_filepaths[idx])
+            total_rows += row_count
+            print(f"Připojeno: {os.path.basename(input_files[idx])} ({row_count} řádků)")
+        if os.path.exists(part_filepaths[idx]):
+            os.remove(part_filepaths[idx])
+
+    try:
+        if workers <= 1:
+            for idx, soubor in enumerate(input_files):
+                try:
+                    row_count = job(soubor, part_filepaths[idx], *job_args[idx])
+                except (IOError, csv.Error, UnicodeDecodeError) as e:
+                    print(f"Chyba při načítání {soubor}: {e}")
+                    row_count = None
+                commit(idx, row_count)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                finished = {} # idx -> počet řádků (None = chyba) u částí, které čekají na připojení
+                next_to_submit = next_to_commit = 0
+                while next_to_commit < len(input_files):
+                    # okno rozpracovaných souborů drží i dočasné části na disku v rozumné velikosti
+                    while next_to_submit < len(input_files) and next_to_submit - next_to_commit < workers * 2:
+                        future = executor.submit(job, input_files[next_to_submit], part_filepaths[next_to_submit],
+                                                 *job_args[next_to_submit])
+                        futures[future] = next_to_submit
+                        next_to_submit += 1
+                    done_futures, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                    for future in done_futures:
+                        idx = futures.pop(future)
+                        try:
+                            finished[idx] = future.result()
+                        except Exception as e:
+                            print(f"Chyba při načítání {input_files[idx]}: {e}")
+                            finished[idx] = None
+                    # připojujeme jen v pořadí vstupních souborů
+                    while next_to_commit in finished:
+                        commit(next_to_commit, finished.pop(next_to_commit))
+                        next_to_commit += 1
+        sink.close()
+        os.replace(temp_output_filepath, output_filepath)
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        if os.path.exists(temp_output_filepath):
+            sink.close()
+            os.remove(temp_output_filepath)
+
+    return total_rows, failed_files
+
+
+#################//////////////////  6  /////////////////###########################################
+# Rychlá kontrola struktury CSV souborů (náhrada bloku 1).
+# Čte jen první řádek (hlavičku) každého souboru - paralelně ve vláknech, takže i tisíce souborů
+# zvládne za zlomek sekundy. Volitelně načte prvních N řádků a odhadne datové typy sloupců.
+# Vypíše chybějící / přebytečné sloupce proti referenčnímu souboru (nebo proti sjednocení všech sloupců)
+# a uloží mapu schémat do JSON.
+# Použití: python Merge_CSV.py schema <slozka> [--reference soubor.csv] [--sample-rows N] [--output schema.json]
+#################/////////////////////////////////////###########################################
+
+SCHEMA_SCAN_WORKERS = 32 # vlákna pro čtení hlaviček (čekání na disk, ne na CPU)
+# Hodnoty, které se při odhadu typu ignorují; v číselných sloupcích znamenají prázdnou hodnotu (null),
+# v textových sloupcích zůstávají beze změny (např. kód země "NA" = Namibie)
+NULL_VALUES = {'', 'N/A', 'NA', 'null', 'None', 'nan'}
+# Celé číslo bez úvodních nul ("01234" je kód / PSČ, zůstane textem)
+INT_PATTERN = re.compile(r'^[+-]?(?:0|[1-9]\d*)$')
+# Desetinné číslo s tečkou nebo čárkou, volitelně s exponentem ("1.5", "-0,25", "1e-3"); bez úvodních nul
+FLOAT_PATTERN = re.compile(r'^[+-]?(?:(?:0|[1-9]\d*)(?:[.,]\d*)?|[.,]\d+)(?:[eE][+-]?\d+)?$')
+
+def infer_value_type(hodnota):
+    """
+    Vrací typ jedné textové hodnoty: 'empty', 'int', 'float' nebo 'string'.
+    """
+    hodnota = hodnota.strip()
+    if hodnota in NULL_VALUES:
+        return 'empty'
+    if INT_PATTERN.match(hodnota):
+        return 'int'
+    if FLOAT_PATTERN.match(hodnota):
+        return 'float'
+    return 'string'
+
+def combine_types(typ_a, typ_b):
+    """
+    Sloučí dva odhadnuté typy sloupce (int + float = float, cokoli + string = string).
+    """
+    if typ_a == typ_b or typ_b == 'empty':
+        return typ_a
+    if typ_a == 'empty':
+        return typ_b
+    if {typ_a, typ_b} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+def read_csv_header(filepath, sample_rows=0):
+    """
+    Načte jen hlavičku CSV souboru (a volitelně sample_rows řádků pro odhad typů, None = všechny řádky).
+    Vrací slovník s oddělovačem, seznamem sloupců a odhadnutými typy.
+    """
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as infile:
+        header_line = infile.readline()
+        delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+        sloupce = [nazev.strip() for nazev in next(csv.reader([header_line], delimiter=delimiter), [])]
+        typy = dict.fromkeys(sloupce, 'empty')
+        if sample_rows != 0:
+            reader = csv.reader(infile, delimiter=delimiter)
+            for idx, row in enumerate(reader):
+                if sample_rows is not None and idx >= sample_rows:
+                    break
+                for nazev, hodnota in zip(sloupce, row):
+                    typy[nazev] = combine_types(typy[nazev], infer_value_type(hodnota))
+    return {'delimiter': delimiter, 'columns': sloupce, 'dtypes': typy if sample_rows != 0 else {}}
+
+def scan_csv_schemas(soubory, reference=None, sample_rows=0, workers=SCHEMA_SCAN_WORKERS):
+    """
+    Paralelně načte hlavičky všech souborů a porovná je.
+    reference je název (basename) referenčního souboru; bez něj se porovnává se sjednocením všech sloupců.
+    Vrací mapu schémat (slovník připravený pro uložení do JSON).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hlavicky = list(executor.map(lambda soubor: read_csv_header(soubor, sample_rows), soubory))
+
+    files = {}
+    union = [] # sjednocení sloupců v pořadí prvního výskytu
+    for soubor, hlavicka in zip(soubory, hlavicky):
+        files[os.path.basename(soubor)] = hlavicka
+        for nazev in hlavicka['columns']:
+            if nazev not in union:
+                union.append(nazev)
+    intersection = [nazev for nazev in union if all(nazev in h['columns'] for h in hlavicky)]
+
+    if reference is not None and reference not in files:
+        raise ValueError(f"Referenční soubor {reference} není mezi načtenými soubory.")
+    referencni_sloupce = files[reference]['columns'] if reference else union
+
+    # skupiny souborů se stejnou strukturou (stejné sloupce ve stejném pořadí)
+    schemas = {}
+    for nazev, hlavicka in files.items():
+        hlavicka['missing'] = [s for s in referencni_sloupce if s not in hlavicka['columns']]
+        hlavicka['extra'] = [s for s in hlavicka['columns'] if s not in referencni_sloupce]
+        schemas.setdefault(tuple(hlavicka['columns']), []).append(nazev)
+
+    # odhad typů přes všechny soubory
+    dtypes = {}
+    for hlavicka in hlavicky:
+        for nazev, typ in hlavicka['dtypes'].items():
+            dtypes[nazev] = combine_types(dtypes.get(nazev, 'empty'), typ)
+
+    return {
+        'reference': reference or 'union',
+        'reference_columns': referencni_sloupce,
+        'union': union,
+        'intersection': intersection,
+        'dtypes': dtypes,
+        'schemas': [{'columns': list(sloupce), 'files': nazvy} for sloupce, nazvy in schemas.items()],
+        'files': files,
+    }
+
+def print_schema_report(schema_map):
+    """
+    Vypíše rozdíly ve struktuře souborů (jako blok 1).
+    """
+    print(f"\nNalezeno {len(schema_map['schemas'])} různých struktur sloupců v {len(schema_map['files'])} souborech.")
+    print(f"Sjednocení: {len(schema_map['union'])} sloupců, průnik (ve všech souborech): {len(schema_map['intersection'])} sloupců.")
+    odlisne = {nazev: h for nazev, h in schema_map['files'].items() if h['missing'] or h['extra']}
+    if not odlisne:
+        print(f"\nVšechny soubory mají stejnou strukturu sloupců (reference: {schema_map['reference']}).")
+        return
+    print(f"\nPozor! {len(odlisne)} souborů má jinou strukturu sloupců než reference ({schema_map['reference']}):")
+    for nazev, hlavicka in sorted(odlisne.items()):
+        print(f"\n{nazev}:")
+        if hlavicka['missing']:
+            print(f"  - Chybí sloupce: {hlavicka['missing']}")
+        if hlavicka['extra']:
+            print(f"  - Přebytečné sloupce: {hlavicka['extra']}")
+
+
+#################//////////////////  7  /////////////////###########################################
+# Spojení souborů s různou strukturou bez ztráty dat (náhrada bloků 2 a 3).
+# Místo průniku sloupců se ze samotných hlaviček (blok 6) spočítá sjednocení všech sloupců.
+# Sloupce každého souboru se jednou namapují podle pozice do sjednoceného schématu,
+# chybějící sloupce zůstanou prázdné (null). Typy se odhadnou ze všech řádků; textové hodnoty se nemění,
+# hodnota, která typu sloupce neodpovídá, zůstane jako text a nahlásí se (nic se nezahodí).
+# Každý soubor se čte jen jednou, paralelně, a výsledek se zapíše do jednoho výstupu (CSV nebo Parquet).
+# Použití: python Merge_CSV.py union <slozka> <vystupni_soubor.csv|.parquet> [--sample-rows N] [--workers N]
+#################/////////////////////////////////////###########################################
+
+def coerce_value(hodnota, typ):
+    """
+    Připraví textovou hodnotu pro sloupec daného typu, beze ztráty informace.
+    Textové sloupce se nemění. V číselných sloupcích se hodnoty z NULL_VALUES stanou prázdnými (null)
+    a desetinná čárka se nahradí tečkou. Vrací (hodnota, True), nebo (původní hodnota, False),
+    pokud hodnota typu sloupce neodpovídá - nikdy ji nezahodí.
+    """
+    if typ not in ('int', 'float'):
+        return hodnota, True
+    cista = hodnota.strip()
+    if cista in NULL_VALUES:
+        return '', True
+    if INT_PATTERN.match(cista):
+        return cista, True
+    if typ == 'float' and FLOAT_PATTERN.match(cista):
+        return cista.replace(',', '.'), True
+    return hodnota, False
+
+def unify_csv_file(filepath, part_filepath, delimiter, column_positions, column_types):
+    """
+    Zapíše jeden soubor do dočasné části ve sjednoceném schématu.
+    column_positions obsahuje pro každý sloupec sjednoceného schématu jeho pozici v tomto souboru
+    (nebo None, pokud ho soubor nemá), column_types jeho typ.
+    Vrací (počet řádků, {index sloupce: počet hodnot, které neodpovídaly typu a zůstaly jako text}).
+    """
+    row_count = 0
+    mismatches = {}
+    with open(filepath, 'r', newline='', encoding='utf-8-sig') as infile, \
+         open(part_filepath, 'w', newline='', encoding='utf-8') as outfile:
+        reader = csv.reader(infile, delimiter=delimiter)
+        writer = csv.writer(outfile)
+        next(reader, None) # hlavička
+        for row in reader:
+            if not row:
+                continue
+            out_row = []
+            for idx, (pozice, typ) in enumerate(zip(column_positions, column_types)):
+                if pozice is None or pozice >= len(row):
+                    out_row.append('')
+                    continue
+                hodnota, ok = coerce_value(row[pozice], typ)
+                if not ok:
+                    mismatches[idx] = mismatches.get(idx, 0) + 1
+                out_row.append(hodnota)
+            writer.writerow(out_row)
+            row_count += 1
+    return row_count, mismatches
+
+def merge_union_schema(soubory, output_filepath, output_format=None, workers=1, sample_rows=None):
+    """
+    Spojí soubory do jednoho výstupu se sjednocením všech sloupců.
+    Typy sloupců se odhadnou ze všech řádků (sample_rows=None), z prvních sample_rows řádků každého souboru,
+    nebo se nepoužijí (0 = vše jako text). Do Parquet se typy odhadují vždy ze všech řádků, aby každá
+    hodnota odpovídala typu sloupce. Ve výstupu CSV zůstanou hodnoty, které odhadu z ukázky neodpovídají,
+    jako text a sloupec se v mapě schémat rozšíří na 'string' (viz schema_map['widened']).
+    Vrací (počet řádků, seznam souborů, které se nepodařilo načíst, mapa schémat).
+    """
+    if output_format is None:
+        output_format = 'parquet' if output_filepath.lower().endswith('.parquet') else 'csv'
+    if output_format == 'parquet' and sample_rows:
+        sample_rows = None
+    schema_map = scan_csv_schemas(soubory, sample_rows=sample_rows)
+    union = schema_map['union']
+    typy = {nazev: schema_map['dtypes'].get(nazev, 'string') for nazev in union}
+    typy = {nazev: typ if typ in ('int', 'float') else 'string' for nazev, typ in typy.items()}
+
+    job_args = []
+    for soubor in soubory:
+        hlavicka = schema_map['files'][os.path.basename(soubor)]
+        pozice = {nazev: idx for idx, nazev in enumerate(hlavicka['columns'])}
+        job_args.append((hlavicka['delimiter'], [pozice.get(nazev) for nazev in union], [typy[nazev] for nazev in union]))
+
+    reports = {}
+    pocet_radku, chybne_soubory = ordered_merge(soubory, output_filepath, union, unify_csv_file, job_args,
+                                               output_format, workers, column_types=typy, reports=reports)
+
+    widened = {}
+    for soubor, mismatches in reports.items():
+        for idx, pocet in mismatches.items():
+            widened.setdefault(union[idx], {})[os.path.basename(soubor)] = pocet
+    for nazev in widened:
+        schema_map['dtypes'][nazev] = 'string'
+    schema_map['widened'] = widened
+    return pocet_radku, chybne_soubory, schema_map
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nástroje pro CSV soubory. Bez příkazu se soubory zaregistrují do manifestu (blok 4).")
+    subparsers = parser.add_subparsers(dest="prikaz")
+
+    merge_parser = subparsers.add_parser("merge", help="spojí geokódované CSV do jednoho souboru (blok 5)")
+    merge_parser.add_argument("vstupni_slozka")
+    merge_parser.add_argument("vystup", help="výstupní soubor .csv nebo .parquet")
+    merge_parser.add_argument("--pattern", default=MERGE_PATTERN, help=f"maska vstupních souborů (výchozí {MERGE_PATTERN})")
+    merge_parser.add_argument("--format", choices=["csv", "parquet"], default=None, help="výchozí podle přípony výstupu")
+    merge_parser.add_argument("--workers", type=int, default=1, help="počet paralelních procesů")
+
+    schema_parser = subparsers.add_parser("schema", help="porovná hlavičky CSV souborů ve složce (blok 6)")
+    schema_parser.add_argument("slozka")
+    schema_parser.add_argument("--pattern", default="*.csv", help="maska souborů (výchozí *.csv)")
+    schema_parser.add_argument("--reference", default=None, help="název referenčního souboru (výchozí sjednocení sloupců)")
+    schema_parser.add_argument("--sample-rows", type=int, default=0, help="počet řádků pro odhad datových typů")
+    schema_parser.add_argument("--output", default=None, help="uloží mapu schémat do JSON")
+
+    union_parser = subparsers.add_parser("union", help="spojí CSV s různou strukturou přes sjednocení sloupců (blok 7)")
+    union_parser.add_argument("slozka")
+    union_parser.add_argument("vystup", help="výstupní soubor .csv nebo .parquet")
+    union_parser.add_argument("--pattern", default="*.csv", help="maska souborů (výchozí *.csv)")
+    union_parser.add_argument("--format", choices=["csv", "parquet"], default=None, help="výchozí podle přípony výstupu")
+    union_parser.add_argument("--sample-rows", type=int, default=None,
+                              help="počet řádků pro odhad typů (výchozí všechny řádky, 0 = vše jako text)")
+    union_parser.add_argument("--workers", type=int, default=1, help="počet paralelních procesů")
+
+    args = parser.parse_args()
+
+    if args.prikaz == "merge":
+        soubory = [oddil['path'] for oddil in dataset_manifest.resolve_partitions(args.vstupni_slozka, args.pattern)]
+        if not soubory:
+            print(f"Ve složce {args.vstupni_slozka} nejsou žádné soubory {args.pattern}.")
+        else:
+            print(f"Spojuji {len(soubory)} souborů do {args.vystup}...")
+            pocet_radku, chybne_soubory = merge_csv_files(soubory, args.vystup, args.format, args.workers)
+            if chybne_soubory:
+                print(f"\nPozor! Tyto soubory se nepodařilo načíst: {[os.path.basename(s) for s in chybne_soubory]}")
+            print(f"\nHotovo! Spojeno {pocet_radku} řádků do {args.vystup}")
+    elif args.prikaz == "schema":
+        soubory = [oddil['path'] for oddil in dataset_manifest.resolve_partitions(args.slozka, args.pattern)]
+        if not soubory:
+            print(f"Ve složce {args.slozka} nejsou žádné soubory {args.pattern}.")
+        else:
+            start = time.perf_counter()
+            schema_map = scan_csv_schemas(soubory, args.reference, args.sample_rows)
+            print_schema_report(schema_map)
+            print(f"\nHlavičky {len(soubory)} souborů načteny za {time.perf_counter() - start:.3f} s.")
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(schema_map, f, indent=4, ensure_ascii=False)
+                print(f"Mapa schémat uložena do {args.output}")
+    elif args.prikaz == "union":
+        soubory = [oddil['path'] for oddil in dataset_manifest.resolve_partitions(args.slozka, args.pattern)]
+        if not soubory:
+            print(f"Ve složce {args.slozka} nejsou žádné soubory {args.pattern}.")
+        else:
+            print(f"Spojuji {len(soubory)} souborů do {args.vystup}...")
+            pocet_radku, chybne_soubory, schema_map = merge_union_schema(soubory, args.vystup, args.format,
+                                                                         args.workers, args.sample_rows)
+            print(f"\nSjednocené schéma: {len(schema_map['union'])} sloupců "
+                  f"(průnik by zachoval jen {len(schema_map['intersection'])}).")
+            for nazev, pocty in schema_map['widened'].items():
+                print(f"Sloupec '{nazev}': {sum(pocty.values())} hodnot neodpovídá odhadnutému typu, "
+                      f"ponechány jako text (soubory: {sorted(pocty)}).")
+            if chybne_soubory:
+                print(f"\nPozor! Tyto soubory se nepodařilo načíst: {[os.path.basename(s) for s in chybne_soubory]}")
+            print(f"\nHotovo! Spojeno {pocet_radku} řádků do {args.vystup}")
+    else:
+        register_partitions(cesta)
@@ -1,196 +1,571 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
+import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# Pravidla pro typ sloupce podle názvu (regex, bez ohledu na velikost písmen), platí první shoda.
+# Nahrazují dřívější ruční seznamy ~170 sloupců: nové varianty ze Scrap_API_Auto_data.py
+# (např. další "_WLTP_LPG" verze) se chytí samy, bez úprav skriptu.
+# Slova musí stát samostatně mezi "_", mezerou nebo závorkou (okolo není písmeno ani číslice),
+# aby 'ratio' nechytilo Engine_aspiration, 'range' Cylinder_arrangement a 'power' Powertrain_Architecture.
+COLUMN_TYPE_RULES = [
+    (r'^(Brand|Model|Generation_Name|Engine_Name)$', 'text'),
+    (r'(?<![a-z0-9])(steering|aspiration|arrangement|architecture|gearbox|transmission)(?![a-z0-9])', 'text'),
+    (r'^(Doors|Seats)$|^Number_of_(cylinders|valves_per_cylinder)$|_of_production$', 'int'),
+    (r'^(Acceleration|Braking Distance)(?![a-z0-9])', 'float'),
+    (r'(?<![a-z0-9])(range|consumption|emissions|capacity|voltage|weight|load|download|tank|space)(?![a-z0-9])', 'float'),
+    (r'(?<![a-z0-9])(power|torque|output|ratio|displacement|bore|stroke|speed|revolutions)(?![a-z0-9])', 'float'),
+    (r'^(length|height|width|wheelbase)(?![a-z0-9])|(?<![a-z0-9])(angle|overhang|track|turning|clearance|depth)(?![a-z0-9])', 'float'),
+]
+
+# Profil hodnot: kolik řádků se náhodně prohlédne a jaký podíl neprázdných hodnot musí být číslo
+SCHEMA_SAMPLE_ROWS = 2000
+MIN_NUMERIC_SHARE_BY_RULE = 0.5 # Sloupec s číselným názvem (např. "Power_steering" s textem) jinak zůstane text
+MIN_NUMERIC_SHARE_BY_PROFILE = 0.95 # Sloupec bez pravidla se stane číselným, jen když je téměř celý číselný
+
+# Hodnota "číslo + známá jednotka" nebo samotné číslo (např. "150 Hp", "6.5 - 7.2 l/100 km", "7.4 kg/Hp"),
+# aby se z "205/55 R16", "1.6 TDI (105 Hp)" nebo "6 gears, manual transmission" při profilování nestalo číslo
+STRICT_UNIT = r'(?:hp|ps|kw|kwh|wh|nm|km/h|mph|km|mi|mm|cm3|cm³|cm|m|kg|t|l|cc|v|ah|rpm|sec|s|g|mpg|°|%)'
+STRICT_NUMBER_PATTERN = re.compile(
+    r'^\s*[-+]?\d+(?:[.,]\d+)?(?:\s*[-–]\s*\d+(?:[.,]\d+)?)?'
+    rf'(?:\s*{STRICT_UNIT}(?:\s*/\s*(?:100\s*)?{STRICT_UNIT})?(?:\s*(?:US|UK))?)?\s*\.?\s*$', re.IGNORECASE)
+INTEGER_PATTERN = re.compile(r'^\s*\d+\s*$')
+
+# Počet desetinných míst float sloupců v CSV výstupu
+EXPORT_DECIMALS = 2
+
+# Načítání CSV: rychlý C parser s výslovně nastaveným oddělovačem a uvozovkami (soubor ze Scrap_API_Auto_data.py).
+# Všechno se čte jako text, aby měl každý blok stejné typy a převod řídilo jen schéma.
+CSV_READ_OPTIONS = dict(sep=';', quotechar='"', doublequote=True, encoding='utf-8', dtype=str,
+                        engine='c', on_bad_lines='warn')
+
+# Počet procesů pro paralelní převod bloků sloupců (--parallel); 1 = bez paralelizace
+PARALLEL_WORKERS = os.cpu_count() or 1
+
+# Počet řádků v jednom bloku pro proudové zpracování (clean_and_convert_car_data_chunked)
+CHUNK_ROWS = 50000
+
+# Odvozené schéma se ukládá sem a při dalším běhu se jen načte (stejné sloupce a pravidla)
+SCHEMA_CACHE_FILE = "Complete_ICE_EV_car_data_schema.json"
+
+# Sloupce pro podrobné debugování (můžeš je změnit)
+DEBUG_COLUMNS = ["Acceleration (0-100 km/h)", "AdBlue_tank", "Weight_to_power_ratio", "Cylinder_Bore"]
+
+# Jeden regex pro všechny buňky: číslo na začátku hodnoty (desetinná tečka nebo čárka),
+# volitelně rozsah "6.5 - 7.2" (i s pomlčkou – nebo bez mezer), jednotka za číslem se ignoruje.
+NUMBER_PATTERN = re.compile(r'^\s*([-+]?\d+(?:[.,]\d+)?)(?:\s*[-–]\s*(\d+(?:[.,]\d+)?))?')
+
+# Co vrátit pro rozsah "6.5 - 7.2": 'first' (6.5, stejně jako dřívější split u mezery), 'mean' (6.85) nebo 'max' (7.2)
+RANGE_MODE = 'first'
+
+
+def parse_leading_numbers(uniques, range_mode=RANGE_MODE):
+    """
+    Pustí NUMBER_PATTERN na pole textových hodnot a vrátí float64 pole stejné délky (NaN tam, kde číslo není).
+    """
+    parts = pd.Series(uniques, dtype='string').str.extract(NUMBER_PATTERN)
+    first = pd.to_numeric(parts[0].str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype='float64')
+    if range_mode == 'first':
+        return first
+    second = pd.to_numeric(parts[1].str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype='float64')
+    upper = np.where(np.isnan(second), first, second)
+    return (first + upper) / 2 if range_mode == 'mean' else upper
+
+
+def _factorize_cells(df, columns):
+    """
+    Dlouhý pohled na sloupce (pod sebou, order='F') rozložený na kódy a unikátní hodnoty (pd.factorize).
+    """
+    values = df[columns].to_numpy(dtype=object).ravel(order='F')
+    return pd.factorize(pd.Series(values, dtype='string'))
+
+
+def _scatter_numbers(numbers, codes, df, columns):
+    """
+    Rozloží čísla unikátních hodnot na všechny buňky podle kódů (kód -1 = prázdná buňka) do tvaru tabulky.
+    """
+    cells = np.where(codes >= 0, numbers[codes], np.nan)
+    return pd.DataFrame(cells.reshape((len(df), len(columns)), order='F'), index=df.index, columns=columns, copy=False)
+
+
+def extract_leading_numbers(df, columns, range_mode=RANGE_MODE):
+    """
+    Vytáhne číslo ze začátku hodnot ve všech zadaných sloupcích najednou.
+    Sloupce se poskládají pod sebe do jedné dlouhé Series, na kterou se jednou pustí
+    zkompilovaný regex (str.extract), a výsledek se přeskládá zpět do tvaru tabulky.
+    Regex běží jen na unikátních hodnotách (specifikace se hodně opakují, např. "5 doors"),
+    výsledek se na všechny buňky rozloží podle kódů z pd.factorize.
+    Vrací DataFrame s float hodnotami (NaN tam, kde číslo není).
+    """
+    if not columns:
+        return pd.DataFrame(index=df.index)
+    codes, uniques = _factorize_cells(df, columns)
+    return _scatter_numbers(parse_leading_numbers(uniques, range_mode), codes, df, columns)
+
+
+def _rules_fingerprint():
+    """
+    Otisk pravidel a prahů - když se změní, uložené schéma se odvodí znovu.
+    """
+    config = [COLUMN_TYPE_RULES, SCHEMA_SAMPLE_ROWS, MIN_NUMERIC_SHARE_BY_RULE,
+              MIN_NUMERIC_SHARE_BY_PROFILE, STRICT_NUMBER_PATTERN.pattern]
+    return hashlib.sha256(json.dumps(config, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def match_column_rule(column_name):
+    """
+    Vrátí typ ('float', 'int', 'text') podle prvního pravidla, které odpovídá názvu sloupce, jinak None.
+    """
+    for pattern, dtype in COLUMN_TYPE_RULES:
+        if re.search(pattern, column_name, re.IGNORECASE):
+            return dtype
+    return None
+
+
+def profile_columns(df, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Projde náhodný vzorek řádků a pro každý sloupec spočítá počet neprázdných hodnot
+    a podíl hodnot, které začínají číslem, jsou striktně "číslo + jednotka" a jsou celé číslo.
+    Všechny buňky vzorku se testují najednou (jedna dlouhá Series, jako v extract_leading_numbers).
+    """
+    sample = df.sample(n=min(sample_rows, len(df)), random_state=0) if len(df) else df
+    columns = list(sample.columns)
+    values = pd.Series(sample.to_numpy(dtype=object).ravel(order='F'), dtype='string').str.strip()
+    values = values.mask(values.isin(['', 'nan', 'None', 'N/A', '-']))
+
+    shape = (len(sample), len(columns))
+    non_empty = values.notna().to_numpy().reshape(shape, order='F')
+    flags = {
+        'leading': values.str.match(NUMBER_PATTERN),
+        'strict': values.str.match(STRICT_NUMBER_PATTERN),
+        'integer': values.str.match(INTEGER_PATTERN),
+    }
+
+    profile = {}
+    non_empty_counts = non_empty.sum(axis=0)
+    shares = {name: flag.fillna(False).to_numpy(dtype=bool).reshape(shape, order='F').sum(axis=0)
+              for name, flag in flags.items()}
+    for i, col in enumerate(columns):
+        count = int(non_empty_counts[i])
+        profile[col] = {
+            'non_empty': count,
+            **{f"{name}_share": round(float(shares[name][i]) / count, 4) if count else 0.0 for name in flags},
+        }
+    return profile
+
+
+def infer_column_types(df, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Odvodí typ každého sloupce: pravidlo podle názvu, potvrzené profilem hodnot.
+    - sloupec s pravidlem 'float'/'int' zůstane číselný, pokud je prázdný ve vzorku
+      nebo aspoň MIN_NUMERIC_SHARE_BY_RULE hodnot začíná číslem,
+    - sloupec bez pravidla je číselný, jen když aspoň MIN_NUMERIC_SHARE_BY_PROFILE hodnot je "číslo + jednotka"
+      ('int', pokud jsou to samá celá čísla bez jednotek).
+    Vrací (types, profile), kde types je {sloupec: 'float' | 'int' | 'text'}.
+    """
+    profile = profile_columns(df, sample_rows)
+    types = {}
+    for col in df.columns:
+        rule_type = match_column_rule(col)
+        stats = profile[col]
+        if rule_type in ('float', 'int'):
+            numeric = stats['non_empty'] == 0 or stats['leading_share'] >= MIN_NUMERIC_SHARE_BY_RULE
+            types[col] = rule_type if numeric else 'text'
+        elif rule_type == 'text' or stats['non_empty'] == 0:
+            types[col] = 'text'
+        elif stats['integer_share'] == 1.0:
+            types[col] = 'int'
+        elif stats['strict_share'] >= MIN_NUMERIC_SHARE_BY_PROFILE:
+            types[col] = 'float'
+        else:
+            types[col] = 'text'
+    return types, profile
+
+
+def load_or_infer_schema(df, cache_file=SCHEMA_CACHE_FILE, refresh=False):
+    """
+    Vrátí (float_columns, int_columns) pro df. Schéma se načte z cache_file, pokud sedí sloupce
+    i otisk pravidel; jinak se odvodí z dat (infer_column_types) a uloží pro další běhy.
+    """
+    columns = list(df.columns)
+    fingerprint = _rules_fingerprint()
+    schema = None
+    if cache_file and not refresh and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('columns') == columns and cached.get('rules_fingerprint') == fingerprint:
+                schema = cached
+                print(f"Schéma sloupců načteno z '{cache_file}'.")
+        except (IOError, ValueError) as e:
+            print(f"Upozornění: Uložené schéma '{cache_file}' nelze načíst ({e}), odvodím ho znovu.")
+
+    if schema is None:
+        start = time.perf_counter()
+        types, profile = infer_column_types(df)
+        schema = {'columns': columns, 'rules_fingerprint': fingerprint, 'types': types, 'profile': profile}
+        print(f"Schéma sloupců odvozeno za {time.perf_counter() - start:.2f} s.")
+        unmatched = [col for col in columns if match_column_rule(col) is None and types[col] != 'text']
+        if unmatched:
+            print(f"Sloupce bez pravidla, které profil označil jako číselné: {unmatched}")
+        if cache_file:
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(schema, f, indent=4, ensure_ascii=False)
+                print(f"Schéma uloženo do '{cache_file}'.")
+            except IOError as e:
+                print(f"Upozornění: Schéma se nepodařilo uložit do '{cache_file}': {e}")
+
+    float_columns = [col for col in columns if schema['types'].get(col) == 'float']
+    int_columns = [col for col in columns if schema['types'].get(col) == 'int']
+    print(f"Číselné sloupce: {len(float_columns)} float, {len(int_columns)} int, "
+          f"{len(columns) - len(float_columns) - len(int_columns)} textových.")
+    return float_columns, int_columns
+
+def _convert_unique_block(uniques, shm_name, size, offset, range_mode):
+    """
+    Úloha jednoho procesu: vytáhne čísla ze své části unikátních hodnot a zapíše je přímo
+    do sdílené paměti na pozice offset.. - výsledek se nepřenáší přes pickle.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        target = np.ndarray((size,), dtype='float64', buffer=shm.buf)
+        target[offset:offset + len(uniques)] = parse_leading_numbers(uniques, range_mode)
+        del target
+    finally:
+        shm.close()
+
+
+def extract_leading_numbers_parallel(df, columns, workers=PARALLEL_WORKERS, range_mode=RANGE_MODE):
+    """
+    Paralelní varianta extract_leading_numbers: hlavní proces buňky jednou rozloží na kódy
+    a unikátní hodnoty (pd.factorize), procesům pošle jen části unikátních hodnot a ty zapíšou
+    čísla do jednoho sdíleného float64 pole. Hlavní proces pak čísla rozloží na buňky podle kódů;
+    to je jediný zápis výsledku, DataFrame se postaví přímo nad ním (bez další kopie).
+    Soubor se nečte znovu a procesům se neposílají celé sloupce.
+    """
+    if not columns:
+        return pd.DataFrame(index=df.index)
+    codes, uniques = _factorize_cells(df, columns)
+    uniques = np.asarray(uniques, dtype=object)
+    size = len(uniques)
+    workers = max(1, min(workers, size))
+    block_size = -(-size // workers) if size else 0
+    offsets = range(0, size, block_size) if size else []
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, size * 8))
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_convert_unique_block, uniques[offset:offset + block_size], shm.name, size,
+                                       offset, range_mode)
+                       for offset in offsets]
+            for future in futures:
+                future.result()
+        numbers = np.ndarray((size,), dtype='float64', buffer=shm.buf)
+        result = _scatter_numbers(numbers, codes, df, columns) # Nové pole, sdílená paměť se hned uvolní
+        del numbers
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
+
+
+def convert_numeric_columns(df, float_columns, int_columns, debug_columns=DEBUG_COLUMNS, workers=1):
+    """
+    Převede float a int sloupce jedním průchodem regexu (viz extract_leading_numbers),
+    chybějící/neplatné hodnoty nahradí nulou. Sloupce, které v df nejsou, se přeskočí.
+    S workers > 1 se unikátní hodnoty převádějí paralelně (viz extract_leading_numbers_parallel).
+    """
+    for col_name in float_columns + int_columns:
+        if col_name not in df.columns:
+            print(f"Upozornění: Sloupec '{col_name}' pro konverzi nebyl nalezen a bude přeskočen.")
+    float_present = [col for col in float_columns if col in df.columns]
+    int_present = [col for col in int_columns if col in df.columns and col not in float_columns]
+
+    originals = {col: df[col].iloc[0] for col in debug_columns if col in df.columns and not df.empty}
+
+    if workers > 1:
+        numbers = extract_leading_numbers_parallel(df, float_present + int_present, workers)
+    else:
+        numbers = extract_leading_numbers(df, float_present + int_present)
+    numbers = numbers.fillna(0)
+    df[float_present] = numbers[float_present]
+    df[int_present] = numbers[int_present].astype(int)
+
+    for col_name, example_value in originals.items():
+        print(f"\n--- DEBUG pro sloupec '{col_name}' ---")
+        print(f"Původní hodnota (první): '{example_value}' -> '{df[col_name].iloc[0]}' (typ {df[col_name].dtype})")
+    return df
+
+
+def convert_numeric_columns_legacy(df, float_columns, int_columns):
+    """
+    Původní postup po jednotlivých sloupcích (strip, split u mezery, čárka -> tečka, to_numeric).
+    Zůstává jen pro srovnání v benchmark_numeric_parsing.
+    """
+    for col_name in float_columns:
+        if col_name in df.columns:
+            temp_series = df[col_name].astype(str).str.strip().str.split(' ', n=1).str[0].str.replace(',', '.')
+            df[col_name] = pd.to_numeric(temp_series, errors='coerce').fillna(0)
+    for col_name in [col for col in int_columns if col not in float_columns]:
+        if col_name in df.columns:
+            temp_series = df[col_name].astype(str).str.strip().str.split(' ', n=1).str[0].str.replace(',', '.')
+            df[col_name] = pd.to_numeric(temp_series, errors='coerce').fillna(0).astype(int)
+    return df
+
+
+def benchmark_numeric_parsing(input_csv_filename="Complete_ICE_EV_car_data.csv", repeat=3):
+    """
+    Porovná rychlost původního a vektorizovaného převodu na celém souboru
+    a vypíše, v kolika buňkách se výsledky liší (např. '5.0L' nebo '6.5-7.2' dřív končily jako 0).
+    """
+    df = pd.read_csv(input_csv_filename, **CSV_READ_OPTIONS)
+    float_columns, int_columns = load_or_infer_schema(df)
+    columns = float_columns + int_columns
+    print(f"Benchmark: {len(df)} řádků, {len(columns)} číselných sloupců, {repeat} opakování.")
+
+    results = {}
+    for name, func in [("původní (po sloupcích)", lambda frame: convert_numeric_columns_legacy(frame, float_columns, int_columns)),
+                       ("regex (všechny sloupce najednou)",
+                        lambda frame: convert_numeric_columns(frame, float_columns, int_columns, debug_columns=[]))]:
+        times = []
+        for _ in range(repeat):
+            frame = df.copy()
+            start = time.perf_counter()
+            results[name] = func(frame)
+            times.append(time.perf_counter() - start)
+        print(f"  {name}: nejlepší čas {min(times):.3f} s")
+
+    legacy, vectorized = results.values()
+    differences = (legacy[columns].to_numpy(dtype='float64') != vectorized[columns].to_numpy(dtype='float64')).sum()
+    print(f"  Rozdílné buňky: {differences} z {len(df) * len(columns)}")
+
+
+def benchmark_parallel_conversion(input_csv_filename="Complete_ICE_EV_car_data.csv", worker_counts=None, repeat=3):
+    """
+    Změří převod číselných sloupců celého souboru sériově a paralelně s různým počtem procesů
+    a ověří, že výsledky jsou shodné. Soubor se načte jen jednou, před měřením.
+    """
+    df = pd.read_csv(input_csv_filename, **CSV_READ_OPTIONS)
+    float_columns, int_columns = load_or_infer_schema(df)
+    columns = float_columns + int_columns
+    worker_counts = worker_counts or sorted({1, 2, 4, PARALLEL_WORKERS})
+    print(f"Benchmark paralelního převodu: {len(df)} řádků, {len(columns)} číselných sloupců, "
+          f"{PARALLEL_WORKERS} jader, {repeat} opakování.")
+
+    baseline_time = None
+    reference = None
+    for workers in worker_counts:
+        times = []
+        for _ in range(repeat):
+            frame = df.copy()
+            start = time.perf_counter()
+            frame = convert_numeric_columns(frame, float_columns, int_columns, debug_columns=[], workers=workers)
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        if reference is None:
+            baseline_time, reference = best, frame[columns]
+            print(f"  {workers} proces(y): {best:.3f} s")
+        else:
+            same = reference.equals(frame[columns])
+            print(f"  {workers} proces(y): {best:.3f} s, zrychlení {baseline_time / best:.2f}x, shodné výsledky: {same}")
+
+
+def export_car_data(df, output_filename, output_format='csv', append=False):
+    """
+    Uloží upravená data bez volání Pythonu pro každou buňku.
+    - 'csv': kopie float sloupců se zaokrouhlí na 2 desetinná místa a pandas je zapíše rovnou s desetinnou čárkou
+      (decimal=','); předaný DataFrame se nemění. Proti dřívějšímu str(round(x, 2)).replace('.', ',') po buňkách
+      se hodnota může lišit o jednotku na posledním místě (Series.round zaokrouhluje jinak než round(),
+      např. 2.675 -> 2,68 místo 2,67) a prázdné hodnoty se zapíšou jako prázdné pole místo 'nan'.
+    - 'parquet': čísla zůstanou float64/int64, Power BI je načte jako čísla bez převodu textu (vyžaduje pyarrow).
+    S append=True se CSV připojí na konec souboru bez hlavičky (pro Parquet po blocích viz CarDataWriter).
+    """
+    float_columns = df.select_dtypes(include=['float64']).columns
+    if output_format == 'parquet':
+        df.to_parquet(output_filename, index=False)
+    elif output_format == 'csv':
+        if len(float_columns):
+            df = df.round({col: EXPORT_DECIMALS for col in float_columns}) # nová kopie, vstup se nezaokrouhlí
+        df.to_csv(output_filename, index=False, encoding='utf-8', decimal=',',
+                  mode='a' if append else 'w', header=not append)
+    else:
+        raise ValueError(f"Neznámý formát výstupu: '{output_format}' (podporováno: 'csv', 'parquet').")
+
+
+def export_car_data_legacy(df, output_filename):
+    """
+    Původní export: lambda na každou float buňku, int sloupce jako text. Jen pro benchmark_export.
+    """
+    for col in df.select_dtypes(include=[np.number]).columns:
+        if df[col].dtype == 'float64':
+            df[col] = df[col].apply(lambda x: str(round(x, 2)).replace('.', ','))
+        elif df[col].dtype == 'int64':
+            df[col] = df[col].astype(str)
+    df.to_csv(output_filename, index=False, encoding='utf-8')
+
+
+def benchmark_export(input_csv_filename="Complete_ICE_EV_car_data.csv", repeat=3):
+    """
+    Porovná rychlost původního a nového exportu převedených dat a ověří, že CSV výstupy jsou shodné
+    s tolerancí jedné jednotky na posledním desetinném místě (zaokrouhlení se mírně liší, viz export_car_data).
+    Parquet se měří navíc, pokud je nainstalovaný pyarrow.
+    """
+    df = pd.read_csv(input_csv_filename, **CSV_READ_OPTIONS)
+    float_columns, int_columns = load_or_infer_schema(df)
+    df = convert_numeric_columns(df, float_columns, int_columns, debug_columns=[])
+    print(f"Benchmark exportu: {len(df)} řádků, {len(float_columns)} float sloupců, {repeat} opakování.")
+
+    outputs = {
+        "původní (lambda po buňkách)": ("benchmark_export_legacy.csv", export_car_data_legacy),
+        "nový (decimal=',')": ("benchmark_export.csv", lambda frame, path: export_car_data(frame, path, 'csv')),
+        "parquet": ("benchmark_export.parquet", lambda frame, path: export_car_data(frame, path, 'parquet')),
+    }
+    for name, (path, func) in outputs.items():
+        times = []
+        try:
+            for _ in range(repeat):
+                frame = df.copy()
+                start = time.perf_counter()
+                func(frame, path)
+                times.append(time.perf_counter() - start)
+        except ImportError as e:
+            print(f"  {name}: přeskočeno ({e})")
+            continue
+        print(f"  {name}: nejlepší čas {min(times):.3f} s, velikost {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    old = pd.read_csv("benchmark_export_legacy.csv", decimal=',', encoding='utf-8', low_memory=False)
+    new = pd.read_csv("benchmark_export.csv", decimal=',', encoding='utf-8', low_memory=False)
+    tolerance = 10 ** -EXPORT_DECIMALS
+    try:
+        pd.testing.assert_frame_equal(old, new, check_dtype=False, check_exact=False, rtol=0, atol=tolerance * 1.001)
+        same = True
+    except AssertionError:
+        same = False
+    print(f"  CSV výstupy jsou shodné (tolerance {tolerance:g}): {same}")
+    for path, _ in outputs.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class CarDataWriter:
+    """
+    Zapisuje převedená data po blocích do jednoho souboru (CSV nebo Parquet).
+    Parquet potřebuje pevné schéma pro všechny bloky: float/int sloupce podle schématu, zbytek text,
+    takže ani blok, ve kterém je nějaký sloupec celý prázdný, nezmění typ sloupce.
+    """
+    def __init__(self, output_filename, output_format, columns, float_columns, int_columns):
+        self.output_filename = output_filename
+        self.output_format = output_format
+        self.blocks_written = 0
+        self.parquet_writer = None
+        if output_format == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Pro výstup do Parquet je potřeba balíček pyarrow (pip install pyarrow).")
+            self.pa = pa
+            column_types = {**{col: pa.float64() for col in float_columns}, **{col: pa.int64() for col in int_columns}}
+            self.schema = pa.schema([(col, column_types.get(col, pa.string())) for col in columns])
+            self.parquet_writer = pq.ParquetWriter(output_filename, self.schema)
+        elif output_format != 'csv':
+            raise ValueError(f"Neznámý formát výstupu: '{output_format}' (podporováno: 'csv', 'parquet').")
+
+    def write(self, df):
+        if self.parquet_writer is not None:
+            self.parquet_writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+        else:
+            export_car_data(df, self.output_filename, 'csv', append=self.blocks_written > 0)
+        self.blocks_written += 1
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+
+
+def clean_and_convert_car_data_chunked(input_csv_filename="Complete_ICE_EV_car_data.csv",
+                                       output_filename="Complete_ICE_EV_car_data_repair.csv",
+                                       chunk_rows=CHUNK_ROWS, schema_cache_file=SCHEMA_CACHE_FILE,
+                                       refresh_schema=False, output_format='csv'):
+    """
+    Proudová varianta clean_and_convert_car_data pro velké soubory: čte po chunk_rows řádcích
+    (C parser, viz CSV_READ_OPTIONS), každý blok převede stejnými pravidly a připojí k výstupu.
+    V paměti je vždy jen jeden blok. Schéma se odvodí z prvního bloku (nebo načte ze schema_cache_file).
+    Výstup se zapisuje do .tmp souboru a až na konci se přejmenuje, takže nikdy nezůstane napůl zapsaný.
+    """
+    print(f"Běží proudové čištění dat (bloky po {chunk_rows} řádcích). Aktuální čas: {pd.Timestamp.now()}")
+    start_time = time.perf_counter()
+    temp_filename = output_filename + ".tmp"
+    writer = None
+    rows_done = 0
+    try:
+        with pd.read_csv(input_csv_filename, chunksize=chunk_rows, **CSV_READ_OPTIONS) as reader:
+            for chunk in reader:
+                if writer is None:
+                    float_columns, int_columns = load_or_infer_schema(chunk, schema_cache_file, refresh_schema)
+                    writer = CarDataWriter(temp_filename, output_format, list(chunk.columns), float_columns, int_columns)
+                    chunk = convert_numeric_columns(chunk, float_columns, int_columns)
+                else:
+                    chunk = convert_numeric_columns(chunk, float_columns, int_columns, debug_columns=[])
+                writer.write(chunk)
+                rows_done += len(chunk)
+                print(f"  Zpracováno {rows_done} řádků ({rows_done / (time.perf_counter() - start_time):.0f} řádků/s).")
+        if writer is None:
+            print(f"Soubor '{input_csv_filename}' neobsahuje žádná data.")
+            return
+        writer.close()
+        os.replace(temp_filename, output_filename)
+        print(f"Data byla úspěšně upravena a uložena do: {output_filename} "
+              f"({rows_done} řádků za {time.perf_counter() - start_time:.2f} s)")
+    except FileNotFoundError:
+        print(f"CHYBA: Soubor '{input_csv_filename}' nebyl nalezen ve stejné složce jako skript.")
+    except pd.errors.ParserError as pe:
+        print(f"CHYBA PARSOVÁNÍ CSV: {pe}")
+    except Exception as e:
+        print(f"Při proudovém zpracování dat došlo k neočekávané chybě: {e}")
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
 
 def clean_and_convert_car_data(input_csv_filename="Complete_ICE_EV_car_data.csv",
-                               output_csv_filename="Complete_ICE_EV_car_data_repair.csv"):
+                               output_csv_filename="Complete_ICE_EV_car_data_repair.csv",
+                               schema_cache_file=SCHEMA_CACHE_FILE, refresh_schema=False, output_format='csv',
+                               workers=1):
     """
-    Načte data o autech z CSV, očistí specifikované sloupce (extrahuje text před první mezerou),
+    Načte data o autech z CSV, očistí číselné sloupce (typy podle COLUMN_TYPE_RULES a profilu hodnot,
+    viz load_or_infer_schema; číslo se vytáhne ze začátku hodnoty, viz NUMBER_PATTERN),
     převede je na číselné hodnoty, nahradí chybějící/neplatné hodnoty nulami
-    a uloží je s desetinnou čárkou do nového CSV souboru.
+    a uloží je s desetinnou čárkou do nového CSV souboru (output_format='csv'),
+    nebo do Parquetu s ponechanými číselnými typy (output_format='parquet').
+    S workers > 1 se unikátní hodnoty převádějí paralelně v několika procesech.
     """
     print(f"Běží skript pro čištění dat. Aktuální čas: {pd.Timestamp.now()}")
     try:
-        print("Pokusím se načíst CSV s 'python' engine, oddělovačem ';' a 'on_bad_lines='warn' pro robustnost...")
-        # ZMĚNA ZDE: sep=';' pro správné načtení souboru se středníkem jako oddělovačem
-        df = pd.read_csv(input_csv_filename, engine='python', on_bad_lines='warn', quotechar='"', sep=';')
+        print("Pokusím se načíst CSV s 'c' engine, oddělovačem ';' a 'on_bad_lines='warn' pro robustnost...")
+        # sep=';' pro správné načtení souboru se středníkem jako oddělovačem (viz CSV_READ_OPTIONS)
+        df = pd.read_csv(input_csv_filename, **CSV_READ_OPTIONS)
         print(f"Soubor '{input_csv_filename}' úspěšně načten. Počet řádků: {len(df)}")
         print(f"Původní sloupce a jejich datové typy (prvních 5):\n{df.dtypes.head(5)}\n")
         print(f"Prvních 3 řádky (pro ověření načtení):\n{df.head(3)}\n")
 
-        # REALNÉ NÁZVY SLOUPCŮ Z CSV - BEZ JEDNOTEK V HRANATÝCH ZÁVORKÁCH
-        # Seznamy sloupců, které se mají zpracovat jako float
-        columns_to_process_float = [
-            "Braking Distance (100-0 km/h)", "Braking Distance (200-0 km/h)",
-            "Acceleration (0-100 km/h)", "Acceleration (0-100 km/h)_CNG",
-            "Acceleration (0-100 km/h)_Ethanol___E85", "Acceleration (0-100 km/h)_LPG",
-            "Acceleration (0-200 km/h)", "Acceleration (0-300 km/h)",
-            "Acceleration (0-60 mph)", "Acceleration (0-60 mph)_Calculated_by_Auto_Datanet",
-            "Acceleration (0-62 mph)", "AdBlue_tank", "All_electric_range",
-            "All_electric_range_CLTC", "All_electric_range_EPA", "All_electric_range_NEDC",
-            "All_electric_range_NEDC,_WLTP_equivalent", "All_electric_range_WLTC",
-            "All_electric_range_WLTP", "Average_Energy_consumption",
-            "Average_Energy_consumption_CLTC", "Average_Energy_consumption_EPA",
-            "Average_Energy_consumption_NEDC", "Average_Energy_consumption_NEDC,_WLTP_equivalent",
-            "Average_Energy_consumption_WLTC", "Average_Energy_consumption_WLTP",
-            "Battery_voltage", "Battery_weight", "CNG_cylinder_capacity",
-            "CO_2_emissions", "CO_2_emissions_CNG", "CO_2_emissions_CNG_NEDC",
-            "CO_2_emissions_CNG_NEDC,_WLTP_equivalent", "CO_2_emissions_CNG_WLTP",
-            "CO_2_emissions_EPA", "CO_2_emissions_Ethanol___E85",
-            "CO_2_emissions_Ethanol___E85_NEDC", "CO_2_emissions_LPG",
-            "CO_2_emissions_LPG_NEDC", "CO_2_emissions_LPG_NEDC,_WLTP_equivalent",
-            "CO_2_emissions_LPG_WLTP", "CO_2_emissions_NEDC",
-            "CO_2_emissions_NEDC,_WLTP_equivalent", "CO_2_emissions_WLTP",
-            "Combined_fuel_consumption_WLTP", "Combined_fuel_consumption_WLTP_CNG",
-            "Combined_fuel_consumption_WLTP_LPG", "Compression_ratio",
-            "Cylinder_Bore", "Electric_motor_Torque", "Electric_motor_power",
-            "Engine_displacement", "Engine_oil_capacity",
-            "Fuel_consumption_at_Low_speed_WLTP", "Fuel_consumption_at_Low_speed_WLTP_CNG",
-            "Fuel_consumption_at_Low_speed_WLTP_LPG", "Fuel_consumption_at_Medium_speed_WLTP",
-            "Fuel_consumption_at_Medium_speed_WLTP_CNG", "Fuel_consumption_at_Medium_speed_WLTP_LPG",
-            "Fuel_consumption_at_high_speed_WLTP", "Fuel_consumption_at_high_speed_WLTP_CNG",
-            "Fuel_consumption_at_high_speed_WLTP_LPG", "Fuel_consumption_at_very_high_speed_WLTP",
-            "Fuel_consumption_at_very_high_speed_WLTP_CNG", "Fuel_consumption_at_very_high_speed_WLTP_LPG",
-            "Fuel_consumption_economy___combined", "Fuel_consumption_economy___combined_CLTC",
-            "Fuel_consumption_economy___combined_CNG", "Fuel_consumption_economy___combined_CNG_NEDC",
-            "Fuel_consumption_economy___combined_CNG_NEDC,_WLTP_equivalent", "Fuel_consumption_economy___combined_EPA",
-            "Fuel_consumption_economy___combined_Ethanol___E85", "Fuel_consumption_economy___combined_Ethanol___E85_NEDC",
-            "Fuel_consumption_economy___combined_LPG", "Fuel_consumption_economy___combined_LPG_NEDC",
-            "Fuel_consumption_economy___combined_LPG_NEDC,_WLTP_equivalent", "Fuel_consumption_economy___combined_NEDC",
-            "Fuel_consumption_economy___combined_NEDC,_WLTP_equivalent", "Fuel_consumption_economy___combined_WLTC",
-            "Fuel_consumption_economy___extra_urban", "Fuel_consumption_economy___extra_urban_CNG",
-            "Fuel_consumption_economy___extra_urban_CNG_NEDC", "Fuel_consumption_economy___extra_urban_CNG_NEDC,_WLTP_equivalent",
-            "Fuel_consumption_economy___extra_urban_EPA", "Fuel_consumption_economy___extra_urban_Ethanol___E85",
-            "Fuel_consumption_economy___extra_urban_Ethanol___E85_NEDC", "Fuel_consumption_economy___extra_urban_LPG",
-            "Fuel_consumption_economy___extra_urban_LPG_NEDC", "Fuel_consumption_economy___extra_urban_LPG_NEDC,_WLTP_equivalent",
-            "Fuel_consumption_economy___extra_urban_NEDC", "Fuel_consumption_economy___extra_urban_NEDC,_WLTP_equivalent",
-            "Fuel_consumption_economy___urban", "Fuel_consumption_economy___urban_CNG",
-            "Fuel_consumption_economy___urban_CNG_NEDC", "Fuel_consumption_economy___urban_CNG_NEDC,_WLTP_equivalent",
-            "Fuel_consumption_economy___urban_EPA", "Fuel_consumption_economy___urban_Ethanol___E85",
-            "Fuel_consumption_economy___urban_Ethanol___E85_NEDC", "Fuel_consumption_economy___urban_LPG",
-            "Fuel_consumption_economy___urban_LPG_NEDC", "Fuel_consumption_economy___urban_LPG_NEDC,_WLTP_equivalent",
-            "Fuel_consumption_economy___urban_NEDC", "Fuel_consumption_economy___urban_NEDC,_WLTP_equivalent",
-            "Fuel_tank_capacity", "Fuel_tank_capacity_LPG", "Gross_battery_capacity",
-            "Net_usable_battery_capacity", "Recuperation_output", "System_power",
-            "System_torque", "Power", "Power_CNG", "Power_Ethanol___E85", "Power_LPG",
-            "Power_per_litre", "Power_per_litre_CNG", "Power_per_litre_Ethanol___E85",
-            "Power_per_litre_LPG", "Torque", "Torque_CNG", "Torque_Ethanol___E85", "Torque_LPG",
-            "Trunk_boot_space___maximum", "Trunk_boot_space___minimum",
-            "Weight_to_power_ratio", "Weight_to_torque_ratio", "Max_weight",
-            "Approach_angle", "Climb_angle", "Departure_angle", "Front_overhang",
-            "Front_track", "Height", "Kerb_Weight", "Length", "Max_load",
-            "Max_roof_load", "Minimum_turning_circle_turning_diameter",
-            "Permitted_towbar_download", "Permitted_trailer_load_with_brakes_12%",
-            "Permitted_trailer_load_with_brakes_8%", "Permitted_trailer_load_without_brakes",
-            "Piston_Stroke", "Ramp_over_brakeover_angle", "Rear_Back_track",
-            "Rear_overhang", "Ride_height_ground_clearance", "Wading_depth",
-            "Wheelbase", "Width", "Width_including_mirrors", "Width_with_mirrors_folded",
-            "Max_speed_electric", "Maximum_engine_speed", "Maximum_revolutions_of_the_electric_motor",
-            "Maximum_speed", "Maximum_speed_CNG", "Maximum_speed_Ethanol___E85", "Maximum_speed_LPG",
-        ]
-
-        # Sloupce, které mají být celá čísla
-        columns_to_convert_to_int = [
-            "Doors", "End_of_production", "Number_of_cylinders",
-            "Number_of_valves_per_cylinder", "Seats", "Start_of_production",
-        ]
-
-        # Sloupce pro podrobné debugování (můžeš je změnit)
-        debug_columns = ["Acceleration (0-100 km/h)", "AdBlue_tank", "Weight_to_power_ratio", "Cylinder_Bore"]
-        
-        print("\nSpouštím čištění a konverzi číselných sloupců (float)...")
-        for col_name in columns_to_process_float:
-            if col_name in df.columns:
-                is_debug_col = col_name in debug_columns
-                example_value = None
-                if not df[col_name].empty:
-                    example_value = df[col_name].iloc[0]
-                
-                if is_debug_col:
-                    print(f"\n--- DEBUG pro sloupec '{col_name}' ---")
-                    print(f"Původní hodnota (první): '{example_value}'")
-                
-                # 1. Převedeme na string a odstraníme mezery
-                temp_series = df[col_name].astype(str).str.strip()
-                if is_debug_col:
-                    print(f"Po .astype(str).str.strip(): '{temp_series.iloc[0]}'")
-
-                # 2. Rozdělíme u první mezery a vezmeme první část (Power Query logika)
-                temp_series = temp_series.str.split(' ', n=1).str[0]
-                if is_debug_col:
-                    print(f"Po .str.split(' ', n=1).str[0]: '{temp_series.iloc[0]}'")
-
-                # 3. Nahradíme desetinné čárky tečkami pro pd.to_numeric (pokud nějaké jsou)
-                temp_series = temp_series.str.replace(',', '.')
-                if is_debug_col:
-                    print(f"Po .str.replace(',', '.'): '{temp_series.iloc[0]}'")
-
-                # 4. Převedeme na číslo (NaN pro chyby)
-                df[col_name] = pd.to_numeric(temp_series, errors='coerce')
-                if is_debug_col:
-                    print(f"Po pd.to_numeric(..., errors='coerce'): '{df[col_name].iloc[0]}'")
-
-                # 5. Nahradíme NaN nulou
-                df[col_name] = df[col_name].fillna(0)
-                if is_debug_col:
-                    print(f"Po .fillna(0): '{df[col_name].iloc[0]}'")
-                    print(f"Konečný typ sloupce: {df[col_name].dtype}")
-                
-            else:
-                print(f"Upozornění: Sloupec '{col_name}' pro float konverzi nebyl nalezen a bude přeskočen.")
-
-        print("\nSpouštím čištění a konverzi číselných sloupců (int)...")
-        columns_for_int_only = [col for col in columns_to_convert_to_int if col not in columns_to_process_float]
-
-        for col_name in columns_for_int_only:
-            if col_name in df.columns:
-                is_debug_col = col_name in debug_columns
-                example_value = None
-                if not df[col_name].empty:
-                    example_value = df[col_name].iloc[0]
-                
-                if is_debug_col:
-                    print(f"\n--- DEBUG pro sloupec '{col_name}' ---")
-                    print(f"Původní hodnota (první): '{example_value}'")
-
-                temp_series = df[col_name].astype(str).str.strip()
-                if is_debug_col:
-                    print(f"Po .astype(str).str.strip(): '{temp_series.iloc[0]}'")
-
-                temp_series = temp_series.str.split(' ', n=1).str[0]
-                if is_debug_col:
-                    print(f"Po .str.split(' ', n=1).str[0]: '{temp_series.iloc[0]}'")
-
-                temp_series = temp_series.str.replace(',', '.')
-                if is_debug_col:
-                    print(f"Po .str.replace(',', '.'): '{temp_series.iloc[0]}'")
-
-                df[col_name] = pd.to_numeric(temp_series, errors='coerce')
-                if is_debug_col:
-                    print(f"Po pd.to_numeric(..., errors='coerce'): '{df[col_name].iloc[0]}'")
-
-                df[col_name] = df[col_name].fillna(0).astype(int) 
-                if is_debug_col:
-                    print(f"Po .fillna(0).astype(int): '{df[col_name].iloc[0]}'")
-                    print(f"Konečný typ sloupce: {df[col_name].dtype}")
-            else:
-                print(f"Upozornění: Sloupec '{col_name}' pro int konverzi nebyl nalezen a bude přeskočen.")
-
-        # Finální převod desetinné tečky na čárku pro číselné sloupce před uložením
-        print("\nPřevádím desetinné tečky na čárky pro export...")
-        for col in df.select_dtypes(include=[np.number]).columns:
-            if df[col].dtype == 'float64':
-                # Formátování na string s desetinnou čárkou pro float
-                # Používáme pd.Series.round(decimals=N) před formátováním, aby se omezil počet desetinných míst
-                # nebo můžete použít f-string formátování jako '{:.1f}'.format(x) pro jedno desetinné místo
-                df[col] = df[col].apply(lambda x: str(round(x, 2)).replace('.', ',')) # Zaokrouhlení na 2 desetinná místa
-            elif df[col].dtype == 'int64':
-                df[col] = df[col].astype(str) # Celá čísla jako string
+        print("\nSpouštím čištění a konverzi číselných sloupců (float a int)...")
+        float_columns, int_columns = load_or_infer_schema(df, schema_cache_file, refresh_schema)
+        df = convert_numeric_columns(df, float_columns, int_columns, workers=workers)
 
         print(f"\nKonečné datové typy upravených sloupců (prvních 5):\n{df.dtypes.head(5)}\n")
 
-        # Uložení upraveného DataFrame do nového CSV souboru
-        df.to_csv(output_csv_filename, index=False, encoding='utf-8')
+        # Uložení upraveného DataFrame (CSV s desetinnou čárkou, nebo Parquet s číselnými typy)
+        export_car_data(df, output_csv_filename, output_format)
         print(f"Data byla úspěšně upravena a uložena do: {output_csv_filename}")
         print(f"Dokončeno. Aktuální čas: {pd.Timestamp.now()}")
 
@@ -206,4 +581,18 @@ def clean_and_convert_car_data(input_csv_filename="Complete_ICE_EV_car_data.csv"
 
 # --- Spuštění skriptu ---
 if __name__ == "__main__":
-    clean_and_convert_car_data()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark_numeric_parsing()
+        benchmark_export()
+        benchmark_parallel_conversion()
+    else:
+        output_format = 'parquet' if "--parquet" in sys.argv else 'csv'
+        output_filename = f"Complete_ICE_EV_car_data_repair.{output_format}"
+        refresh_schema = "--refresh-schema" in sys.argv
+        if "--chunked" in sys.argv:
+            clean_and_convert_car_data_chunked(output_filename=output_filename, refresh_schema=refresh_schema,
+                                               output_format=output_format)
+        else:
+            clean_and_convert_car_data(output_csv_filename=output_filename, refresh_schema=refresh_schema,
+                                       output_format=output_format,
+                                       workers=PARALLEL_WORKERS if "--parallel" in sys.argv else 1)
\ No newline at end of file
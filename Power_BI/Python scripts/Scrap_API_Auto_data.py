@@ -1,10 +1,90 @@
 import requests
 from bs4 import BeautifulSoup
 import csv
+import gzip
+import json
+import os
+import re
+import sys
 import time
+import xml.etree.ElementTree as ET
+from pipeline_metrics import METRICS
+from url_quarantine import UrlQuarantine, classify_exception, EMPTY_PAGE
+from page_fingerprints import FingerprintStore, fingerprint_elements, delta_filename, merge_delta, NEW, CHANGED, UNCHANGED
+
+OUTPUT_CSV = "complete_auto_data.csv"
+QUARANTINE_SOURCE = "auto-data" # Label of this crawler's entries in the shared URL quarantine
+# Name columns of a row of OUTPUT_CSV (first columns of the CSV)
+KEY_COLUMNS = ['Brand', 'Model', 'Generation_Name', 'Engine_Name']
+# The names of engines found in the sitemap come from their details table, of walked engines from the listing
+# pages, and may be spelled differently - so the delta is merged on the engine page URL, which both share.
+# KEY_COLUMNS are used only for a CSV written before the URL column existed.
+URL_COLUMN = 'Engine_URL'
+
+# --- Sitemap discovery ---
+SITE_URL = "https://www.auto-data.net"
+# Used when robots.txt does not list any sitemap
+SITEMAP_URLS = [SITE_URL + "/sitemap.xml"]
+# Engine (modification) pages are '/en/<brand>-<model>-<generation>-<engine>-<id>';
+# brand, model and generation pages end with '-brand-<id>', '-model-<id>' and '-generation-<id>'
+ENGINE_URL_PATTERN = re.compile(r'^https?://www\.auto-data\.net/en/(?![a-z0-9.-]*-(?:brand|model|generation)-\d+$)[a-z0-9.-]+-\d+$')
+GENERATION_URL_PATTERN = re.compile(r'^https?://www\.auto-data\.net/en/[a-z0-9.-]+-generation-\d+$')
+BRAND_SLUG_PATTERN = re.compile(r'/en/([a-z0-9-]+)-brand-\d+$')
+# Generation pages of the sitemap already checked for engines missing from it, with their sitemap <lastmod>
+# and the missing engines found on them; a generation page is read again only when its <lastmod> changes
+# (or with --verify-sitemap), otherwise the engines found last time are scraped again
+SITEMAP_STATE_FILE = "auto_data_sitemap_state.json"
+# Key columns of a row read from the details table of the engine page (cleaned headers), for engines found in
+# the sitemap without walking the brand -> model -> generation pages that normally provide the names
+DETAIL_KEY_COLUMNS = {'Brand': 'Brand', 'Model': 'Model', 'Generation_Name': 'Generation', 'Engine_Name': 'Modification_Engine'}
+
+_quarantine = None
 
 # --- Helper functions for scraping ---
 
+def get_quarantine():
+    """Returns the persistent URL quarantine (url_quarantine.py), opened on first use."""
+    global _quarantine
+    if _quarantine is None:
+        _quarantine = UrlQuarantine()
+    return _quarantine
+
+def fetch_response(url, headers=None, entry_point=False):
+    """
+    Downloads a page and returns the response (200, or 304 Not Modified for a conditional request),
+    or None if the URL is quarantined (it failed on an earlier run and its retry window has not elapsed).
+    Download errors are recorded in the quarantine and raised again.
+    Entry points (brand list, robots.txt, sitemaps) are never quarantined: a single transient failure
+    of one of them would otherwise skip whole crawls until its retry window elapsed.
+    """
+    quarantine = get_quarantine()
+    if not entry_point and quarantine.is_quarantined(url):
+        print(f"  Skipping quarantined URL: {url}")
+        return None
+    METRICS.inc('auto_data_requests_total')
+    try:
+        response = requests.get(url, headers=headers)
+        response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
+    except requests.exceptions.RequestException as e:
+        if not entry_point:
+            quarantine.record_failure(url, classify_exception(e), e, QUARANTINE_SOURCE)
+        raise
+    quarantine.record_success(url) # Release the URL if it failed on an earlier run
+    return response
+
+def fetch_page(url, entry_point=False):
+    """
+    Downloads a page and returns it parsed, or None if the URL is quarantined (see fetch_response).
+    """
+    response = fetch_response(url, entry_point=entry_point)
+    if response is None:
+        return None
+    return BeautifulSoup(response.text, 'html.parser')
+
+def mark_empty_page(url, what):
+    """Quarantines a page that loaded but does not contain the expected element."""
+    get_quarantine().record_failure(url, EMPTY_PAGE, f"no {what}", QUARANTINE_SOURCE)
+
 def get_all_brands(base_url="https://www.auto-data.net/en/"):
     """
     Retrieves a list of all car brands and their URLs from the main page.
@@ -12,9 +92,7 @@ def get_all_brands(base_url="https://www.auto-data.net/en/"):
     brands = []
     print(f"Downloading brand list from: {base_url}")
     try:
-        response = requests.get(base_url)
-        response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = fetch_page(base_url, entry_point=True)
 
         brand_div = soup.find('div', class_='markite')
         if brand_div:
@@ -38,9 +116,9 @@ def get_models_for_brand(brand_url):
     models = []
     print(f"  Downloading models from: {brand_url}")
     try:
-        response = requests.get(brand_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = fetch_page(brand_url)
+        if soup is None:
+            return models
 
         modelite_ul = soup.find('ul', class_='modelite')
         if modelite_ul:
@@ -52,6 +130,7 @@ def get_models_for_brand(brand_url):
                     models.append({'name': model_name, 'url': model_url})
         else:
             print(f"    Error: 'ul' element with class 'modelite' not found on page {brand_url}")
+            mark_empty_page(brand_url, "model list")
     except requests.exceptions.RequestException as e:
         print(f"  Error downloading models from {brand_url}: {e}")
     except Exception as e:
@@ -63,9 +142,9 @@ def get_generations_for_model(model_url):
     generations_data = []
     print(f"    Downloading generations from: {model_url}")
     try:
-        response = requests.get(model_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = fetch_page(model_url)
+        if soup is None:
+            return generations_data
 
         generr_table = soup.find('table', class_='generr')
         if generr_table:
@@ -90,6 +169,7 @@ def get_generations_for_model(model_url):
                     print(f"        Warning: Found generation row '{generation_name}', but URL link is missing. Skipping.")
         else:
             print("      Error: 'generr' table not found on the model page.")
+            mark_empty_page(model_url, "generation table")
     except requests.exceptions.RequestException as e:
         print(f"    Error downloading generations from {model_url}: {e}")
     except Exception as e:
@@ -102,9 +182,9 @@ def get_engines_for_generation(generation_url):
     engines_data = []
     print(f"      Downloading engines from: {generation_url}")
     try:
-        response = requests.get(generation_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = fetch_page(generation_url)
+        if soup is None:
+            return engines_data
 
         carlist_table = soup.find('table', class_='carlist')
         if carlist_table:
@@ -128,6 +208,7 @@ def get_engines_for_generation(generation_url):
                         print(f"        Warning: Found engine '{engine_name}', but URL link is missing. Skipping.")
         else:
             print("        Error: 'carlist' table not found on the generation page.")
+            mark_empty_page(generation_url, "engine table")
     except requests.exceptions.RequestException as e:
         print(f"      Error downloading engines from {generation_url}: {e}")
     except Exception as e:
@@ -135,18 +216,35 @@ def get_engines_for_generation(generation_url):
     
     return engines_data
 
-def get_engine_full_details(engine_url):
+def get_engine_full_details(engine_url, fingerprints=None):
     """
     Retrieves all detailed specifications from the 'cardetailsout car2' table on the engine page.
     Filters out section headings and "Log in to see." values.
+    With fingerprints the fingerprint of the table is recorded. In a refresh run the page is also requested
+    conditionally and the table is parsed only if it is new or changed since the previous run;
+    the result then has 'change' (new / changed / unchanged).
     """
     details = {}
     try:
-        response = requests.get(engine_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if fingerprints is None:
+            soup = fetch_page(engine_url)
+        else:
+            response = fetch_response(engine_url, headers=fingerprints.conditional_headers(engine_url))
+            if response is not None and response.status_code == 304:
+                return {'change': fingerprints.mark_not_modified(engine_url)}
+            soup = BeautifulSoup(response.text, 'html.parser') if response is not None else None
+        if soup is None:
+            return details
 
         car_details_table = soup.find('table', class_='cardetailsout car2')
+        if car_details_table and fingerprints is not None:
+            # Only the details table is hashed, so ads and page layout do not count as a change
+            change = fingerprints.check(engine_url, fingerprint_elements([car_details_table]), QUARANTINE_SOURCE,
+                                        response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            if fingerprints.refresh:
+                details['change'] = change
+                if change == UNCHANGED:
+                    return details
         if car_details_table:
             for row in car_details_table.find_all('tr'):
                 header_tag = row.find('th')
@@ -166,8 +264,8 @@ def get_engine_full_details(engine_url):
 
                     if is_valid_header and is_valid_value:
                         details[header_text] = value_text
-        # else: # No need to print error here, as some detail pages might not always be found if the URL doesn't exist
-            # print(f"        Error: 'cardetailsout car2' table not found on page {engine_url}.")
+        else: # No need to print error here, as some detail pages might not always be found if the URL doesn't exist
+            mark_empty_page(engine_url, "details table") # Skipped on the next runs until the retry window elapses
     except requests.exceptions.RequestException as e:
         print(f"        Error downloading engine details from {engine_url}: {e}")
     except Exception as e:
@@ -190,7 +288,7 @@ def save_all_data_to_csv(data_list, filename="complete_auto_data.csv"):
         all_fieldnames.update(row_dict.keys())
     
     # Prioritize basic headers for better CSV readability, then sort the rest alphabetically
-    initial_fieldnames = ['Brand', 'Model', 'Generation_Name', 'Engine_Name']
+    initial_fieldnames = KEY_COLUMNS + [URL_COLUMN]
     sorted_additional_fieldnames = sorted([f for f in all_fieldnames if f not in initial_fieldnames])
     final_fieldnames = initial_fieldnames + sorted_additional_fieldnames
 
@@ -208,10 +306,251 @@ def save_all_data_to_csv(data_list, filename="complete_auto_data.csv"):
         print(f"Error writing to CSV file '{filename}': {e}")
 
 
+# --- Sitemap discovery of engine pages ---
+def get_sitemap_urls(site_url=SITE_URL):
+    """
+    Returns the sitemaps listed in robots.txt ('Sitemap:' lines), or SITEMAP_URLS if there are none.
+    """
+    try:
+        response = fetch_response(site_url + "/robots.txt", entry_point=True)
+        sitemaps = [line.split(':', 1)[1].strip() for line in response.text.splitlines()
+                    if line.lower().startswith('sitemap:')]
+        if sitemaps:
+            return sitemaps
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading robots.txt from {site_url}: {e}")
+    return SITEMAP_URLS
+
+def read_sitemap(sitemap_url, visited=None):
+    """
+    Returns all pages of a sitemap as (URL, lastmod or None). Sitemap indexes are followed recursively,
+    gzipped sitemaps unpacked. A sitemap that cannot be downloaded or parsed contributes no URLs.
+    """
+    visited = set() if visited is None else visited
+    if sitemap_url in visited:
+        return []
+    visited.add(sitemap_url)
+    try:
+        response = fetch_response(sitemap_url, entry_point=True)
+        content = gzip.decompress(response.content) if response.content[:2] == b'\x1f\x8b' else response.content
+        root = ET.fromstring(content)
+    except (requests.exceptions.RequestException, ET.ParseError, OSError) as e:
+        print(f"  Error reading sitemap {sitemap_url}: {e}")
+        return []
+    METRICS.inc('auto_data_sitemaps_total')
+
+    # Tags are namespaced ('{http://www.sitemaps.org/schemas/sitemap/0.9}loc'); one <url> / <sitemap> per entry
+    entries = []
+    for entry in root:
+        fields = {child.tag.rsplit('}', 1)[-1]: child.text.strip() for child in entry if child.text}
+        if fields.get('loc'):
+            entries.append((fields['loc'], fields.get('lastmod')))
+    if root.tag.endswith('sitemapindex'):
+        pages = []
+        for location, _ in entries:
+            pages.extend(read_sitemap(location, visited))
+        return pages
+    return entries
+
+def load_sitemap_state(path=SITEMAP_STATE_FILE):
+    """
+    Returns {generation URL: {'brand': brand URL, 'lastmod': sitemap lastmod,
+    'engines': [engine URLs missing from the sitemap]}} of the generation pages checked on earlier runs.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('generations', {})
+    except (IOError, ValueError):
+        return {}
+
+def save_sitemap_state(checked_generations, path=SITEMAP_STATE_FILE):
+    """Writes the checked generation pages atomically (temporary file + os.replace)."""
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'generations': checked_generations}, f)
+    os.replace(path + ".tmp", path)
+
+def discover_engine_urls(brands, site_url=SITE_URL):
+    """
+    Lists the engine and generation pages of all brands from the site's sitemaps, so engines can be scraped
+    directly instead of walking brand -> model -> generation pages. A page belongs to the brand whose URL slug
+    is its longest prefix ('/en/alfa-romeo-brand-9' -> 'alfa-romeo-...').
+    Returns ({brand URL: [engine URLs]}, {brand URL: {generation URL: lastmod or None}}); brands without
+    engines in the sitemap are not in the first one (they are walked).
+    """
+    brand_slugs = {}
+    for brand in brands:
+        match = BRAND_SLUG_PATTERN.search(brand['url'])
+        if match:
+            brand_slugs[match.group(1)] = brand['url']
+    slugs_by_length = sorted(brand_slugs, key=len, reverse=True)
+
+    print(f"Reading sitemaps of {site_url}...")
+    pages = []
+    visited = set()
+    for sitemap_url in get_sitemap_urls(site_url):
+        pages.extend(read_sitemap(sitemap_url, visited))
+
+    engines_by_brand = {}
+    generations_by_brand = {}
+    seen = set()
+    for url, lastmod in pages:
+        if url in seen or not (ENGINE_URL_PATTERN.match(url) or GENERATION_URL_PATTERN.match(url)):
+            continue
+        seen.add(url)
+        page_slug = url.rsplit('/', 1)[1]
+        for slug in slugs_by_length:
+            if page_slug.startswith(slug + '-'):
+                if ENGINE_URL_PATTERN.match(url):
+                    engines_by_brand.setdefault(brand_slugs[slug], []).append(url)
+                else:
+                    generations_by_brand.setdefault(brand_slugs[slug], {})[url] = lastmod
+                break
+    print(f"Found {sum(map(len, engines_by_brand.values()))} engine pages of {len(engines_by_brand)} brands and "
+          f"{sum(map(len, generations_by_brand.values()))} generation pages in {len(visited)} sitemaps "
+          f"({len(pages)} URLs).")
+    return engines_by_brand, generations_by_brand
+
+def find_unlisted_engines(brand, listed_urls, generations, checked_generations, verify=False):
+    """
+    Finds engines of a brand covered by the sitemap that the sitemap does not list, so a partial sitemap
+    does not silently drop them. By default only the brand's generation pages listed in the sitemap
+    (generations: {URL: lastmod}) that are new or whose <lastmod> changed since they were last checked
+    (checked_generations, updated in place) are read - a few requests per run instead of a tree walk;
+    for the others (and generations found only by a --verify-sitemap walk), the missing engines found
+    when they were last read are returned again.
+    With verify (--verify-sitemap, meant as a periodic pass) all model and generation pages of the brand
+    are walked, which also finds generations missing from the sitemap.
+    Returns the engine URLs that are not in listed_urls.
+    """
+    if verify:
+        generation_urls = list(generations)
+        for model in get_models_for_brand(brand['url']):
+            time.sleep(1)
+            for gen in get_generations_for_model(model['url']):
+                if gen['Generation_URL'] and gen['Generation_URL'] not in generations:
+                    generation_urls.append(gen['Generation_URL'])
+        generation_urls = list(dict.fromkeys(generation_urls))
+    else:
+        generation_urls = [url for url, lastmod in generations.items()
+                           if url not in checked_generations or (lastmod and checked_generations[url]['lastmod'] != lastmod)]
+
+    unlisted = []
+    seen = set(listed_urls)
+    for generation_url in generation_urls:
+        time.sleep(1)
+        engines = [engine['Engine_URL'] for engine in get_engines_for_generation(generation_url)]
+        if engines:
+            checked_generations[generation_url] = {'brand': brand['url'], 'lastmod': generations.get(generation_url),
+                                                   'engines': [url for url in engines if url not in seen]}
+        for engine_url in engines:
+            if engine_url not in seen:
+                seen.add(engine_url)
+                unlisted.append(engine_url)
+    read_generations = set(generation_urls)
+    for generation_url, checked in checked_generations.items():
+        if checked['brand'] == brand['url'] and generation_url not in read_generations:
+            for engine_url in checked['engines']:
+                if engine_url not in seen:
+                    seen.add(engine_url)
+                    unlisted.append(engine_url)
+    METRICS.inc('auto_data_listing_pages_checked_total', len(generation_urls))
+    METRICS.inc('auto_data_unlisted_engines_total', len(unlisted))
+    return unlisted
+
+# --- Crawling ---
+def scrape_engine(engine_url, row_keys, fingerprints=None):
+    """
+    Returns the row of one engine: the key columns (row_keys, or read from the details table if None)
+    and the engine page URL (URL_COLUMN), updated with all details. Returns None if the engine is unchanged in a refresh run, or if its
+    key columns are unknown.
+    """
+    engine_full_details = get_engine_full_details(engine_url, fingerprints)
+    if fingerprints is not None and fingerprints.refresh and engine_full_details.get('change') not in (NEW, CHANGED):
+        print("            Unchanged, skipping.") # Previous row stays in the CSV
+        return None
+    if row_keys is None:
+        row_keys = {column: engine_full_details.get(detail, '') for column, detail in DETAIL_KEY_COLUMNS.items()}
+        if not row_keys['Brand'] or not row_keys['Engine_Name']:
+            print(f"            No brand or engine name on {engine_url}. Skipping.")
+            return None
+    current_row_data = dict(row_keys)
+    current_row_data[URL_COLUMN] = engine_url
+    current_row_data.update(engine_full_details)
+    return current_row_data
+
+def crawl_engine_urls(engine_urls, fingerprints=None):
+    """
+    Scrapes engine pages found in the sitemap directly (one request per engine). Returns the rows.
+    """
+    rows = []
+    total_engines = len(engine_urls)
+    for i_engine, engine_url in enumerate(engine_urls, 1):
+        print(f"            Downloading engine details: {engine_url} ({i_engine}/{total_engines})")
+        row = scrape_engine(engine_url, None, fingerprints)
+        if row is not None:
+            rows.append(row)
+        time.sleep(0.5)
+    return rows
+
+def crawl_brand_tree(brand, fingerprints=None):
+    """
+    Walks the model, generation and engine pages of one brand and scrapes every engine. Returns the rows.
+    """
+    rows = []
+    models = get_models_for_brand(brand['url'])
+    if models:
+        total_models = len(models)
+        print(f"  Found {total_models} models for {brand['name']}.")
+        for i_model, model in enumerate(models, 1):
+            print(f"    Processing model: {model['name']} ({i_model}/{total_models})")
+            time.sleep(1)
+
+            generations = get_generations_for_model(model['url'])
+            if generations:
+                total_generations = len(generations)
+                print(f"      Found {total_generations} generations for {model['name']}.")
+                for i_gen, gen in enumerate(generations, 1):
+                    if gen['Generation_URL']:
+                        print(f"        Processing generation: {gen['Generation_Name']} ({i_gen}/{total_generations})")
+                        time.sleep(1)
+
+                        engines = get_engines_for_generation(gen['Generation_URL'])
+                        if engines:
+                            total_engines = len(engines)
+                            print(f"          Found {total_engines} engines for {gen['Generation_Name']}.")
+                            for i_engine, engine in enumerate(engines, 1):
+                                if engine['Engine_URL']:
+                                    print(f"            Downloading engine details: {engine['Engine_Name']} ({i_engine}/{total_engines})")
+                                    row_keys = {
+                                        'Brand': brand['name'],
+                                        'Model': model['name'],
+                                        'Generation_Name': gen['Generation_Name'],
+                                        'Engine_Name': engine['Engine_Name']
+                                    }
+                                    current_row_data = scrape_engine(engine['Engine_URL'], row_keys, fingerprints)
+                                    if current_row_data is not None:
+                                        rows.append(current_row_data)
+                                    time.sleep(0.5)
+                                else:
+                                    print(f"          Engine URL for '{engine['Engine_Name']}' not found. Skipping.")
+                        else:
+                            print(f"          No engines found for generation '{gen['Generation_Name']}'.")
+                    else:
+                        print(f"        Generation URL for '{gen['Generation_Name']}' not found. Skipping.")
+            else:
+                print(f"      No generations found for model '{model['name']}'.")
+    else:
+        print(f"    No models found for brand '{brand['name']}'.")
+    return rows
+
+
 # --- Main script execution block with progress indicators ---
 if __name__ == "__main__":
     base_brands_url = "https://www.auto-data.net/en/"
     all_collected_data = []
+    # --refresh: only engines whose details are new or changed since the previous run are collected
+    # and merged into the existing CSV (page_fingerprints.py); a full run records the fingerprints for it
+    fingerprints = FingerprintStore(refresh="--refresh" in sys.argv)
 
     print(f"--- STARTING COMPLETE AUTO-DATA.NET SCRAPING ---")
 
@@ -219,63 +558,60 @@ if __name__ == "__main__":
     if brands:
         total_brands = len(brands)
         print(f"\nFound {total_brands} brands to process.")
-        
+        # Engine pages listed in the sitemap are scraped directly, only brands missing from it are walked
+        # page by page (--tree-walk walks all brands). For brands in the sitemap, new or changed generation pages
+        # of the sitemap are read to find engines it misses (--verify-sitemap walks all their model pages too).
+        engines_by_brand, generations_by_brand = ({}, {}) if "--tree-walk" in sys.argv else discover_engine_urls(brands)
+        checked_generations = load_sitemap_state()
+
         for i_brand, brand in enumerate(brands, 1):
             print(f"\nProcessing brand: {brand['name']} ({i_brand}/{total_brands})")
-            time.sleep(1) # Decent delay for server courtesy
-
-            models = get_models_for_brand(brand['url'])
-            if models:
-                total_models = len(models)
-                print(f"  Found {total_models} models for {brand['name']}.")
-                for i_model, model in enumerate(models, 1):
-                    print(f"    Processing model: {model['name']} ({i_model}/{total_models})")
-                    time.sleep(1)
-
-                    generations = get_generations_for_model(model['url'])
-                    if generations:
-                        total_generations = len(generations)
-                        print(f"      Found {total_generations} generations for {model['name']}.")
-                        for i_gen, gen in enumerate(generations, 1):
-                            if gen['Generation_URL']:
-                                print(f"        Processing generation: {gen['Generation_Name']} ({i_gen}/{total_generations})")
-                                time.sleep(1)
-
-                                engines = get_engines_for_generation(gen['Generation_URL'])
-                                if engines:
-                                    total_engines = len(engines)
-                                    print(f"          Found {total_engines} engines for {gen['Generation_Name']}.")
-                                    for i_engine, engine in enumerate(engines, 1):
-                                        if engine['Engine_URL']:
-                                            print(f"            Downloading engine details: {engine['Engine_Name']} ({i_engine}/{total_engines})")
-                                            engine_full_details = get_engine_full_details(engine['Engine_URL'])
-                                            
-                                            current_row_data = {
-                                                'Brand': brand['name'],
-                                                'Model': model['name'],
-                                                'Generation_Name': gen['Generation_Name'],
-                                                'Engine_Name': engine['Engine_Name']
-                                            }
-                                            current_row_data.update(engine_full_details)
-                                            
-                                            all_collected_data.append(current_row_data)
-                                            time.sleep(0.5)
-                                        else:
-                                            print(f"          Engine URL for '{engine['Engine_Name']}' not found. Skipping.")
-                                else:
-                                    print(f"          No engines found for generation '{gen['Generation_Name']}'.")
-                            else:
-                                print(f"        Generation URL for '{gen['Generation_Name']}' not found. Skipping.")
-                    else:
-                        print(f"      No generations found for model '{model['name']}'.")
+            engine_urls = engines_by_brand.get(brand['url'])
+            if engine_urls:
+                print(f"  Found {len(engine_urls)} engines of {brand['name']} in the sitemap.")
+                unlisted = find_unlisted_engines(brand, engine_urls, generations_by_brand.get(brand['url'], {}),
+                                                 checked_generations, verify="--verify-sitemap" in sys.argv)
+                if unlisted:
+                    print(f"  {len(unlisted)} engines of {brand['name']} are missing from the sitemap, scraping them too.")
+                all_collected_data.extend(crawl_engine_urls(engine_urls + unlisted, fingerprints))
             else:
-                print(f"    No models found for brand '{brand['name']}'.")
+                time.sleep(1) # Decent delay for server courtesy
+                all_collected_data.extend(crawl_brand_tree(brand, fingerprints))
+        if engines_by_brand:
+            save_sitemap_state(checked_generations)
     else:
         print(f"Error: No brands found from '{base_brands_url}'.")
-
-    if all_collected_data:
-        save_all_data_to_csv(all_collected_data, filename="complete_auto_data.csv")
+    print(f"\n{METRICS.counters.get('auto_data_requests_total', 0)} requests sent "
+          f"({METRICS.counters.get('auto_data_sitemaps_total', 0)} sitemaps, "
+          f"{METRICS.counters.get('auto_data_listing_pages_checked_total', 0)} generation pages checked, "
+          f"{METRICS.counters.get('auto_data_unlisted_engines_total', 0)} engines missing from the sitemap).")
+    if fingerprints.refresh:
+        print(f"\nRefresh: {fingerprints.counts[NEW]} new, {fingerprints.counts[CHANGED]} changed, "
+              f"{fingerprints.counts[UNCHANGED]} unchanged engines.")
+        fingerprints.close()
+        if all_collected_data:
+            save_all_data_to_csv(all_collected_data, filename=delta_filename(OUTPUT_CSV))
+            try:
+                has_urls = True
+                if os.path.exists(OUTPUT_CSV):
+                    with open(OUTPUT_CSV, 'r', newline='', encoding='utf-8') as f:
+                        has_urls = URL_COLUMN in next(csv.reader(f, delimiter=';'), [])
+                if not has_urls:
+                    print(f"'{OUTPUT_CSV}' has no {URL_COLUMN} column yet, merging on names; run a full crawl to add it.")
+                rows = merge_delta(OUTPUT_CSV, all_collected_data, [URL_COLUMN] if has_urls else KEY_COLUMNS,
+                                   delimiter=';', encoding='utf-8')
+                print(f"File '{OUTPUT_CSV}' updated ({rows} records).")
+            except (IOError, csv.Error) as e:
+                print(f"Error merging the delta into '{OUTPUT_CSV}': {e}")
+        else:
+            print(f"No changes, '{OUTPUT_CSV}' is up to date.")
     else:
-        print("\nNo data collected to save to CSV.")
+        fingerprints.close()
+        if all_collected_data:
+            save_all_data_to_csv(all_collected_data, filename=OUTPUT_CSV)
+        else:
+            print("\nNo data collected to save to CSV.")
+
+    get_quarantine().save_report()
 
     print("\n--- COMPLETE SCRAPING FINISHED ---")
\ No newline at end of file
@@ -9,12 +9,20 @@ from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError
 from shapely.geometry import shape, MultiPolygon, Polygon
 import warnings
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 import datetime
-import sys # For redirecting output
+import logging
+import sys
+from collections import deque
+from Dedup_OSM_data import OsmDeduplicator, RAW_FILE_PATTERN, dedup_file_order, dedup_raw_files, save_dedup_report
+import osm_manifest
+import dataset_manifest
+from pipeline_metrics import METRICS, BYTES_BUCKETS, COUNT_BUCKETS, run_with_metrics, collect_result
+from pipeline_logging import DEFAULT_LOG_LEVEL, setup_logging, shutdown_logging, worker_init
 
 # --- Configuration ---
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+# Can be overridden with the OVERPASS_URL environment variable (e.g. a local server replaying recorded responses)
+OVERPASS_URL = os.environ.get("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
 GEOJSON_DATA_FOLDER = "country_geojson_data" # Folder with GeoJSON country boundary files
 TEMP_OSM_DATA_FOLDER = "temp_osm_data" # Folder for temporary CSVs with raw OSM data (before geocoding)
 FINAL_OUTPUT_FOLDER = "final_output_by_country" # Folder for final geocoded CSV files
@@ -28,6 +36,10 @@ STEP_LAT, STEP_LON = 0.5, 0.5
 # Helps keep temporary files smaller and more manageable
 MAX_SQUARES_PER_COUNTRY_PART_FILE = 2000
 
+# Number of squares in one unit of work for the process pool.
+# Small batches keep all workers busy until the end, even when a few countries have thousands of squares.
+TILE_BATCH_SIZE = 25
+
 # Pause between individual queries to Overpass API (in seconds)
 QUERY_PAUSE_SECONDS = 5
 
@@ -35,13 +47,32 @@ QUERY_PAUSE_SECONDS = 5
 MAX_RETRIES_OVERPASS = 3
 RETRY_DELAY_OVERPASS = 10
 
+# If True, complete part files are verified against their SHA-256 checksum from the manifest on every run.
+# Otherwise only the file size is compared, which keeps the resume check O(1) per part.
+VERIFY_PART_CHECKSUMS = False
+
+# Incremental update mode (run the script with --incremental):
+# instead of downloading everything again, only changes since the last successful query
+# of every square are downloaded and applied to the existing raw part files
+INCREMENTAL_UPDATE = "--incremental" in sys.argv
+
 # Settings for reverse geocoding (Nominatim)
 GEOCODING_PAUSE_SECONDS = 1.0 # Nominatim recommends min. 1 query per second
 MAX_RETRIES_GEOCODING = 2
 
+# Log level of the console and the JSON lines log file; with "DEBUG" every square and geocoding retry is logged
+LOG_LEVEL = DEFAULT_LOG_LEVEL
+
 # Maximum number of parallel processes
 MAX_WORKERS = os.cpu_count() or 4 # Use all available CPU cores, or default to 4
 
+# Download and geocoding run as a pipeline with separate process pools
+MAX_GEOCODING_WORKERS = MAX_WORKERS
+# Maximum number of download batches handed to the download pool at once
+MAX_DOWNLOAD_BATCHES_IN_FLIGHT = MAX_WORKERS * 2
+# Maximum number of downloaded countries waiting for geocoding; downloads pause while the queue is full
+GEOCODING_QUEUE_SIZE = MAX_GEOCODING_WORKERS * 2
+
 # User agent for Nominatim - MUST CHANGE!
 NOMINATIM_USER_AGENT = "EV_Charger_Scraper_Global/1.0 (your_email@example.com)"
 
@@ -51,7 +82,7 @@ warnings.filterwarnings("ignore", category=UserWarning, module='shapely')
 # --- Global CSV Column Configuration ---
 # These are the fields we expect in the final CSV
 ALL_FIELDNAMES = [
-    'id', 'lat', 'lon', 'amenity',
+    'id', 'type', 'lat', 'lon', 'amenity',
     # Added geocoding columns
     'city', 'state', 'country', 'scraped_country_code', 'scraped_country_name',
     # Example of other OSM tags that might be of interest
@@ -65,47 +96,99 @@ ALL_FIELDNAMES = [
 # Columns that are required for geocoding (should be filled by geocoding phase)
 GEOCODED_COLUMNS = ['city', 'state', 'country', 'scraped_country_code', 'scraped_country_name']
 
-# --- Logging to File ---
-class Tee:
-    """
-    A class to redirect stdout and stderr to multiple destinations (e.g., console and file).
-    """
-    def __init__(self, *files):
-        self.files = files
-    def write(self, obj):
-        for f in self.files:
-            f.write(obj)
-            f.flush() # Ensure data is written immediately
-    def flush(self) :
-        for f in self.files:
-            f.flush()
+# --- Logging ---
+# All processes log through the queue set up by pipeline_logging (see the main block)
+logger = logging.getLogger("Scrap_API_Oper_pass_geo")
 
 # --- Helper Functions for Overpass API ---
-def get_overpass_data(bbox, current_attempt=1):
+def get_overpass_data(bbox, current_attempt=1, newer_than=None):
     """
     Downloads EV charging station data from Overpass API for a given bounding box.
     Implements retries.
+    Ways and relations are returned with a computed 'center' instead of their member nodes,
+    so every charging station arrives as a single element with coordinates.
+
+    With newer_than (an Overpass timestamp), the response contains only the ids of all
+    charging stations in the box (without tags) followed by full records of the stations
+    created or modified since that timestamp - enough to apply adds, modifications and deletions.
     """
     min_lat, min_lon, max_lat, max_lon = bbox
 
-    overpass_query = f"""
+    if newer_than:
+        overpass_query = f"""
     [out:json][timeout:180];
     (
       node["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
       way["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
       relation["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
+    )->.all;
+    .all out ids qt;
+    (
+      node.all(newer:"{newer_than}");
+      way.all(newer:"{newer_than}");
+      relation.all(newer:"{newer_than}");
     );
-    out body;
-    >;
-    out skel qt;
+    out tags center qt;
     """
+    else:
+        overpass_query = f"""
+    [out:json][timeout:180];
+    (
+      node["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
+      way["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
+      relation["amenity"="charging_station"]({min_lat},{min_lon},{max_lat},{max_lon});
+    );
+    out tags center qt;
+    """
+    METRICS.inc('overpass_requests_total')
     try:
-        response = requests.post(OVERPASS_URL, data=overpass_query)
+        with METRICS.timer('overpass_request_seconds'):
+            response = requests.post(OVERPASS_URL, data=overpass_query)
+        METRICS.inc('overpass_response_bytes_total', len(response.content))
+        METRICS.observe('overpass_response_bytes', len(response.content), BYTES_BUCKETS)
         response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
         return response.json()
     except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-        print(f"Error downloading data for box {bbox} (attempt {current_attempt}): {e}")
+        METRICS.inc('overpass_errors_total')
+        logger.warning(f"Error downloading data for box {bbox} (attempt {current_attempt}): {e}")
+        return None
+
+def get_element_coordinates(element):
+    """
+    Returns (lat, lon) of an OSM element. Nodes carry 'lat'/'lon' directly,
+    ways and relations carry them in 'center' (from 'out center').
+    Returns (None, None) if the element has no coordinates.
+    """
+    if 'lat' in element and 'lon' in element:
+        return element['lat'], element['lon']
+    center = element.get('center')
+    if center and 'lat' in center and 'lon' in center:
+        return center['lat'], center['lon']
+    return None, None
+
+def element_to_charger_info(element, country_code, country_name):
+    """
+    Converts one OSM element into a raw charger record with the fields of ALL_FIELDNAMES
+    (except the geocoded ones). Returns None for elements without coordinates.
+    """
+    lat, lon = get_element_coordinates(element)
+    if lat is None or lon is None:
         return None
+    tags = element.get('tags', {})
+    charger_info = {
+        'id': element['id'],
+        'type': element.get('type', 'node'),
+        'lat': lat,
+        'lon': lon,
+        'amenity': tags.get('amenity', 'N/A'),
+        'scraped_country_code': country_code, # Add country info from GeoJSON
+        'scraped_country_name': country_name
+    }
+    # Add all other OSM tags that are in our ALL_FIELDNAMES
+    for field in ALL_FIELDNAMES:
+        if field not in charger_info and field not in GEOCODED_COLUMNS:
+            charger_info[field] = tags.get(field, 'N/A')
+    return charger_info
 
 # --- Helper Functions for Geocoding ---
 def get_location_details(lat, lon, geolocator_instance, current_attempt=1):
@@ -113,8 +196,10 @@ def get_location_details(lat, lon, geolocator_instance, current_attempt=1):
     Performs reverse geocoding for given coordinates and returns city, state, and country.
     Requires a geolocator instance.
     """
+    METRICS.inc('nominatim_requests_total')
     try:
-        location = geolocator_instance.reverse((lat, lon), language="en", timeout=10)
+        with METRICS.timer('nominatim_request_seconds'):
+            location = geolocator_instance.reverse((lat, lon), language="en", timeout=10)
         if location and location.address:
             address = location.raw.get('address', {})
             city = address.get('city') or address.get('town') or address.get('village') or 'N/A'
@@ -123,10 +208,12 @@ def get_location_details(lat, lon, geolocator_instance, current_attempt=1):
             return city, state, country
         return 'N/A', 'N/A', 'N/A'
     except (GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError) as e:
-        # print(f"Geocoding error for coordinates ({lat}, {lon}) (attempt {current_attempt}): {e}") # Logged in main process
+        logger.debug(f"Geocoding error for coordinates ({lat}, {lon}) (attempt {current_attempt}): {e}")
+        METRICS.inc('nominatim_errors_total')
         return None, None, None # Return None to indicate failure and prompt a retry
     except Exception as e:
-        print(f"Unexpected error during geocoding ({lat}, {lon}): {e}")
+        METRICS.inc('nominatim_errors_total')
+        logger.error(f"Unexpected error during geocoding ({lat}, {lon}): {e}")
         return 'N/A', 'N/A', 'N/A'
 
 # --- Function for Generating Grid Bounding Boxes ---
@@ -153,7 +240,7 @@ def get_bbox_from_geojson(geojson_data):
     from GeoJSON data.
     """
     if not geojson_data or 'features' not in geojson_data:
-        # print("   Debug: No GeoJSON data or features found.") # Debug
+        logger.debug("   No GeoJSON data or features found.")
         return None
 
     all_coordinates = []
@@ -166,12 +253,12 @@ def get_bbox_from_geojson(geojson_data):
                     min_lon, min_lat, max_lon, max_lat = geom.bounds
                     all_coordinates.append((min_lon, min_lat, max_lon, max_lat))
                 else:
-                    print(f"Warning: Invalid geometry in GeoJSON file. Type: {geometry.get('type')}. Skipping feature.")
+                    logger.warning(f"Warning: Invalid geometry in GeoJSON file. Type: {geometry.get('type')}. Skipping feature.")
             except Exception as e:
-                print(f"Error processing geometry in feature: {e}. Geometry type: {geometry.get('type')}. Skipping feature.")
+                logger.error(f"Error processing geometry in feature: {e}. Geometry type: {geometry.get('type')}. Skipping feature.")
 
     if not all_coordinates:
-        # print("   Debug: No valid coordinates found after processing all features.") # Debug
+        logger.debug("   No valid coordinates found after processing all features.")
         return None
 
     global_min_lon = min(bbox[0] for bbox in all_coordinates)
@@ -189,17 +276,17 @@ def generate_country_bboxes(folder_path):
     countries_data = {}
     
     if not os.path.isdir(folder_path):
-        print(f"Error: Folder '{folder_path}' not found. Make sure the GeoJSON files are there.")
+        logger.error(f"Error: Folder '{folder_path}' not found. Make sure the GeoJSON files are there.")
         return countries_data
 
-    print(f"Loading country bounding boxes from folder: '{folder_path}'")
+    logger.info(f"Loading country bounding boxes from folder: '{folder_path}'")
     for filename in os.listdir(folder_path):
         if filename.endswith(".json"):
             filepath = os.path.join(folder_path, filename)
             country_name_from_file = os.path.splitext(filename)[0].replace("_", " ").title()
             country_code = country_name_from_file[:3].upper() # For simplicity, ideally map by ISO codes
 
-            print(f"   Processing file: {filename}")
+            logger.debug(f"   Processing file: {filename}")
             try:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     geojson_data = json.load(f)
@@ -209,182 +296,508 @@ def generate_country_bboxes(folder_path):
                     # Here we calculate the number of squares
                     num_squares = len(generate_grid_boxes(bbox[0], bbox[1], bbox[2], bbox[3], STEP_LAT, STEP_LON))
                     countries_data[country_code] = (country_name_from_file, bbox, num_squares)
-                    print(f"     Found bounding box: {bbox}, Number of squares: {num_squares}")
+                    logger.debug(f"     Found bounding box: {bbox}, Number of squares: {num_squares}")
                 else:
-                    print(f"     Failed to get bounding box for {country_name_from_file} from {filename}.")
+                    logger.warning(f"     Failed to get bounding box for {country_name_from_file} from {filename}.")
 
             except json.JSONDecodeError:
-                print(f"Error: File {filename} is not a valid JSON.")
+                logger.error(f"Error: File {filename} is not a valid JSON.")
             except Exception as e:
-                print(f"An unexpected error occurred while processing {filename}: {e}")
+                logger.error(f"An unexpected error occurred while processing {filename}: {e}")
     
     return countries_data
 
 # --- Phase 1: Downloading data from Overpass API ---
+def query_square(bbox, label, newer_than=None):
+    """
+    Queries one grid square with retries.
+    Returns the Overpass response, or None if all attempts failed.
+    """
+    for attempt in range(MAX_RETRIES_OVERPASS):
+        osm_data = get_overpass_data(bbox, attempt + 1, newer_than=newer_than)
+        if osm_data and 'elements' in osm_data:
+            return osm_data
+        elif attempt < MAX_RETRIES_OVERPASS - 1:
+            logger.warning(f"      Waiting {RETRY_DELAY_OVERPASS} seconds before next attempt for box {bbox}...")
+            METRICS.inc('overpass_retries_total')
+            METRICS.inc('overpass_retry_wait_seconds_total', RETRY_DELAY_OVERPASS)
+            time.sleep(RETRY_DELAY_OVERPASS)
+        else:
+            METRICS.inc('overpass_squares_failed_total')
+            logger.warning(f"      All attempts for box {bbox} failed for {label}.")
+    return None
+
+def download_square(bbox, country_code, country_name, label):
+    """
+    Downloads one grid square with retries.
+    Returns (records, timestamp): the list of raw charger records and the Overpass data timestamp,
+    or (None, None) if all attempts failed.
+    """
+    osm_data = query_square(bbox, label)
+    if osm_data is None:
+        return None, None
+    records = []
+    for element in osm_data['elements']:
+        charger_info = element_to_charger_info(element, country_code, country_name)
+        if charger_info is not None:
+            records.append(charger_info)
+    METRICS.inc('osm_squares_downloaded_total')
+    METRICS.inc('osm_elements_parsed_total', len(osm_data['elements']))
+    METRICS.observe('osm_elements_per_square', len(osm_data['elements']), COUNT_BUCKETS)
+    logger.debug(f"      Found {len(osm_data['elements'])} elements.")
+    return records, osm_data.get('osm3s', {}).get('timestamp_osm_base')
+
+def get_part_filename(temp_folder, country_name, part_index, num_parts):
+    """
+    Returns the path of the raw CSV file for one part of a country.
+    """
+    part_suffix = f" [Part {part_index + 1}]" if num_parts > 1 else ""
+    return os.path.join(temp_folder, f"ev_chargers_osm_raw_{country_name.replace(' ', '_').lower()}{part_suffix}.csv")
+
+def plan_country_parts(country_data, temp_folder, manifest):
+    """
+    Checks all parts of a country against the download manifest and returns a list of part plans:
+    dictionaries with the part file, its squares, the squares still to download ('pending')
+    and the row count of parts that are already complete.
+    Unregistered files from older runs are adopted: they stay in use, but all their squares are scheduled
+    for download to record the timestamps needed by incremental refreshes ('adopted' plans).
+    Corrupt files are scheduled for a new download.
+    """
+    country_code, (country_name, bbox_coords, num_squares_total) = country_data
+    min_lat, min_lon, max_lat, max_lon = bbox_coords
+    all_country_boxes = generate_grid_boxes(min_lat, min_lon, max_lat, max_lon, STEP_LAT, STEP_LON)
+    num_parts = (len(all_country_boxes) + MAX_SQUARES_PER_COUNTRY_PART_FILE - 1) // MAX_SQUARES_PER_COUNTRY_PART_FILE
+
+    part_plans = []
+    for part_index in range(num_parts):
+        output_filename_for_part = get_part_filename(temp_folder, country_name, part_index, num_parts)
+        part_file = os.path.basename(output_filename_for_part)
+        start_idx = part_index * MAX_SQUARES_PER_COUNTRY_PART_FILE
+        end_idx = min((part_index + 1) * MAX_SQUARES_PER_COUNTRY_PART_FILE, len(all_country_boxes))
+        target_boxes_part = all_country_boxes[start_idx:end_idx]
+
+        plan = {
+            'country_code': country_code,
+            'country_name': country_name,
+            'part_file': part_file,
+            'path': output_filename_for_part,
+            'label': f"{country_name} [Part {part_index + 1}]" if num_parts > 1 else country_name,
+            'num_tiles': len(target_boxes_part),
+            'complete': False,
+            'adopted': False,
+            'row_count': 0,
+            'pending': [],
+        }
+
+        part_state = osm_manifest.check_part(manifest, part_file, output_filename_for_part, verify_checksum=VERIFY_PART_CHECKSUMS)
+        if part_state == osm_manifest.PART_COMPLETE:
+            logger.info(f"  --- File '{output_filename_for_part}' is complete according to the manifest. Skipping this part for {country_name}. ---")
+            plan['complete'] = True
+            plan['row_count'] = osm_manifest.get_part(manifest, part_file)['row_count']
+            part_plans.append(plan)
+            continue
+        elif part_state == 'unregistered':
+            # File from a run before the manifest existed - keep using it until its squares are downloaded again
+            try:
+                row_count = osm_manifest.adopt_part_file(manifest, part_file, output_filename_for_part,
+                                                         country_code, country_name, len(target_boxes_part))
+                logger.info(f"  --- File '{output_filename_for_part}' registered in the manifest ({row_count} rows). "
+                            f"Its squares are downloaded again to record refresh timestamps. ---")
+                plan['adopted'] = True
+                plan['row_count'] = row_count
+            except (IOError, csv.Error) as e:
+                logger.warning(f"  Warning: Existing file '{output_filename_for_part}' is unreadable ({e}). Downloading this part again.")
+                osm_manifest.reset_part(manifest, part_file)
+        elif part_state == osm_manifest.PART_ADOPTED:
+            plan['adopted'] = True
+            plan['row_count'] = osm_manifest.get_part(manifest, part_file)['row_count']
+        elif part_state == 'corrupt':
+            logger.warning(f"  Warning: File '{output_filename_for_part}' does not match the manifest (truncated or modified). Downloading this part again.")
+            osm_manifest.reset_part(manifest, part_file)
+
+        # Squares already downloaded in a previous (interrupted or partially failed) run are skipped
+        tile_statuses = osm_manifest.get_tile_statuses(manifest, part_file)
+        plan['pending'] = [(i, bbox) for i, bbox in enumerate(target_boxes_part)
+                           if tile_statuses.get(i) != osm_manifest.TILE_OK]
+        part_plans.append(plan)
+    return part_plans
+
+def download_tile_batch(country_code, country_name, part_file, label, squares, temp_folder):
+    """
+    Downloads a batch of squares of one part and records every square in the manifest.
+    This is the unit of work handed to the process pool, so large countries are spread over all workers.
+    squares is a list of (tile_index, bbox) within the part.
+    Returns a dictionary with the part file and the squares that failed.
+    """
+    batch_start_time = time.time()
+    manifest = osm_manifest.connect(temp_folder)
+    failed_squares = []
+    try:
+        for tile_index, bbox in squares:
+            logger.debug(f"    Processing square {tile_index + 1} for {label}: {bbox}")
+            records, timestamp = download_square(bbox, country_code, country_name, label)
+            if records is None:
+                failed_squares.append((tile_index, bbox))
+                osm_manifest.record_tile(manifest, part_file, tile_index, bbox, osm_manifest.TILE_FAILED, [])
+            else:
+                osm_manifest.record_tile(manifest, part_file, tile_index, bbox, osm_manifest.TILE_OK, records, timestamp)
+            METRICS.inc('overpass_pause_seconds_total', QUERY_PAUSE_SECONDS)
+            time.sleep(QUERY_PAUSE_SECONDS)
+    finally:
+        manifest.close()
+    METRICS.observe('tile_batch_seconds', time.time() - batch_start_time)
+    return {'part_file': part_file, 'failed': failed_squares}
+
+def finalize_part(plan, manifest, failed_squares):
+    """
+    Writes the part file from all successfully downloaded squares (deduplicated) with an atomic replace
+    and records it in the manifest. Parts with failed squares are recorded as partial,
+    so only the failed squares are downloaded again on the next run.
+    Returns the number of written rows.
+    """
+    part_fieldnames = [f for f in ALL_FIELDNAMES if f not in GEOCODED_COLUMNS]
+    seen_ids_for_part = set() # Deduplication within this country part, keyed by (OSM type, id)
+    def unique_part_rows():
+        for row in osm_manifest.load_part_rows(manifest, plan['part_file']):
+            element_key = (row.get('type', 'node'), row['id'])
+            if element_key not in seen_ids_for_part:
+                seen_ids_for_part.add(element_key)
+                yield row
+
+    if plan['adopted'] and failed_squares:
+        # An adopted file is replaced only once all its squares are downloaded, so no data is lost in the meantime
+        logger.warning(f"  {len(failed_squares)} squares failed for {plan['label']}. Keeping the existing file "
+                       f"until they are downloaded on the next run.")
+        return plan['row_count']
+
+    part_status = osm_manifest.PART_PARTIAL if failed_squares else osm_manifest.PART_COMPLETE
+    try:
+        with METRICS.timer('part_write_seconds'):
+            row_count, size_bytes, sha256 = osm_manifest.write_csv_atomic(plan['path'], part_fieldnames, unique_part_rows())
+        osm_manifest.record_part(manifest, plan['part_file'], plan['country_code'], plan['country_name'], plan['num_tiles'],
+                                 part_status, row_count, size_bytes, sha256)
+        logger.info(f"  Successfully saved {row_count} unique records for {plan['label']} to '{plan['path']}'.")
+        if failed_squares:
+            logger.warning(f"  {len(failed_squares)} squares failed for {plan['label']}. Only these will be downloaded again on the next run.")
+        return row_count
+    except IOError as e:
+        logger.error(f"  Error writing country part file '{plan['path']}': {e}")
+        return 0
+
 def download_osm_data_for_country_part(country_data, temp_folder, global_fieldnames_subset):
     """
     Downloads charging station data for a given country (or part of it)
     and saves raw data (ID, lat, lon, OSM tags) to a temporary CSV file.
+    Progress of every square is recorded in the download manifest (see osm_manifest.py),
+    so an interrupted or partially failed part is resumed square by square
+    and part files are only ever replaced atomically.
+    Processes the country sequentially; the main block uses download_all_countries instead.
     """
     country_code, (country_name, bbox_coords, num_squares_total) = country_data
     
-    print(f"\n--- Starting OSM data download for {country_name} ({country_code}) ---")
-    
-    min_lat, min_lon, max_lat, max_lon = bbox_coords
-    all_country_boxes = generate_grid_boxes(min_lat, min_lon, max_lat, max_lon, STEP_LAT, STEP_LON)
-    
-    num_parts = (len(all_country_boxes) + MAX_SQUARES_PER_COUNTRY_PART_FILE - 1) // MAX_SQUARES_PER_COUNTRY_PART_FILE
+    logger.info(f"\n--- Starting OSM data download for {country_name} ({country_code}) ---")
     
     overall_elements_downloaded = 0
+    manifest = osm_manifest.connect(temp_folder)
     
-    for part_index in range(num_parts):
-        part_suffix = ""
-        if num_parts > 1:
-            part_suffix = f" [Part {part_index + 1}]"
-        
-        output_filename_for_part = os.path.join(temp_folder, f"ev_chargers_osm_raw_{country_name.replace(' ', '_').lower()}{part_suffix}.csv")
+    for plan in plan_country_parts(country_data, temp_folder, manifest):
+        if plan['complete']:
+            overall_elements_downloaded += plan['row_count']
+            continue
 
-        if os.path.exists(output_filename_for_part):
-            print(f"\n  --- File '{output_filename_for_part}' already exists. Skipping this part for {country_name}. ---")
-            # If the file exists, load the number of elements for logging
-            try:
-                with open(output_filename_for_part, 'r', newline='', encoding='utf-8') as infile:
-                    reader = csv.DictReader(infile)
-                    overall_elements_downloaded += sum(1 for row in reader)
-            except Exception as e:
-                print(f"  Warning: Error reading row count from existing file '{output_filename_for_part}': {e}")
+        logger.info(f"\n  --- Processing {plan['label']} ({plan['num_tiles']} squares, {len(plan['pending'])} to download) ---")
+        failed_squares = []
+        if plan['pending']:
+            failed_squares = download_tile_batch(country_code, country_name, plan['part_file'], plan['label'],
+                                                 plan['pending'], temp_folder)['failed']
+
+        # Second pass for failed squares for this country part (if needed)
+        if failed_squares:
+            logger.info(f"\n  --- Initiating second pass for {len(failed_squares)} failing squares in {plan['label']}. ---")
+            failed_squares = download_tile_batch(country_code, country_name, plan['part_file'], plan['label'],
+                                                 failed_squares, temp_folder)['failed']
+
+        overall_elements_downloaded += finalize_part(plan, manifest, failed_squares)
+    
+    manifest.close()
+    logger.info(f"\n--- OSM data download for {country_name} ({country_code}) completed. Total unique elements downloaded: {overall_elements_downloaded}. ---")
+    return overall_elements_downloaded # Return total count of downloaded elements for this country
+
+def dedup_part_files(deduplicator, manifest, part_paths):
+    """
+    Removes elements already seen in other files (see Dedup_OSM_data.py) from the given part files
+    and updates their sizes and checksums in the manifest, so they are not reported as corrupt.
+    """
+    for path in dedup_file_order(part_paths):
+        if not os.path.exists(path):
+            continue
+        try:
+            file_stat = deduplicator.dedup_file(path)
+        except (IOError, csv.Error) as e:
+            logger.error(f"  Error deduplicating '{path}': {e}")
             continue
+        removed = file_stat['id_duplicates'] + file_stat['coordinate_duplicates']
+        if removed:
+            logger.info(f"  {file_stat['file']}: removed {removed} duplicates already present in other files.")
+            osm_manifest.refresh_part_file(manifest, file_stat['file'], path, file_stat['rows_out'])
 
-        start_idx = part_index * MAX_SQUARES_PER_COUNTRY_PART_FILE
-        end_idx = min((part_index + 1) * MAX_SQUARES_PER_COUNTRY_PART_FILE, len(all_country_boxes))
-        
-        target_boxes_part = all_country_boxes[start_idx:end_idx]
-        
-        if num_parts > 1:
-            print(f"\n  --- Processing {country_name} (Part {part_index + 1}/{num_parts}, Squares {start_idx + 1}-{end_idx}) ---")
-        else:
-             print(f"\n  --- Processing {country_name} (Squares {start_idx + 1}-{end_idx}) ---")
-        
-        current_country_elements_to_save = []
-        seen_ids_for_part = set() # Deduplication within this country part
-        country_failed_boxes_part = []
-        
-        processed_boxes_count_part = 0
-        box_processing_times_part = []
+def download_all_countries(executor, countries_list, temp_folder, geocode_executor=None, final_folder=None):
+    """
+    Downloads all countries with a shared work queue instead of one job per country.
+    Every part is split into batches of TILE_BATCH_SIZE squares; batches of the largest countries
+    are queued first and idle workers always take the next batch from the shared queue,
+    so giant countries no longer end up as stragglers on a single worker.
+    Failed squares are queued once more at the end (second pass). Part files are written
+    by the main process as soon as all batches of the part have finished.
 
-        for i, bbox in enumerate(target_boxes_part):
-            box_start_time = time.time()
-            print(f"    Processing square {i+1}/{len(target_boxes_part)} for {country_name}{part_suffix}: {bbox}")
-            
-            success = False
-            for attempt in range(MAX_RETRIES_OVERPASS):
-                osm_data = get_overpass_data(bbox, attempt + 1)
-                if osm_data and 'elements' in osm_data:
-                    for element in osm_data['elements']:
-                        if element['id'] not in seen_ids_for_part:
-                            seen_ids_for_part.add(element['id'])
-                            # Add basic info and all tags
-                            charger_info = {
-                                'id': element['id'],
-                                'lat': element.get('lat'),
-                                'lon': element.get('lon'),
-                                'amenity': element.get('tags', {}).get('amenity', 'N/A'),
-                                'scraped_country_code': country_code, # Add country info from GeoJSON
-                                'scraped_country_name': country_name
-                            }
-                            # Add all other OSM tags that are in our ALL_FIELDNAMES
-                            for field in ALL_FIELDNAMES:
-                                if field not in charger_info and field not in GEOCODED_COLUMNS:
-                                    charger_info[field] = element.get('tags', {}).get(field, 'N/A')
-                            current_country_elements_to_save.append(charger_info)
-                    print(f"      Found {len(osm_data['elements'])} elements (total unique {len(seen_ids_for_part)}).")
-                    success = True
-                    break
-                elif attempt < MAX_RETRIES_OVERPASS - 1:
-                    print(f"      Waiting {RETRY_DELAY_OVERPASS} seconds before next attempt for box {bbox}...")
-                    time.sleep(RETRY_DELAY_OVERPASS)
-                else:
-                    print(f"      All attempts for box {bbox} failed for {country_name}{part_suffix}.")
-            
-            if not success:
-                country_failed_boxes_part.append(bbox)
+    With a geocode_executor, downloading and geocoding run as a pipeline: as soon as all parts
+    of a country are written, its files are deduplicated against everything seen so far and the
+    country is put into a bounded queue for geocoding. Countries are deduplicated in the order of their
+    files (Dedup_OSM_data.dedup_file_order, the same order as a standalone dedup_raw_files run); a country
+    finished early waits for the countries before it, so an element on a border always stays in the same
+    country's file, whatever order the downloads finish in. While GEOCODING_QUEUE_SIZE countries are
+    waiting, no new download batches are submitted (backpressure), so the two pools stay balanced.
 
-            time.sleep(QUERY_PAUSE_SECONDS)
+    Returns a dictionary with the number of downloaded elements, the geocoding failures
+    and the deduplication report (the last two only in pipeline mode).
+    """
+    manifest = osm_manifest.connect(temp_folder)
+    deduplicator = OsmDeduplicator()
+    total_elements = 0
+    countries = dict(countries_list)
+    plans = {}
+    country_part_paths = {}   # country_code -> paths of all its part files
+    country_parts_left = {}   # country_code -> number of parts not written yet
+    # Planning order: most squares first, ties by country code
+    for country_code, _ in sorted(countries_list, key=lambda item: (-item[1][2], item[0])):
+        country_info = countries[country_code]
+        country_part_paths[country_code] = []
+        country_parts_left[country_code] = 0
+        for plan in plan_country_parts((country_code, country_info), temp_folder, manifest):
+            country_part_paths[country_code].append(plan['path'])
+            if plan['complete']:
+                total_elements += plan['row_count']
+            elif not plan['pending']:
+                # All squares were downloaded before a crash, only the part file is missing
+                total_elements += finalize_part(plan, manifest, [])
+            else:
+                plans[plan['part_file']] = plan
+                country_parts_left[country_code] += 1
 
-            box_end_time = time.time()
-            box_processing_time = box_end_time - box_start_time
-            box_processing_times_part.append(box_processing_time)
-            processed_boxes_count_part += 1
+    # Deduplication order: whole countries in the order of their part files (see dedup_file_order)
+    path_countries = {path: country_code for country_code, paths in country_part_paths.items() for path in paths}
+    dedup_order = list(dict.fromkeys(path_countries[path] for path in dedup_file_order(path_countries)))
 
-            if processed_boxes_count_part > 0:
-                average_box_time = sum(box_processing_times_part) / processed_boxes_count_part
-                remaining_boxes = len(target_boxes_part) - processed_boxes_count_part
-                estimated_remaining_time_seconds = average_box_time * remaining_boxes
-                
+    pending_batches = deque()   # (part_file, batch, is_second_pass) waiting for submission
+    download_futures = {}
+    outstanding_batches = {part_file: 0 for part_file in plans}
+    failed_squares = {part_file: [] for part_file in plans}
+    downloaded_countries = set()   # countries with all parts written, deduplicated or waiting for their turn
+    next_dedup = 0                 # index in dedup_order of the next country to deduplicate
+    ready_countries = deque()   # countries with all parts written and deduplicated, waiting for geocoding
+    geocode_futures = {}
+    geocoding_failures = []
+
+    def queue_batches(plan, squares, is_second_pass):
+        for start in range(0, len(squares), TILE_BATCH_SIZE):
+            pending_batches.append((plan['part_file'], squares[start:start + TILE_BATCH_SIZE], is_second_pass))
+            outstanding_batches[plan['part_file']] += 1
+
+    def country_ready(country_code):
+        nonlocal next_dedup
+        if geocode_executor is None:
+            return
+        downloaded_countries.add(country_code)
+        # Deduplicate every downloaded country whose turn has come (see the docstring)
+        while next_dedup < len(dedup_order) and dedup_order[next_dedup] in downloaded_countries:
+            country_code = dedup_order[next_dedup]
+            next_dedup += 1
+            with METRICS.timer('dedup_seconds'):
+                dedup_part_files(deduplicator, manifest, country_part_paths[country_code])
+            # Register the final part files, geocoding workers look them up in the dataset manifest
+            dataset_manifest.update_manifest(temp_folder, RAW_FILE_PATTERN)
+            ready_countries.append(country_code)
+
+    def submit_work():
+        # Geocoding first, then downloads - unless the geocoding queue is full
+        while ready_countries and len(geocode_futures) < MAX_GEOCODING_WORKERS:
+            country_code = ready_countries.popleft()
+            future = geocode_executor.submit(run_with_metrics, geocode_country_data, (country_code, countries[country_code]),
+                                             temp_folder, final_folder, ALL_FIELDNAMES, GEOCODED_COLUMNS)
+            geocode_futures[future] = country_code
+        while pending_batches and len(download_futures) < MAX_DOWNLOAD_BATCHES_IN_FLIGHT:
+            if geocode_executor is not None and len(ready_countries) >= GEOCODING_QUEUE_SIZE:
+                break
+            part_file, batch, is_second_pass = pending_batches.popleft()
+            plan = plans[part_file]
+            future = executor.submit(run_with_metrics, download_tile_batch, plan['country_code'], plan['country_name'],
+                                     part_file, plan['label'], batch, temp_folder)
+            download_futures[future] = (part_file, batch, is_second_pass)
+
+    for plan in plans.values():
+        queue_batches(plan, plan['pending'], is_second_pass=False)
+    for country_code, parts_left in country_parts_left.items():
+        if parts_left == 0:
+            country_ready(country_code)
+
+    total_squares = sum(len(plan['pending']) for plan in plans.values())
+    logger.info(f"\nQueued {total_squares} squares of {len(plans)} parts in {len(pending_batches)} batches for {MAX_WORKERS} workers.")
+    finished_squares = 0
+    start_time = time.time()
+    submit_work()
+
+    while download_futures or geocode_futures:
+        done_futures, _ = wait(list(download_futures) + list(geocode_futures), return_when=FIRST_COMPLETED)
+        for future in done_futures:
+            if future in geocode_futures:
+                country_code = geocode_futures.pop(future)
+                try:
+                    geocoding_failures.extend(collect_result(future))
+                except Exception as exc:
+                    logger.error(f'Geocoding process for {countries[country_code][0]} generated an exception: {exc}')
+                continue
+
+            part_file, batch, is_second_pass = download_futures.pop(future)
+            plan = plans[part_file]
+            outstanding_batches[part_file] -= 1
+            try:
+                batch_failed = collect_result(future)['failed']
+            except Exception as exc:
+                logger.error(f'Data download batch for {plan["label"]} generated an exception: {exc}')
+                batch_failed = batch
+
+            if is_second_pass:
+                failed_squares[part_file].extend(batch_failed)
+            else:
+                finished_squares += len(batch)
+                if batch_failed:
+                    logger.info(f"\n  --- Queuing second pass for {len(batch_failed)} failing squares in {plan['label']}. ---")
+                    queue_batches(plan, batch_failed, is_second_pass=True)
+
+            if outstanding_batches[part_file] == 0:
+                total_elements += finalize_part(plan, manifest, failed_squares[part_file])
+                country_parts_left[plan['country_code']] -= 1
+                if country_parts_left[plan['country_code']] == 0:
+                    country_ready(plan['country_code'])
+
+            if not is_second_pass and finished_squares:
+                elapsed = time.time() - start_time
+                estimated_remaining_time_seconds = elapsed / finished_squares * (total_squares - finished_squares)
                 hours, remainder = divmod(int(estimated_remaining_time_seconds), 3600)
                 minutes, seconds = divmod(remainder, 60)
-                
-                print(f"    Estimated remaining time for {country_name}{part_suffix}: {hours:02d}h {minutes:02d}m {seconds:02d}s")
+                logger.info(f"    Downloaded {finished_squares}/{total_squares} squares. Estimated remaining time: {hours:02d}h {minutes:02d}m {seconds:02d}s")
+        submit_work()
 
-        # Second pass for failed squares for this country part (if needed)
-        if country_failed_boxes_part:
-            print(f"\n  --- Initiating second pass for {len(country_failed_boxes_part)} failing squares in {country_name}{part_suffix}. ---")
-            retried_failed_boxes_part = []
-            for i, bbox in enumerate(country_failed_boxes_part):
-                box_start_time_retry = time.time()
-                print(f"    Processing failing square {i+1}/{len(country_failed_boxes_part)} for {country_name}{part_suffix}: {bbox}")
-                success = False
-                for attempt in range(MAX_RETRIES_OVERPASS):
-                    osm_data = get_overpass_data(bbox, attempt + 1)
-                    if osm_data and 'elements' in osm_data:
-                        for element in osm_data['elements']:
-                            if element['id'] not in seen_ids_for_part: # Deduplicate again
-                                seen_ids_for_part.add(element['id'])
-                                charger_info = {
-                                    'id': element['id'],
-                                    'lat': element.get('lat'),
-                                    'lon': element.get('lon'),
-                                    'amenity': element.get('tags', {}).get('amenity', 'N/A'),
-                                    'scraped_country_code': country_code,
-                                    'scraped_country_name': country_name
-                                }
-                                for field in ALL_FIELDNAMES:
-                                    if field not in charger_info and field not in GEOCODED_COLUMNS:
-                                        charger_info[field] = element.get('tags', {}).get(field, 'N/A')
-                                current_country_elements_to_save.append(charger_info)
-                        print(f"      Found {len(osm_data['elements'])} elements in this failing square.")
-                        success = True
-                        break
-                    elif attempt < MAX_RETRIES_OVERPASS - 1:
-                        print(f"      Waiting {RETRY_DELAY_OVERPASS} seconds before next attempt for failing box {bbox}...")
-                        time.sleep(RETRY_DELAY_OVERPASS)
-                    else:
-                        print(f"      All attempts for failing box {bbox} failed again.")
-                if not success:
-                    retried_failed_boxes_part.append(bbox)
-                time.sleep(QUERY_PAUSE_SECONDS)
+    manifest.close()
+    return {
+        'elements': total_elements,
+        'geocoding_failures': geocoding_failures,
+        'dedup_report': deduplicator.report() if geocode_executor is not None else None,
+    }
+
+# --- Phase 1 (incremental): Applying changes since the last run ---
+def apply_changes_to_part_file(filepath, fieldnames, changed_records, deleted_keys):
+    """
+    Streams an existing part file into a new one, dropping deleted and modified elements
+    and appending the new versions. Returns (row_count, size_bytes, sha256).
+    """
+    def updated_rows():
+        with open(filepath, 'r', newline='', encoding='utf-8') as infile:
+            for row in csv.DictReader(infile):
+                key = osm_manifest.element_key(row)
+                if key not in deleted_keys and key not in changed_records:
+                    yield row
+        yield from changed_records.values()
+    return osm_manifest.write_csv_atomic(filepath, fieldnames, updated_rows())
+
+def refresh_osm_data_for_country(country_data, temp_folder, part_indexes=None):
+    """
+    Incrementally updates the raw part files of a country (or only the parts in part_indexes).
+    Every square is queried only for changes since its last successful download
+    (see get_overpass_data with newer_than), so a refresh transfers only ids and changed elements.
+    Changes of a part are applied only when all its squares were refreshed successfully;
+    otherwise the part keeps its old timestamps and is refreshed again on the next run.
+    Returns a dictionary with the numbers of changed and deleted elements.
+    """
+    country_code, (country_name, bbox_coords, num_squares_total) = country_data
+    logger.info(f"\n--- Starting incremental OSM update for {country_name} ({country_code}) ---")
 
-        # Saving downloaded OSM data for this country part
-        if current_country_elements_to_save:
+    min_lat, min_lon, max_lat, max_lon = bbox_coords
+    all_country_boxes = generate_grid_boxes(min_lat, min_lon, max_lat, max_lon, STEP_LAT, STEP_LON)
+    num_parts = (len(all_country_boxes) + MAX_SQUARES_PER_COUNTRY_PART_FILE - 1) // MAX_SQUARES_PER_COUNTRY_PART_FILE
+    part_fieldnames = [f for f in ALL_FIELDNAMES if f not in GEOCODED_COLUMNS]
+
+    summary = {'changed': 0, 'deleted': 0, 'skipped_parts': 0}
+    manifest = osm_manifest.connect(temp_folder)
+
+    for part_index in range(num_parts):
+        if part_indexes is not None and part_index not in part_indexes:
+            continue
+        output_filename_for_part = get_part_filename(temp_folder, country_name, part_index, num_parts)
+        part_file = os.path.basename(output_filename_for_part)
+        num_tiles = min(MAX_SQUARES_PER_COUNTRY_PART_FILE, len(all_country_boxes) - part_index * MAX_SQUARES_PER_COUNTRY_PART_FILE)
+
+        part_state = osm_manifest.check_part(manifest, part_file, output_filename_for_part, verify_checksum=VERIFY_PART_CHECKSUMS)
+        tiles = osm_manifest.get_part_tiles(manifest, part_file)
+        if part_state != osm_manifest.PART_COMPLETE or len(tiles) != num_tiles or any(not t['last_success'] for t in tiles):
+            logger.warning(f"  Part '{part_file}' has no complete download with timestamps (state: {part_state}). "
+                           f"Run a full download for it first (adopted files from older runs are downloaded again there).")
+            summary['skipped_parts'] += 1
+            continue
+
+        changed_records = {}
+        stored_keys = set()
+        current_keys = set()
+        refreshed_tiles = []
+        for tile in tiles:
+            stored_keys.update(tile['element_keys'])
+            osm_data = query_square(tile['bbox'], part_file, newer_than=tile['last_success'])
+            if osm_data is None:
+                break
+            tile_keys = []
+            for element in osm_data['elements']:
+                key = osm_manifest.element_key(element)
+                if 'tags' in element:
+                    # Full record from the 'newer' output - a new or modified charging station
+                    charger_info = element_to_charger_info(element, country_code, country_name)
+                    if charger_info is not None:
+                        changed_records[key] = charger_info
+                else:
+                    tile_keys.append(key)
+            current_keys.update(tile_keys)
+            refreshed_tiles.append((tile['tile_index'], osm_data.get('osm3s', {}).get('timestamp_osm_base'), tile_keys))
+            METRICS.inc('osm_elements_changed_total', len(osm_data['elements']) - len(tile_keys))
+            METRICS.inc('overpass_pause_seconds_total', QUERY_PAUSE_SECONDS)
+            time.sleep(QUERY_PAUSE_SECONDS)
+
+        if len(refreshed_tiles) != len(tiles):
+            logger.warning(f"  Refresh of '{part_file}' failed. It will be refreshed again on the next run.")
+            summary['skipped_parts'] += 1
+            continue
+
+        # An element is deleted only if it disappeared from all squares of the part
+        # (elements on shared edges are listed by several squares)
+        deleted_keys = stored_keys - current_keys
+        if changed_records or deleted_keys:
             try:
-                with open(output_filename_for_part, 'w', newline='', encoding='utf-8') as part_csvfile:
-                    writer = csv.DictWriter(part_csvfile, fieldnames=[f for f in ALL_FIELDNAMES if f not in GEOCODED_COLUMNS])
-                    writer.writeheader()
-                    # Write only the fields available at this stage
-                    rows_to_write = []
-                    for row in current_country_elements_to_save:
-                        clean_row = {key: row.get(key, 'N/A') for key in writer.fieldnames}
-                        rows_to_write.append(clean_row)
-                    writer.writerows(rows_to_write)
-                print(f"  Successfully saved {len(current_country_elements_to_save)} unique records for {country_name}{part_suffix} to '{output_filename_for_part}'.")
-                overall_elements_downloaded += len(current_country_elements_to_save)
+                row_count, size_bytes, sha256 = apply_changes_to_part_file(output_filename_for_part, part_fieldnames,
+                                                                           changed_records, deleted_keys)
             except IOError as e:
-                print(f"  Error writing country part file '{output_filename_for_part}': {e}")
-        else:
-            print(f"  No unique chargers to download for {country_name}{part_suffix}.")
-    
-    print(f"\n--- OSM data download for {country_name} ({country_code}) completed. Total unique elements downloaded: {overall_elements_downloaded}. ---")
-    return overall_elements_downloaded # Return total count of downloaded elements for this country
+                logger.error(f"  Error updating part file '{output_filename_for_part}': {e}")
+                continue
+            osm_manifest.record_part(manifest, part_file, country_code, country_name, num_tiles,
+                                     osm_manifest.PART_COMPLETE, row_count, size_bytes, sha256)
+        for tile_index, timestamp, tile_keys in refreshed_tiles:
+            osm_manifest.update_tile_refresh(manifest, part_file, tile_index, timestamp, tile_keys)
+
+        logger.info(f"  Updated '{part_file}': {len(changed_records)} new or modified, {len(deleted_keys)} deleted.")
+        summary['changed'] += len(changed_records)
+        summary['deleted'] += len(deleted_keys)
+
+    manifest.close()
+    logger.info(f"\n--- Incremental OSM update for {country_name} ({country_code}) completed: "
+          f"{summary['changed']} new or modified, {summary['deleted']} deleted, {summary['skipped_parts']} parts skipped. ---")
+    return summary
 
 # --- Phase 2: Geocoding Downloaded Data ---
 def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames, geocoded_columns):
@@ -396,13 +809,15 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
     
     geolocator_process = Nominatim(user_agent=NOMINATIM_USER_AGENT)
     
-    print(f"\n--- Starting geocoding for {country_name} ({country_code}) ---")
+    logger.info(f"\n--- Starting geocoding for {country_name} ({country_code}) ---")
     country_start_time = time.time()
 
-    # Get all temporary files for the given country
-    raw_osm_files = glob.glob(os.path.join(temp_folder, f"ev_chargers_osm_raw_{country_name.replace(' ', '_').lower()}*.csv"))
+    # Get all temporary files for the given country from the dataset manifest (read only, the main process updates it)
+    partitions = dataset_manifest.resolve_partitions(temp_folder, RAW_FILE_PATTERN, dataset="ev_chargers_osm_raw",
+                                                     country=country_name.replace(' ', '_').lower(), update=False)
+    raw_osm_files = [partition['path'] for partition in partitions]
     if not raw_osm_files:
-        print(f"  No raw OSM files found for {country_name} in folder '{temp_folder}'. Skipping geocoding.")
+        logger.info(f"  No raw OSM files found for {country_name} in folder '{temp_folder}'. Skipping geocoding.")
         return []
 
     # Load all raw data from temporary files
@@ -420,71 +835,89 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
                     clean_row['lon'] = row.get('lon')
                     clean_row['scraped_country_code'] = row.get('scraped_country_code')
                     clean_row['scraped_country_name'] = row.get('scraped_country_name')
-                    all_raw_elements[row['id']] = clean_row
+                    # Keyed by type and id: a node and a way may share the numeric id
+                    all_raw_elements[osm_manifest.element_key(row)] = clean_row
         except Exception as e:
-            print(f"  Error reading RAW file '{filepath}': {e}")
+            logger.error(f"  Error reading RAW file '{filepath}': {e}")
             
     if not all_raw_elements:
-        print(f"  No RAW data to geocode for {country_name}. Skipping.")
+        logger.info(f"  No RAW data to geocode for {country_name}. Skipping.")
         return []
 
     # Load existing final file (if any) to identify already geocoded records
     final_output_file = os.path.join(final_folder, f"ev_chargers_geocoded_{country_name.replace(' ', '_').lower()}.csv")
     existing_geocoded_data = {}
     if os.path.exists(final_output_file):
-        print(f"  Found existing final file '{final_output_file}'. Loading already geocoded data.")
+        logger.info(f"  Found existing final file '{final_output_file}'. Loading already geocoded data.")
         try:
             with open(final_output_file, 'r', newline='', encoding='utf-8') as infile:
                 reader = csv.DictReader(infile)
                 for row in reader:
                     # Check if the row has filled geocoding fields
                     if all(row.get(col, 'N/A') not in ['N/A', ''] for col in geocoded_columns):
-                        existing_geocoded_data[row['id']] = row
+                        existing_geocoded_data[osm_manifest.element_key(row)] = row
                     else:
                         # If any of the geocoded_columns is 'N/A' or empty, we consider it incomplete and will re-geocode it
                         pass # This row will not be in existing_geocoded_data, so it will be reprocessed
         except Exception as e:
-            print(f"  Warning: Error loading existing final file '{final_output_file}': {e}. Recomputing everything.")
+            logger.warning(f"  Warning: Error loading existing final file '{final_output_file}': {e}. Recomputing everything.")
             existing_geocoded_data = {} # Reset if failed to load
 
     processed_chargers_for_csv = []
     local_geocoding_failures = []
     
+    def reuse_existing_geocoding(element_key, element):
+        """
+        Returns the raw element completed with the already geocoded columns,
+        or None if it was not geocoded yet or its position changed (e.g. by an incremental update).
+        Tags always come from the raw data, so modified elements are refreshed.
+        """
+        existing_row = existing_geocoded_data.get(element_key)
+        if existing_row is None or existing_row.get('lat') != element.get('lat') or existing_row.get('lon') != element.get('lon'):
+            return None
+        reused_row = dict(element)
+        for col in geocoded_columns:
+            reused_row[col] = existing_row.get(col, 'N/A')
+        return reused_row
+
     total_elements_to_geocode = 0
-    for osm_id, element in all_raw_elements.items():
-        if osm_id not in existing_geocoded_data:
+    for element_key, element in all_raw_elements.items():
+        if reuse_existing_geocoding(element_key, element) is None:
             total_elements_to_geocode += 1
 
     if total_elements_to_geocode > 0:
         estimated_geocoding_time_seconds = total_elements_to_geocode * GEOCODING_PAUSE_SECONDS
         hours, remainder = divmod(int(estimated_geocoding_time_seconds), 3600)
         minutes, seconds = divmod(remainder, 60)
-        print(f"  Estimated geocoding time for {country_name}: {hours:02d}h {minutes:02d}m {seconds:02d}s ({total_elements_to_geocode} elements to geocode).")
+        logger.info(f"  Estimated geocoding time for {country_name}: {hours:02d}h {minutes:02d}m {seconds:02d}s ({total_elements_to_geocode} elements to geocode).")
     else:
-        print(f"  All records for {country_name} appear to be already geocoded. Skipping geocoding.")
-        # If all records are already geocoded, just copy the existing data
-        processed_chargers_for_csv = list(existing_geocoded_data.values())
+        logger.info(f"  All records for {country_name} appear to be already geocoded. Skipping geocoding.")
+        # If all records are already geocoded, just combine the raw data with the existing locations
+        # (elements deleted from the raw data are dropped)
+        processed_chargers_for_csv = [reuse_existing_geocoding(element_key, element) for element_key, element in all_raw_elements.items()]
         if processed_chargers_for_csv:
             try:
                 with open(final_output_file, 'w', newline='', encoding='utf-8') as outfile:
-                    writer = csv.DictWriter(outfile, fieldnames=all_fieldnames)
+                    writer = csv.DictWriter(outfile, fieldnames=all_fieldnames, extrasaction='ignore')
                     writer.writeheader()
                     writer.writerows(processed_chargers_for_csv)
-                print(f"  Successfully re-written {len(processed_chargers_for_csv)} records for {country_name} to '{final_output_file}' (no new geocoding).")
+                logger.info(f"  Successfully re-written {len(processed_chargers_for_csv)} records for {country_name} to '{final_output_file}' (no new geocoding).")
             except IOError as e:
-                print(f"  Error writing final file '{final_output_file}': {e}")
+                logger.error(f"  Error writing final file '{final_output_file}': {e}")
         return [] # No new geocoding errors if nothing was geocoded
 
     # Geocoding and preparing data for writing
-    for element_idx, (osm_id, element) in enumerate(all_raw_elements.items()):
+    for element_idx, (element_key, element) in enumerate(all_raw_elements.items()):
         
         # If the element is already geocoded, add it to the list and skip geocoding
-        if osm_id in existing_geocoded_data:
-            processed_chargers_for_csv.append(existing_geocoded_data[osm_id])
+        reused_row = reuse_existing_geocoding(element_key, element)
+        if reused_row is not None:
+            METRICS.inc('geocoding_cache_hits_total')
+            processed_chargers_for_csv.append(reused_row)
             continue
             
         if (element_idx + 1) % 100 == 0: # Log progress every 100 elements
-             print(f"  Geocoding {element_idx + 1}/{len(all_raw_elements)} for {country_name} (ID: {element.get('id')})...")
+             logger.info(f"  Geocoding {element_idx + 1}/{len(all_raw_elements)} for {country_name} (ID: {element.get('id')})...")
 
         charger_info = element # Start with raw data
         
@@ -493,7 +926,8 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
             lat_val = float(charger_info['lat'])
             lon_val = float(charger_info['lon'])
         except (ValueError, TypeError):
-            print(f"  Skipping geocoding for ID {charger_info['id']}: Invalid coordinates ({charger_info['lat']}, {charger_info['lon']}).")
+            METRICS.inc('geocoding_invalid_coordinates_total')
+            logger.debug(f"  Skipping geocoding for ID {charger_info['id']}: Invalid coordinates ({charger_info['lat']}, {charger_info['lon']}).")
             charger_info['city'] = 'N/A'
             charger_info['state'] = 'N/A'
             charger_info['country'] = 'N/A'
@@ -509,10 +943,12 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
                 break
             else:
                 if attempt < MAX_RETRIES_GEOCODING - 1:
-                    print(f"  Geocoding for ({lat_val}, {lon_val}) failed, retrying in {GEOCODING_PAUSE_SECONDS}s.")
+                    METRICS.inc('geocoding_retries_total')
+                    logger.debug(f"  Geocoding for ({lat_val}, {lon_val}) failed, retrying in {GEOCODING_PAUSE_SECONDS}s.")
                     time.sleep(GEOCODING_PACODING_SECONDS)
                 else:
-                    print(f"  Geocoding for ({lat_val}, {lon_val}) failed after all attempts.")
+                    METRICS.inc('geocoding_failures_total')
+                    logger.warning(f"  Geocoding for ({lat_val}, {lon_val}) failed after all attempts.")
                     local_geocoding_failures.append({'id': charger_info['id'], 'lat': charger_info['lat'], 'lon': charger_info['lon'], 'reason': 'GeocoderError', 'country': country_name})
                     city, state, country = 'N/A', 'N/A', 'N/A' # Set to N/A after failure
         
@@ -521,13 +957,14 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
         charger_info['country'] = country
         # scraped_country_code and scraped_country_name should already be in charger_info from Phase 1
         processed_chargers_for_csv.append(charger_info)
+        METRICS.inc('geocoding_pause_seconds_total', GEOCODING_PAUSE_SECONDS)
         time.sleep(GEOCODING_PAUSE_SECONDS) # Important pause for Nominatim
     
     # Writing processed data to the final CSV file
     if processed_chargers_for_csv:
         try:
-            # Ensure data list is sorted by ID for consistent output
-            processed_chargers_for_csv.sort(key=lambda x: x.get('id', 0))
+            # Ensure data list is sorted by ID (and type, ids are unique only per type) for consistent output
+            processed_chargers_for_csv.sort(key=lambda x: (x.get('id', 0), x.get('type') or 'node'))
             
             with open(final_output_file, 'w', newline='', encoding='utf-8') as final_csvfile:
                 final_writer = csv.DictWriter(final_csvfile, fieldnames=all_fieldnames)
@@ -540,14 +977,15 @@ def geocode_country_data(country_data, temp_folder, final_folder, all_fieldnames
                     rows_to_write_final.append(clean_row)
                 final_writer.writerows(rows_to_write_final)
 
-            print(f"  Successfully saved {len(processed_chargers_for_csv)} records for {country_name} to '{final_output_file}'.")
+            logger.info(f"  Successfully saved {len(processed_chargers_for_csv)} records for {country_name} to '{final_output_file}'.")
         except IOError as e:
-            print(f"  Error writing final file '{final_output_file}': {e}")
+            logger.error(f"  Error writing final file '{final_output_file}': {e}")
     else:
-        print(f"  No records to save for {country_name} to the final file.")
+        logger.info(f"  No records to save for {country_name} to the final file.")
 
     country_end_time = time.time()
-    print(f"\n--- Geocoding for {country_name} completed in {country_end_time - country_start_time:.2f} seconds. ---")
+    METRICS.observe('country_geocoding_seconds', country_end_time - country_start_time)
+    logger.info(f"\n--- Geocoding for {country_name} completed in {country_end_time - country_start_time:.2f} seconds. ---")
     
     return local_geocoding_failures # Return geocoding failures for this country
 
@@ -558,113 +996,161 @@ if __name__ == "__main__":
     os.makedirs(FINAL_OUTPUT_FOLDER, exist_ok=True)
     os.makedirs(LOGS_FOLDER, exist_ok=True)
 
-    # Setup logging to file
-    log_filename = datetime.datetime.now().strftime("scrape_log_%Y-%m-%d_%H-%M-%S.txt")
-    log_filepath = os.path.join(LOGS_FOLDER, log_filename)
-    
-    # Redirect standard output and error output
-    f_log = open(log_filepath, 'w', encoding='utf-8')
-    original_stdout = sys.stdout
-    original_stderr = sys.stderr
-    sys.stdout = Tee(original_stdout, f_log)
-    sys.stderr = Tee(original_stderr, f_log)
+    # Setup logging to console and a JSON lines file, shared by all worker processes
+    log_queue, log_listener, log_filepath = setup_logging(LOGS_FOLDER, "scrape_log", LOG_LEVEL)
 
-    print(f"Logging progress to file: '{log_filepath}'")
-    print(f"Temporary OSM data will be saved in: '{TEMP_OSM_DATA_FOLDER}'")
-    print(f"Final geocoded data will be saved in: '{FINAL_OUTPUT_FOLDER}'")
+    logger.info(f"Logging progress to file: '{log_filepath}'")
+    logger.info(f"Temporary OSM data will be saved in: '{TEMP_OSM_DATA_FOLDER}'")
+    logger.info(f"Final geocoded data will be saved in: '{FINAL_OUTPUT_FOLDER}'")
 
     total_script_start_time = time.time()
 
     # 1. Generating bounding boxes from GeoJSON files
-    print("\nLoading country bounding boxes from GeoJSON files and calculating square counts...")
+    logger.info("\nLoading country bounding boxes from GeoJSON files and calculating square counts...")
     COUNTRIES_DATA_RAW = generate_country_bboxes(folder_path=GEOJSON_DATA_FOLDER)
     
     if not COUNTRIES_DATA_RAW:
-        print("No country bounding boxes found to process. Ensure 'country_geojson_data' folder exists and contains GeoJSON files.")
+        logger.error("No country bounding boxes found to process. Ensure 'country_geojson_data' folder exists and contains GeoJSON files.")
+        shutdown_logging(log_listener)
         sys.exit(1)
     
     # Sort countries by number of squares (smallest to largest)
     sorted_countries_list = sorted(COUNTRIES_DATA_RAW.items(), key=lambda item: item[1][2])
     
-    print("\nList of countries sorted by number of search squares:")
+    logger.info("\nList of countries sorted by number of search squares:")
     for code, (name, bbox, num_squares) in sorted_countries_list:
-        print(f"- {name} ({code}): {num_squares} squares")
+        logger.info(f"- {name} ({code}): {num_squares} squares")
 
-    print(f"\nTotal countries to process: {len(sorted_countries_list)}")
+    logger.info(f"\nTotal countries to process: {len(sorted_countries_list)}")
 
-    # --- PHASE 1: Downloading data from Overpass API ---
-    print("\n\n--- PHASE 1: STARTING OVERPASS API DATA DOWNLOAD ---")
-    phase1_start_time = time.time()
-    
     # Get a set of already existing files in temp_osm_data (for checking what to skip)
     existing_temp_osm_files = {os.path.basename(f) for f in glob.glob(os.path.join(TEMP_OSM_DATA_FOLDER, "*.csv"))}
-    print(f"Found {len(existing_temp_osm_files)} existing temporary OSM files. These will be skipped if complete.")
+    logger.info(f"Found {len(existing_temp_osm_files)} existing temporary OSM files. These will be skipped if complete.")
     # for f_name in sorted(list(existing_temp_osm_files)):
     #     print(f"  - {f_name}")
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures_phase1 = []
-        for country_code, country_info in sorted_countries_list:
-            # Pass the entire country_data object, as country_info already contains num_squares
-            futures_phase1.append(executor.submit(download_osm_data_for_country_part,
-                                                  (country_code, country_info),
-                                                  TEMP_OSM_DATA_FOLDER,
-                                                  ALL_FIELDNAMES)) # Pass ALL_FIELDNAMES to determine columns
+    global_geocoding_failures = [] # For recording all geocoding failures
 
-        for future in as_completed(futures_phase1):
-            try:
-                downloaded_count = future.result()
-                # print(f"Completed OSM data download. Total unique elements downloaded: {downloaded_count}")
-            except Exception as exc:
-                print(f'Data download process for a country generated an exception: {exc}')
-    
-    phase1_end_time = time.time()
-    print(f"\n--- PHASE 1 COMPLETED in {phase1_end_time - phase1_start_time:.2f} seconds. ---")
+    if not INCREMENTAL_UPDATE:
+        # --- PHASES 1 + 2: Downloading and geocoding as a pipeline ---
+        # A country is deduplicated and geocoded as soon as all its parts are downloaded,
+        # while the download pool continues with other countries.
+        logger.info("\n\n--- PHASES 1 + 2: STARTING OVERPASS API DATA DOWNLOAD AND GEOCODING PIPELINE ---")
+        pipeline_start_time = time.time()
 
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=worker_init,
+                                 initargs=(log_queue, LOG_LEVEL)) as download_executor, \
+             ProcessPoolExecutor(max_workers=MAX_GEOCODING_WORKERS, initializer=worker_init,
+                                 initargs=(log_queue, LOG_LEVEL)) as geocode_executor:
+            pipeline_result = download_all_countries(download_executor, sorted_countries_list, TEMP_OSM_DATA_FOLDER,
+                                                     geocode_executor=geocode_executor, final_folder=FINAL_OUTPUT_FOLDER)
+        logger.info(f"Total unique elements downloaded: {pipeline_result['elements']}")
+        global_geocoding_failures.extend(pipeline_result['geocoding_failures'])
 
-    # --- PHASE 2: Geocoding Data ---
-    print("\n\n--- PHASE 2: STARTING DATA GEOCODING ---")
-    phase2_start_time = time.time()
-    
-    global_geocoding_failures = [] # For recording all geocoding failures
+        dedup_report = pipeline_result['dedup_report']
+        logger.info(f"Deduplication across all files: {dedup_report['rows_in']} rows in, {dedup_report['rows_out']} rows out, "
+              f"duplicate rate {dedup_report['duplicate_rate'] * 100:.2f} %.")
+        save_dedup_report(dedup_report)
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures_phase2 = []
-        for country_code, country_info in sorted_countries_list:
-            futures_phase2.append(executor.submit(geocode_country_data,
-                                                  (country_code, country_info),
-                                                  TEMP_OSM_DATA_FOLDER,
-                                                  FINAL_OUTPUT_FOLDER,
-                                                  ALL_FIELDNAMES,
-                                                  GEOCODED_COLUMNS))
-
-        for future in as_completed(futures_phase2):
-            try:
-                country_failed_geocodings = future.result()
-                global_geocoding_failures.extend(country_failed_geocodings)
-            except Exception as exc:
-                print(f'Geocoding process for a country generated an exception: {exc}')
+        pipeline_end_time = time.time()
+        METRICS.observe('phase_download_and_geocoding_seconds', pipeline_end_time - pipeline_start_time)
+        logger.info(f"\n--- PHASES 1 + 2 COMPLETED in {pipeline_end_time - pipeline_start_time:.2f} seconds. ---")
+    else:
+        # --- PHASE 1: Incremental update from Overpass API ---
+        logger.info("\n\n--- PHASE 1: STARTING INCREMENTAL OVERPASS API UPDATE ---")
+        logger.info("Incremental update mode: only changes since the last successful download of each square are queried.")
+        phase1_start_time = time.time()
+
+        with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=worker_init,
+                                 initargs=(log_queue, LOG_LEVEL)) as executor:
+            # One job per part, largest countries first, so the refresh is spread over all workers
+            futures_phase1 = []
+            for country_code, country_info in sorted(sorted_countries_list, key=lambda item: item[1][2], reverse=True):
+                num_parts = (country_info[2] + MAX_SQUARES_PER_COUNTRY_PART_FILE - 1) // MAX_SQUARES_PER_COUNTRY_PART_FILE
+                for part_index in range(num_parts):
+                    futures_phase1.append(executor.submit(run_with_metrics, refresh_osm_data_for_country,
+                                                          (country_code, country_info),
+                                                          TEMP_OSM_DATA_FOLDER,
+                                                          [part_index]))
+
+            for future in as_completed(futures_phase1):
+                try:
+                    collect_result(future)
+                except Exception as exc:
+                    logger.error(f'Incremental update process for a country part generated an exception: {exc}')
+
+        phase1_end_time = time.time()
+        METRICS.observe('phase_incremental_update_seconds', phase1_end_time - phase1_start_time)
+        logger.info(f"\n--- PHASE 1 COMPLETED in {phase1_end_time - phase1_start_time:.2f} seconds. ---")
+
+        # --- Global deduplication across squares, parts and countries ---
+        # Adjacent squares share edges and country bounding boxes overlap,
+        # so the same charger can appear in several raw files.
+        logger.info("\n\n--- DEDUPLICATING RAW OSM DATA ACROSS ALL FILES ---")
+        with METRICS.timer('dedup_seconds'):
+            dedup_report = dedup_raw_files(TEMP_OSM_DATA_FOLDER)
+        if dedup_report:
+            # Rewritten part files get new sizes and checksums in the manifest, so they are not reported as corrupt
+            manifest = osm_manifest.connect(TEMP_OSM_DATA_FOLDER)
+            for file_stat in dedup_report['per_file']:
+                if file_stat['rows_out'] != file_stat['rows_in']:
+                    osm_manifest.refresh_part_file(manifest, file_stat['file'],
+                                                   os.path.join(TEMP_OSM_DATA_FOLDER, file_stat['file']),
+                                                   file_stat['rows_out'])
+            manifest.close()
+        dataset_manifest.update_manifest(TEMP_OSM_DATA_FOLDER, RAW_FILE_PATTERN)
 
-    phase2_end_time = time.time()
-    print(f"\n--- PHASE 2 COMPLETED in {phase2_end_time - phase2_start_time:.2f} seconds. ---")
+        # --- PHASE 2: Geocoding Data ---
+        logger.info("\n\n--- PHASE 2: STARTING DATA GEOCODING ---")
+        phase2_start_time = time.time()
+
+        with ProcessPoolExecutor(max_workers=MAX_GEOCODING_WORKERS, initializer=worker_init,
+                                 initargs=(log_queue, LOG_LEVEL)) as executor:
+            futures_phase2 = []
+            for country_code, country_info in sorted_countries_list:
+                futures_phase2.append(executor.submit(run_with_metrics, geocode_country_data,
+                                                      (country_code, country_info),
+                                                      TEMP_OSM_DATA_FOLDER,
+                                                      FINAL_OUTPUT_FOLDER,
+                                                      ALL_FIELDNAMES,
+                                                      GEOCODED_COLUMNS))
+
+            for future in as_completed(futures_phase2):
+                try:
+                    country_failed_geocodings = collect_result(future)
+                    global_geocoding_failures.extend(country_failed_geocodings)
+                except Exception as exc:
+                    logger.error(f'Geocoding process for a country generated an exception: {exc}')
+
+        phase2_end_time = time.time()
+        METRICS.observe('phase_geocoding_seconds', phase2_end_time - phase2_start_time)
+        logger.info(f"\n--- PHASE 2 COMPLETED in {phase2_end_time - phase2_start_time:.2f} seconds. ---")
 
     # --- Conclusion ---
     total_script_end_time = time.time()
-    print(f"\n--- Entire script completed in {total_script_end_time - total_script_start_time:.2f} seconds. ---")
+    logger.info(f"\n--- Entire script completed in {total_script_end_time - total_script_start_time:.2f} seconds. ---")
     
     # Save global geocoding failures
     if global_geocoding_failures:
         try:
             with open(FAILED_GEOCODING_LOG, 'w', encoding='utf-8') as f:
                 json.dump(global_geocoding_failures, f, indent=4)
-            print(f"Some geocoding queries failed. Details are in '{FAILED_GEOCODING_LOG}'.")
+            logger.warning(f"Some geocoding queries failed. Details are in '{FAILED_GEOCODING_LOG}'.")
         except IOError as e:
-            print(f"Error saving geocoding failures to {FAILED_GEOCODING_LOG}: {e}")
+            logger.error(f"Error saving geocoding failures to {FAILED_GEOCODING_LOG}: {e}")
     else:
-        print("All geocoding queries were successful (or were skipped because data already existed).")
+        logger.info("All geocoding queries were successful (or were skipped because data already existed).")
+
+    # Metrics summary and export (JSON and Prometheus text format)
+    logger.info("\n--- Metrics summary ---")
+    for line in METRICS.summary_lines():
+        logger.info(line)
+    try:
+        metrics_files = METRICS.export(LOGS_FOLDER, datetime.datetime.now().strftime("scrape_metrics_%Y-%m-%d_%H-%M-%S"))
+        logger.info(f"Metrics saved to '{metrics_files[0]}' and '{metrics_files[1]}'.")
+    except IOError as e:
+        logger.error(f"Error saving metrics to {LOGS_FOLDER}: {e}")
 
-    # Restore original stdout and stderr
-    sys.stdout = original_stdout
-    sys.stderr = original_stderr
-    f_log.close()
+    # Write out the remaining queued records and close the log file
+    shutdown_logging(log_listener)
     print(f"\nProgress has been logged to file: {log_filepath}")
\ No newline at end of file
@@ -2,12 +2,114 @@ import requests # Used for making HTTP requests to fetch web pages
 from bs4 import BeautifulSoup # Used for parsing HTML content
 import pandas as pd # Used for data manipulation and saving to CSV
 import time # Used to introduce delays to avoid overwhelming the server
+import random # Used for the jitter of retry delays
+import os # Used to check for the previous scrape
+import sys # Used to read command line flags
+import threading # Used to share the session and the request budget between crawler threads
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED # Used for the concurrent crawl
+from requests.adapters import HTTPAdapter # Used to size the connection pool of the shared session
+import sqlite3 # Errors of the indexed spec store
+from ev_spec_store import build_store, STORE_FILE # Builds the indexed SQLite store from the scraped CSV
+from url_quarantine import UrlQuarantine, classify_exception, EMPTY_PAGE, REDIRECT_LOOP # Skips known-broken URLs
+from page_fingerprints import (FingerprintStore, fingerprint_elements, delta_filename, merge_delta,
+                               NEW, CHANGED, UNCHANGED, REMOVED) # Change detection of refresh crawls
 
 # --- Configuration ---
 BASE_URL = "https://m.arenaev.com/" # The base URL of the website to be scraped
+OUTPUT_CSV = "arenaev_full_scrape.csv" # Scraped catalogue
+
+# Global request budget shared by all threads (requests per second), so the concurrent crawl stays polite
+REQUESTS_PER_SECOND = 2.0
+# Maximum number of requests that can be sent at once after an idle period
+REQUEST_BURST = 2
+
+# Maximum number of pages fetched in parallel per level of the crawl (makers -> models -> versions -> specs)
+LEVEL_WORKERS = {"models": 2, "versions": 4, "specs": 6}
+
+# Retries of a failed request (connection errors, timeouts, 429 and 5xx responses)
+MAX_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 1.0 # Base delay, doubled with every retry and randomized (full jitter)
+REQUEST_TIMEOUT_SECONDS = 30
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+QUARANTINE_SOURCE = "arenaev" # Label of this crawler's entries in the shared URL quarantine
 
 # --- Helper Functions ---
 
+class RateLimiter:
+    """
+    Token bucket shared by all threads: allows 'rate' requests per second on average
+    and at most 'burst' requests at once. acquire() blocks until a request may be sent.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST)
+
+FAILED_PAGES = set() # Pages that could not be fetched in this run (see fetch_soup)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Returns the keep-alive session shared by all requests (created on first use),
+    with a connection pool large enough for all crawler threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({'User-Agent': 'Mozilla/5.0'})
+            pool_size = sum(LEVEL_WORKERS.values()) + 1
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        return _session
+
+_quarantine = None
+
+def get_quarantine():
+    """
+    Returns the persistent URL quarantine (url_quarantine.py), opened on first use.
+    """
+    global _quarantine
+    with _session_lock:
+        if _quarantine is None:
+            _quarantine = UrlQuarantine()
+        return _quarantine
+
+def mark_empty_page(url, what):
+    """
+    Quarantines a page that loaded but does not contain what the scraper expects (e.g. no spec tables).
+    """
+    print(f"No {what} found on URL: {url}")
+    get_quarantine().record_failure(make_absolute(url), EMPTY_PAGE, f"no {what}", QUARANTINE_SOURCE)
+
+def retry_delay(attempt, response=None):
+    """
+    Returns the delay before retry number 'attempt' (1, 2, ...): the Retry-After header of a 429/503
+    response if present, otherwise exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
 def make_absolute(url):
     """
     Converts a relative URL into an absolute URL by prepending the BASE_URL
@@ -24,33 +126,89 @@ def make_absolute(url):
     else:
         return BASE_URL + url
 
-def fetch_soup(url):
+def fetch_response(url, headers=None, entry_point=False):
     """
-    Fetches the HTML content from a given URL and parses it using BeautifulSoup.
-    Includes basic error handling for network issues and HTTP status codes.
+    Fetches a URL over the shared session within the global request budget, with retries,
+    and keeps the URL quarantine up to date.
 
     Args:
         url (str): The URL of the page to fetch.
+        headers (dict): Extra request headers (e.g. conditional If-None-Match / If-Modified-Since).
+        entry_point (bool): The page the crawl starts from (the makers list). It is never quarantined,
+                            a single transient failure would otherwise skip whole crawls.
 
     Returns:
-        BeautifulSoup object: Parsed HTML content of the page, or an empty
-                              BeautifulSoup object if fetching fails.
+        requests.Response: The response (status 200, or 304 Not Modified for a conditional request),
+                           or None if fetching fails, the page is empty or the URL is quarantined.
     """
     url = make_absolute(url) # Ensure the URL is absolute
+    quarantine = get_quarantine()
+
+    def record_failure(failure_class, error):
+        if not entry_point:
+            quarantine.record_failure(url, failure_class, error, QUARANTINE_SOURCE)
+
+    if not entry_point and quarantine.is_quarantined(url):
+        # Failed on an earlier run and its retry window has not elapsed yet
+        print(f"Skipping quarantined URL: {url}")
+        return None
     print(f"Fetching URL: {url}") # Print the URL being fetched for tracking progress
-    try:
-        # Send a GET request with a User-Agent header to mimic a web browser
-        resp = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-        resp.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-    except requests.exceptions.TooManyRedirects:
-        # Handle cases where too many redirects occur, indicating a potential issue
-        print(f"Too many redirects on URL: {url}")
-        return BeautifulSoup("", "html.parser") # Return empty soup to continue execution
-    except Exception as e:
-        # Catch any other exceptions during the request (e.g., network errors)
-        print(f"Failed to fetch URL: {url} - {e}")
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        RATE_LIMITER.acquire() # Wait for the global request budget
+        resp = None
+        try:
+            # Send a GET request over the shared keep-alive session (User-Agent header set on the session)
+            resp = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+            if resp.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                raise requests.exceptions.HTTPError(f"{resp.status_code} Server Error", response=resp)
+            resp.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+        except requests.exceptions.TooManyRedirects as e:
+            # Handle cases where too many redirects occur, indicating a potential issue
+            print(f"Too many redirects on URL: {url}")
+            record_failure(REDIRECT_LOOP, e)
+            return None
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as e:
+            retryable = resp is None or resp.status_code in RETRY_STATUS_CODES
+            if retryable and attempt < MAX_RETRIES:
+                delay = retry_delay(attempt + 1, resp)
+                print(f"Retrying URL: {url} in {delay:.1f} s (attempt {attempt + 1}/{MAX_RETRIES}) - {e}")
+                time.sleep(delay)
+                continue
+            print(f"Failed to fetch URL: {url} - {e}")
+            record_failure(classify_exception(e), e)
+            return None
+        except Exception as e:
+            # Catch any other exceptions during the request
+            print(f"Failed to fetch URL: {url} - {e}")
+            record_failure(classify_exception(e), e)
+            return None
+
+        if resp.status_code != 304 and not resp.content.strip():
+            print(f"Empty page on URL: {url}")
+            record_failure(EMPTY_PAGE, "empty response body")
+            return None
+
+        quarantine.record_success(url) # Release the URL if it failed on an earlier run
+        return resp
+
+def fetch_soup(url, entry_point=False):
+    """
+    Fetches the HTML content from a given URL and parses it using BeautifulSoup.
+    Includes basic error handling for network issues and HTTP status codes (see fetch_response).
+
+    Args:
+        url (str): The URL of the page to fetch.
+        entry_point (bool): The page the crawl starts from (see fetch_response).
+
+    Returns:
+        BeautifulSoup object: Parsed HTML content of the page, or an empty
+                              BeautifulSoup object if fetching fails or the URL is quarantined.
+    """
+    resp = fetch_response(url, entry_point=entry_point)
+    if resp is None:
+        FAILED_PAGES.add(url) # Remembered, so a refresh does not take the missing children for removed pages
         return BeautifulSoup("", "html.parser") # Return empty soup to continue execution
-    
     # If successful, parse the content and return the BeautifulSoup object
     return BeautifulSoup(resp.content, "html.parser")
 
@@ -64,7 +222,7 @@ def scrap_makers():
         list of dict: A list where each dictionary contains 'maker_name' and 'maker_url'.
     """
     # Fetch the HTML for the makers page
-    soup = fetch_soup(BASE_URL + "makers.php3")
+    soup = fetch_soup(BASE_URL + "makers.php3", entry_point=True)
     makers = []
     # Find all <a> tags that have an 'href' attribute
     for a in soup.find_all("a", href=True):
@@ -75,6 +233,8 @@ def scrap_makers():
                 "maker_name": strong.text.strip(), # Extract and clean the maker's name
                 "maker_url": make_absolute(a["href"]) # Get the absolute URL for the maker's page
             })
+    if not makers and soup.contents:
+        print(f"No makers found on {BASE_URL}makers.php3")
     return makers
 
 def scrap_models(maker):
@@ -99,6 +259,8 @@ def scrap_models(maker):
             "year": a["data-year"].strip(), # Extract and clean year from 'data-year' attribute
             "model_url": make_absolute(a["href"]) # Get the absolute URL for the model's page
         })
+    if not models and soup.contents:
+        mark_empty_page(maker["maker_url"], "models")
     return models
 
 def scrap_versions(model):
@@ -139,25 +301,57 @@ def scrap_versions(model):
         })
     return versions
 
-def scrap_specs(ver):
+def scrap_specs(ver, fingerprints=None):
     """
     Scrapes the detailed specifications for a specific EV version.
     Details are typically organized in tables with 'ttl' (title) and 'nfo' (info) classes.
 
     Args:
         ver (dict): A dictionary containing version details.
+        fingerprints (FingerprintStore): The fingerprints of the previous crawl. The fingerprint of the
+                                         spec tables is always recorded; in a refresh crawl the page is
+                                         requested conditionally and its spec tables are parsed only
+                                         if they are new or changed.
 
     Returns:
         dict: A dictionary containing inherited version details and all scraped
               specifications, with keys formatted as "Section.SpecificationName".
+              In a refresh crawl it also has 'change' (new / changed / unchanged); unchanged
+              pages (and pages that could not be fetched) carry only the version details.
     """
-    # Fetch the HTML for the specific version's page
-    soup = fetch_soup(ver["version_url"])
     # Initialize data with inherited fields from the version (maker, model, year, etc.)
     data = {k: ver[k] for k in ["maker_name","model_name","year","version_name","version_url"]}
-    
+
+    if fingerprints is None:
+        # Fetch the HTML for the specific version's page
+        soup = fetch_soup(ver["version_url"])
+    else:
+        # In a refresh crawl, ask for the page only if it changed since the previous crawl (ETag / Last-Modified)
+        resp = fetch_response(ver["version_url"], headers=fingerprints.conditional_headers(ver["version_url"]))
+        if resp is None:
+            if fingerprints.refresh:
+                data["change"] = UNCHANGED # Keep the previous data of a page that failed this time
+            else:
+                FAILED_PAGES.add(ver["version_url"])
+            return data
+        if resp.status_code == 304:
+            data["change"] = fingerprints.mark_not_modified(ver["version_url"])
+            return data
+        soup = BeautifulSoup(resp.content, "html.parser")
+
     # Find all <table> elements on the page
-    for table in soup.find_all("table"):
+    tables = soup.find_all("table")
+    if not tables and soup.contents:
+        mark_empty_page(ver["version_url"], "spec tables")
+    if fingerprints is not None:
+        # Hash only the spec tables, so ads and layout changes around them do not count as a change
+        change = fingerprints.check(ver["version_url"], fingerprint_elements(tables), QUARANTINE_SOURCE,
+                                    resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        if fingerprints.refresh:
+            data["change"] = change
+            if change == UNCHANGED:
+                return data
+    for table in tables:
         # The <th> tag in the first row usually indicates the section title (e.g., "Performance")
         th = table.find("th")
         section = th.text.strip() if th else "Unknown" # Default to "Unknown" if no section header found
@@ -175,21 +369,17 @@ def scrap_specs(ver):
 
 # --- Main Execution Flow ---
 
-def main():
+def crawl_sequential(fingerprints=None):
     """
-    Orchestrates the entire scraping process:
-    1. Scrapes all EV makers.
-    2. For each maker, scrapes all models.
-    3. For each model, scrapes all versions.
-    4. For each version, scrapes detailed specifications.
-    5. Collects all data and saves it to a CSV file.
+    Walks makers -> models -> versions -> specs one page at a time (the original crawl).
+    Returns the list of spec dictionaries (see scrap_specs for fingerprints).
     """
     results = [] # List to store all collected data dictionaries
-    
+
     # Step 1: Scrape all makers
     makers = scrap_makers()
     print(f"💡 Found {len(makers)} manufacturers.") # Inform user about the number of makers found
-    
+
     # Iterate through each maker
     for m in makers:
         print(f"Scraping manufacturer: {m['maker_name']}") # Indicate current manufacturer being processed
@@ -202,16 +392,137 @@ def main():
             for ver in versions:
                 print(f"   🔧 Version: {ver['version_name'] if ver['version_name'] else 'Default/Base'}") # Indicate current version
                 # Step 4: Scrape detailed specifications for the current version
-                spec = scrap_specs(ver)
+                spec = scrap_specs(ver, fingerprints)
                 results.append(spec) # Add the collected specifications to the results list
                 time.sleep(1) # Pause for 1 second after each version's specs (be respectful to the server)
             time.sleep(1) # Pause for 1 second after processing all models for a maker
-    
-    # After scraping all data, create a Pandas DataFrame and save it to a CSV file
-    df = pd.DataFrame(results)
-    df.to_csv("arenaev_full_scrape.csv", index=False, encoding="utf-8-sig")
-    print("✅ Done! Data saved to arenaev_full_scrape.csv") # Success message
+    return results
+
+def crawl_concurrent(fingerprints=None):
+    """
+    Crawls the same tree concurrently: every level has its own thread pool (LEVEL_WORKERS),
+    and a page is submitted as soon as its parent page is parsed, so all levels work at the same time.
+    All requests share one keep-alive session and the global REQUESTS_PER_SECOND budget,
+    so more threads only hide latency, never increase the load on the server.
+    Returns the spec dictionaries in the same order as crawl_sequential (see scrap_specs for fingerprints).
+    """
+    makers = scrap_makers()
+    print(f"💡 Found {len(makers)} manufacturers.")
+
+    results = [] # (order key, spec) pairs, sorted at the end
+    pools = {level: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=level)
+             for level, workers in LEVEL_WORKERS.items()}
+    pending = {} # future -> (level, order key)
+    try:
+        for maker_index, maker in enumerate(makers):
+            pending[pools["models"].submit(scrap_models, maker)] = ("models", (maker_index,))
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                level, key = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Failed to scrape {level} {key}: {e}")
+                    continue
+                if level == "models":
+                    print(f"Scraped manufacturer {makers[key[0]]['maker_name']}: {len(result)} models.")
+                    for model_index, model in enumerate(result):
+                        pending[pools["versions"].submit(scrap_versions, model)] = ("versions", key + (model_index,))
+                elif level == "versions":
+                    for version_index, ver in enumerate(result):
+                        pending[pools["specs"].submit(scrap_specs, ver, fingerprints)] = ("specs", key + (version_index,))
+                else:
+                    results.append((key, result))
+                    if len(results) % 50 == 0:
+                        print(f"   🔧 {len(results)} versions scraped.")
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    return [spec for _, spec in sorted(results, key=lambda item: item[0])]
+
+def refresh_catalogue(results, fingerprints):
+    """
+    Turns the results of a refresh crawl into a delta against the previous crawl and applies it:
+    new and changed versions are written to a delta CSV (with their 'change'), known versions that are
+    no longer listed on the site are added as 'removed' (only if all listing pages loaded), and the delta is merged into OUTPUT_CSV,
+    so only the changed rows are rewritten downstream instead of the whole catalogue.
+    Returns the delta rows.
+    """
+    seen_urls = {spec["version_url"] for spec in results}
+    delta = [spec for spec in results if spec["change"] in (NEW, CHANGED)]
+    if FAILED_PAGES:
+        # A version missing under a maker or model page that failed may still exist
+        print(f"{len(FAILED_PAGES)} pages failed, removed versions are not detected in this run.")
+        removed_urls = set()
+    else:
+        removed_urls = fingerprints.known_urls(QUARANTINE_SOURCE) - seen_urls
+    delta.extend({"version_url": url, "change": REMOVED} for url in sorted(removed_urls))
+
+    counts = {change: sum(1 for spec in delta if spec["change"] == change) for change in (NEW, CHANGED, REMOVED)}
+    print(f"Refresh: {counts[NEW]} new, {counts[CHANGED]} changed, {counts[REMOVED]} removed, "
+          f"{len(results) - counts[NEW] - counts[CHANGED]} unchanged versions.")
+    if not delta:
+        print("✅ Done! The catalogue is up to date.")
+        return delta
+
+    delta_csv = delta_filename(OUTPUT_CSV)
+    pd.DataFrame(delta).to_csv(delta_csv, index=False, encoding="utf-8-sig")
+    print(f"Delta saved to {delta_csv}")
+    rows = merge_delta(OUTPUT_CSV, delta, ["version_url"], delimiter=',', encoding='utf-8-sig')
+    fingerprints.forget(removed_urls)
+    print(f"✅ Done! {OUTPUT_CSV} updated ({rows} versions).")
+    return delta
+
+def main(concurrent=True, refresh=False):
+    """
+    Orchestrates the entire scraping process:
+    1. Scrapes all EV makers.
+    2. For each maker, scrapes all models.
+    3. For each model, scrapes all versions.
+    4. For each version, scrapes detailed specifications.
+    5. Collects all data and saves it to a CSV file.
+    6. Builds the indexed spec store (ev_spec_store.py) from the CSV.
+    Steps 2-4 run concurrently (crawl_concurrent) unless concurrent is False.
+    With refresh, only new and changed spec pages are parsed (page_fingerprints.py) and
+    the CSV is updated from a delta (refresh_catalogue) instead of being rewritten from scratch.
+    A full crawl records the fingerprints of all pages, so the next refresh starts from them.
+    """
+    start_time = time.time()
+    fingerprints = FingerprintStore(refresh=refresh)
+    if refresh and not os.path.exists(OUTPUT_CSV):
+        print(f"{OUTPUT_CSV} does not exist yet, all versions will be reported as new.")
+    results = crawl_concurrent(fingerprints) if concurrent else crawl_sequential(fingerprints)
+    print(f"Scraped {len(results)} versions in {time.time() - start_time:.1f} seconds.")
+
+    if refresh:
+        delta = refresh_catalogue(results, fingerprints)
+        fingerprints.close()
+        if not delta and os.path.exists(STORE_FILE):
+            get_quarantine().save_report()
+            return
+    else:
+        # After scraping all data, create a Pandas DataFrame and save it to a CSV file
+        df = pd.DataFrame(results)
+        df.to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
+        print(f"✅ Done! Data saved to {OUTPUT_CSV}") # Success message
+        # Pages no longer in the catalogue are forgotten, unless some listing page failed
+        if not FAILED_PAGES:
+            fingerprints.forget(fingerprints.known_urls(QUARANTINE_SOURCE) - {spec["version_url"] for spec in results})
+        fingerprints.close()
+
+    # Step 5: Normalize the wide CSV into the indexed store used for lookups and joins
+    try:
+        build_store(OUTPUT_CSV)
+    except (IOError, sqlite3.Error) as e:
+        print(f"Failed to build the spec store: {e}")
+
+    get_quarantine().save_report()
 
 if __name__ == "__main__":
     # This ensures that main() is called only when the script is executed directly
-    main()
\ No newline at end of file
+    # --sequential runs the original one-page-at-a-time crawl
+    # --refresh parses only pages that changed since the previous crawl and merges them into the CSV
+    main(concurrent="--sequential" not in sys.argv, refresh="--refresh" in sys.argv)
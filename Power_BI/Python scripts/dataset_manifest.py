@@ -0,0 +1,196 @@
+import csv
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import re
+
+# --- Configuration ---
+MANIFEST_FILENAME = "dataset_manifest.json" # Stored in the folder of the registered files
+
+# Known dataset file name prefixes; the rest of the name (without extension) is the country
+DATASET_PREFIXES = ["ev_chargers_osm_raw_", "ev_chargers_geocoded_", "openchargemap_"]
+
+# "<country> [Part N]" written by Scrap_API_Oper_pass_geo.py for countries split into several files
+_PART_SUFFIX = re.compile(r'^(.*?)\s*\[Part\s*(\d+)\]$', re.IGNORECASE)
+# "<name>[N]" written by the old rename loop in Merge_CSV.py (block 4)
+_LEGACY_INDEX_SUFFIX = re.compile(r'^(.*?)\[(\d+)\]$')
+
+# --- Name parsing ---
+def parse_partition_name(filename):
+    """
+    Splits a data file name into (dataset, country, part).
+    E.g. 'ev_chargers_osm_raw_germany [Part 2].csv' -> ('ev_chargers_osm_raw', 'germany', 2).
+    This is the only place where file names are parsed; everything else looks partitions up in the manifest.
+    """
+    base_name = os.path.splitext(os.path.basename(filename))[0]
+    part = None
+    match = _PART_SUFFIX.match(base_name)
+    if match:
+        base_name, part = match.group(1).strip(), int(match.group(2))
+    else:
+        match = _LEGACY_INDEX_SUFFIX.match(base_name)
+        if match:
+            base_name = match.group(1).strip()
+
+    for prefix in DATASET_PREFIXES:
+        if base_name.startswith(prefix):
+            return prefix.rstrip('_'), base_name[len(prefix):], part
+    return '', base_name, part
+
+def _read_country_code(filepath):
+    """
+    Returns the 'scraped_country_code' of the first data row, or None if the file does not have one.
+    """
+    try:
+        with open(filepath, 'r', newline='', encoding='utf-8-sig') as infile:
+            header_line = infile.readline()
+            delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+            reader = csv.DictReader(infile, fieldnames=next(csv.reader([header_line], delimiter=delimiter), []),
+                                    delimiter=delimiter)
+            first_row = next(reader, None)
+    except (IOError, csv.Error, UnicodeDecodeError):
+        return None
+    code = (first_row or {}).get('scraped_country_code')
+    return code.strip().upper() if code and code.strip() not in ('', 'N/A') else None
+
+def _file_sha256(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def make_partition_id(dataset, country_key, part, sha256):
+    """
+    Stable partition id: the same content of the same dataset, country and part always gets the same id,
+    regardless of file order or how many files are in the folder.
+    """
+    identity = f"{dataset}|{country_key}|{part or 0}|{sha256}"
+    return f"{country_key}-{hashlib.blake2b(identity.encode('utf-8'), digest_size=6).hexdigest()}"
+
+# --- Manifest ---
+def load_manifest(folder):
+    """
+    Loads the manifest of a folder. Returns an empty manifest if it does not exist or is unreadable.
+    """
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('partitions'), dict):
+            return manifest
+    except (IOError, ValueError):
+        pass
+    return {'version': 1, 'partitions': {}}
+
+def save_manifest(folder, manifest):
+    """
+    Writes the manifest atomically (temporary file + os.replace).
+    """
+    manifest_path = os.path.join(folder, MANIFEST_FILENAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+def update_manifest(folder, pattern="*.csv"):
+    """
+    Registers all files matching the pattern in the folder's manifest and returns the manifest.
+    Files with unchanged size and modification time keep their entry without being read again,
+    so reruns cost one directory listing; only new or changed files are hashed.
+    Entries of files that no longer exist are removed. Running it twice changes nothing.
+    """
+    manifest = load_manifest(folder)
+    partitions = dict(manifest['partitions'])
+    by_file = {entry['file']: (partition_id, entry) for partition_id, entry in partitions.items()}
+    changed = False
+
+    current_files = set()
+    for filepath in glob.glob(os.path.join(folder, pattern)):
+        filename = os.path.basename(filepath)
+        current_files.add(filename)
+        stat = os.stat(filepath)
+        known = by_file.get(filename)
+        if known and known[1]['size_bytes'] == stat.st_size and known[1]['mtime'] == stat.st_mtime:
+            continue
+
+        dataset, country, part = parse_partition_name(filename)
+        country_code = _read_country_code(filepath)
+        if country_code is None and len(country) == 2:
+            country_code = country.upper() # e.g. openchargemap_AD
+        country_key = (country_code or country).lower()
+        sha256 = _file_sha256(filepath)
+        partition_id = make_partition_id(dataset, country_key, part, sha256)
+
+        if known:
+            partitions.pop(known[0], None)
+        partitions[partition_id] = {
+            'file': filename,
+            'dataset': dataset,
+            'country': country,
+            'country_code': country_code,
+            'part': part,
+            'sha256': sha256,
+            'size_bytes': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+        changed = True
+
+    # Forget files matching the pattern that were deleted
+    for partition_id, entry in list(partitions.items()):
+        if entry['file'] not in current_files and fnmatch.fnmatch(entry['file'], pattern):
+            del partitions[partition_id]
+            changed = True
+
+    manifest['partitions'] = partitions
+    if changed:
+        save_manifest(folder, manifest)
+    return manifest
+
+# --- Lookups ---
+def _sort_key(partition):
+    return (partition['country'], partition['part'] or 0, partition['file'])
+
+def resolve_partitions(folder, pattern="*.csv", dataset=None, country=None, update=True):
+    """
+    Returns the partitions of a folder as a list of manifest entries with 'partition_id' and 'path',
+    ordered by country and part. dataset and country (the name part of the file name, e.g. 'czech_republic')
+    filter the result; country matches exactly, so 'niger' never picks up 'nigeria'.
+
+    With update, the manifest is refreshed first - do this only in the main process, workers should
+    pass update=False and just read it. If the manifest cannot be written or has no matching entries,
+    the files are found with glob and name parsing instead (entries without partition_id).
+    """
+    manifest = None
+    if update:
+        try:
+            manifest = update_manifest(folder, pattern)
+        except IOError:
+            manifest = None
+    if manifest is None:
+        manifest = load_manifest(folder)
+
+    partitions = []
+    for partition_id, entry in manifest['partitions'].items():
+        path = os.path.join(folder, entry['file'])
+        if fnmatch.fnmatch(entry['file'], pattern) and os.path.exists(path):
+            partitions.append({**entry, 'partition_id': partition_id, 'path': path})
+    partitions = [p for p in partitions
+                  if (dataset is None or p['dataset'] == dataset) and (country is None or p['country'] == country)]
+
+    if not partitions:
+        # Fallback without the manifest
+        for filepath in glob.glob(os.path.join(folder, pattern)):
+            file_dataset, file_country, part = parse_partition_name(filepath)
+            if (dataset is None or file_dataset == dataset) and (country is None or file_country == country):
+                partitions.append({'partition_id': None, 'file': os.path.basename(filepath), 'path': filepath,
+                                   'dataset': file_dataset, 'country': file_country, 'country_code': None, 'part': part})
+    return sorted(partitions, key=_sort_key)
+
+def display_name(partition):
+    """
+    Returns a readable name of a partition for logs, e.g. 'GERMANY [Part 2]'.
+    """
+    name = partition['country'].upper()
+    return f"{name} [Part {partition['part']}]" if partition['part'] else name
@@ -0,0 +1,285 @@
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import sys
+import time
+
+# --- Configuration ---
+ARENAEV_CSV = "arenaev_full_scrape.csv" # Output of Scrap_EV_manufactures.py
+STORE_FILE = "arenaev_specs.sqlite" # Indexed store built from it
+
+# Columns of the scrape that identify a version; all other columns are specs named "Section.Spec"
+VERSION_COLUMNS = ["maker_name", "model_name", "year", "version_name", "version_url"]
+
+# A number with thousands separators ('1,234', '45 990') or a decimal dot or comma ('4.4', '75,5')
+_NUMBER = r'\d{1,3}(?:[,\u2009\u202f\xa0 ]\d{3})+(?:\.\d+)?|\d+(?:[.,]\d+)?'
+_THOUSANDS = re.compile(r'^\d{1,3}(?:[,\u2009\u202f\xa0 ]\d{3})+(?:\.\d+)?$')
+# Units accepted after a bare number ('75 kWh', '180 km/h (112 mph)'); other text after the number
+# ('5 door hatchback', '4173 x 1781 x 1532 mm', '2024, April 10') leaves the value without a number
+KNOWN_UNITS = {"kWh", "kW", "hp", "Nm", "km/h", "mph", "km", "mm", "kg", "l", "Cd", "V", "A", "s", "sec", "min"}
+_PLAIN_VALUE = re.compile(rf'^\s*({_NUMBER})\s*(\S+)\s*(?:\([^()]*\))?\s*$')
+# Specs whose values carry a prefix or several numbers: "Section.Spec" -> [(pattern, unit)], the first
+# matching pattern wins and its group 1 is the number (see the scrape for the value formats)
+SPEC_RULES = {
+    "Launch.Base price": [(r'€\s*({num})', "EUR"), (r'\$\s*({num})', "USD"), (r'£\s*({num})', "GBP")],
+    "Performance.Power": [(r'({num})\s*kW\b', "kW")],
+    "Performance.Acceleration": [(r'({num})\s*sec\s*0-100\s*km/h', "s 0-100 km/h"),
+                                 (r'({num})\s*sec\s*0-60\s*mph', "s 0-60 mph")],
+    "Battery.Capacity": [(r'({num})\s*kWh\s+total', "kWh total"), (r'({num})\s*kWh\s+usable', "kWh usable")],
+    "Battery.Range": [(r'({num})\s*km\s+WLTP', "km WLTP"), (r'({num})\s*km\s+EPA', "km EPA"),
+                      (r'({num})\s*km\s+NEDC', "km NEDC")],
+    "Battery.Consumption": [(r'({num})\s*kWh/100\s*km\s+WLTP', "kWh/100 km WLTP"),
+                            (r'({num})\s*kWh/100\s*km\s+EPA', "kWh/100 km EPA")],
+    "Body.Weight": [(r'EU:\s*({num})\s*kg\s+unladen', "kg unladen"), (r'US:\s*({num})\s*kg\s+curb', "kg curb")],
+    "Body.Trunk": [(r'^EU:\s*({num})\s*l\b', "l"), (r'^US:\s*({num})\s*l\b', "l")],
+}
+_SPEC_RULES = {key: [(re.compile(pattern.format(num=_NUMBER)), unit) for pattern, unit in rules]
+               for key, rules in SPEC_RULES.items()}
+_YEAR = re.compile(r'(19|20)\d{2}')
+
+_SCHEMA = """
+CREATE TABLE versions (
+    version_id INTEGER PRIMARY KEY,
+    maker_name TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    year INTEGER,
+    year_text TEXT,
+    version_name TEXT,
+    version_url TEXT,
+    maker_key TEXT NOT NULL,
+    model_key TEXT NOT NULL
+);
+CREATE TABLE specs (
+    version_id INTEGER NOT NULL REFERENCES versions(version_id),
+    section TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value_text TEXT NOT NULL,
+    value_num REAL,
+    unit TEXT
+);
+"""
+
+# Created after the bulk insert, which is much faster than maintaining them row by row
+_INDEXES = """
+CREATE INDEX idx_versions_maker_model_year ON versions(maker_key, model_key, year);
+CREATE INDEX idx_versions_year ON versions(year);
+CREATE INDEX idx_specs_version ON specs(version_id);
+CREATE INDEX idx_specs_name_value ON specs(section, name, value_num);
+"""
+
+
+def normalize_key(text):
+    """
+    Lookup key of a maker or model name: lowercase, single spaces ('Model  3 ' -> 'model 3').
+    """
+    return " ".join((text or "").lower().split())
+
+
+def parse_number(text):
+    """
+    '1,234' -> 1234.0, '45 990' -> 45990.0, '75,5' -> 75.5.
+    """
+    if _THOUSANDS.match(text):
+        return float(re.sub(r'[,\u2009\u202f\xa0 ]', '', text))
+    return float(text.replace(',', '.'))
+
+
+def parse_spec_value(value, spec_key=None):
+    """
+    Splits a spec value into (number, unit): '75 kWh' -> (75.0, 'kWh'), 'Yes' -> (None, None).
+    Specs in SPEC_RULES use their patterns ('FWD 207 kW (278 hp)' -> (207.0, 'kW')), all others
+    only a number followed by a known unit; anything else stays without a number (NULL in the store).
+    """
+    if spec_key in _SPEC_RULES:
+        for pattern, unit in _SPEC_RULES[spec_key]:
+            match = pattern.search(value)
+            if match:
+                return parse_number(match.group(1)), unit
+        return None, None
+    match = _PLAIN_VALUE.match(value)
+    if not match or match.group(2) not in KNOWN_UNITS:
+        return None, None
+    return parse_number(match.group(1)), match.group(2)
+
+
+def split_spec_key(key):
+    """
+    'Battery.Capacity' -> ('Battery', 'Capacity'); keys without a section get ''.
+    """
+    section, _, name = key.partition('.')
+    return (section, name) if name else ('', section)
+
+
+# --- Build ---
+def build_store(csv_file=ARENAEV_CSV, store_file=STORE_FILE):
+    """
+    Normalizes the wide scrape (one row per version, one column per spec) into two tables:
+    versions (one row per version, with normalized maker/model keys and a numeric year) and
+    specs (one row per filled spec, the value as text and, if parse_spec_value finds one, as REAL with its unit).
+    The CSV is streamed, so memory does not grow with the catalogue. The store is built in a temporary
+    file and replaces the old one only when it is complete. Returns (versions, specs) row counts.
+    """
+    start_time = time.time()
+    temp_file = store_file + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    connection = sqlite3.connect(temp_file)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(_SCHEMA)
+        version_count = spec_count = 0
+        with open(csv_file, 'r', newline='', encoding='utf-8-sig') as infile:
+            reader = csv.DictReader(infile)
+            spec_columns = [(column, *split_spec_key(column)) for column in reader.fieldnames or []
+                            if column not in VERSION_COLUMNS]
+            for version_id, row in enumerate(reader, start=1):
+                year_text = (row.get('year') or '').strip()
+                year_match = _YEAR.search(year_text)
+                connection.execute(
+                    "INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (version_id, row.get('maker_name') or '', row.get('model_name') or '',
+                     int(year_match.group(0)) if year_match else None, year_text,
+                     row.get('version_name') or '', row.get('version_url') or '',
+                     normalize_key(row.get('maker_name')), normalize_key(row.get('model_name'))))
+                spec_rows = []
+                for column, section, name in spec_columns:
+                    value = (row.get(column) or '').strip()
+                    if value:
+                        spec_rows.append((version_id, section, name, value, *parse_spec_value(value, column)))
+                connection.executemany("INSERT INTO specs VALUES (?, ?, ?, ?, ?, ?)", spec_rows)
+                version_count += 1
+                spec_count += len(spec_rows)
+        connection.executescript(_INDEXES)
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temp_file, store_file)
+    print(f"Store '{store_file}' built from '{csv_file}' in {time.time() - start_time:.2f} seconds: "
+          f"{version_count} versions, {spec_count} spec values.")
+    return version_count, spec_count
+
+
+# --- Queries ---
+class EvSpecStore:
+    """
+    Read-only query API of the store. All lookups go through the indexes
+    (maker, model, year and section/name/value), never through a scan of the spec table.
+    """
+    def __init__(self, store_file=STORE_FILE):
+        if not os.path.exists(store_file):
+            raise FileNotFoundError(f"Store '{store_file}' does not exist, build it first (build_store).")
+        self.connection = sqlite3.connect(f"file:{store_file}?mode=ro", uri=True)
+        self.connection.row_factory = sqlite3.Row
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def find_versions(self, maker=None, model=None, year=None, year_to=None):
+        """
+        Returns versions (list of dicts) of a maker, optionally of a model and a year or a year range
+        (year..year_to). Maker and model match their normalized names exactly.
+        """
+        conditions, params = [], []
+        if maker is not None:
+            conditions.append("maker_key = ?")
+            params.append(normalize_key(maker))
+        if model is not None:
+            conditions.append("model_key = ?")
+            params.append(normalize_key(model))
+        if year is not None:
+            conditions.append("year BETWEEN ? AND ?")
+            params.extend([year, year_to if year_to is not None else year])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT * FROM versions {where} ORDER BY maker_key, model_key, year, version_name", params)
+        return [dict(row) for row in rows]
+
+    def get_specs(self, version_id, numeric=False):
+        """
+        Returns the specs of one version as {"Section.Spec": value}, the numeric value (or None) with numeric.
+        """
+        rows = self.connection.execute(
+            "SELECT section, name, value_text, value_num FROM specs WHERE version_id = ?", (version_id,))
+        return {f"{row['section']}.{row['name']}" if row['section'] else row['name']:
+                row['value_num'] if numeric else row['value_text'] for row in rows}
+
+    def lookup(self, maker, model=None, year=None):
+        """
+        Returns the matching versions, each with its specs under 'specs'.
+        """
+        versions = self.find_versions(maker, model, year)
+        for version in versions:
+            version['specs'] = self.get_specs(version['version_id'])
+        return versions
+
+    def spec_values(self, spec_key, maker=None, min_value=None, max_value=None):
+        """
+        Returns one spec of all versions as rows (version_id, maker_name, model_name, year, value_num, unit),
+        e.g. spec_values("Battery.Capacity", min_value=70) - for joins with sales and price data.
+        """
+        section, name = split_spec_key(spec_key)
+        conditions, params = ["s.section = ?", "s.name = ?"], [section, name]
+        if min_value is not None:
+            conditions.append("s.value_num >= ?")
+            params.append(min_value)
+        if max_value is not None:
+            conditions.append("s.value_num <= ?")
+            params.append(max_value)
+        if maker is not None:
+            conditions.append("v.maker_key = ?")
+            params.append(normalize_key(maker))
+        rows = self.connection.execute(
+            "SELECT v.version_id, v.maker_name, v.model_name, v.year, s.value_num, s.unit "
+            "FROM specs s JOIN versions v ON v.version_id = s.version_id "
+            f"WHERE {' AND '.join(conditions)} ORDER BY v.maker_key, v.model_key, v.year", params)
+        return [dict(row) for row in rows]
+
+    def spec_names(self):
+        """
+        Returns all spec keys in the store with the number of versions that have them.
+        """
+        rows = self.connection.execute(
+            "SELECT section, name, COUNT(*) AS versions FROM specs GROUP BY section, name ORDER BY section, name")
+        return {f"{row['section']}.{row['name']}" if row['section'] else row['name']: row['versions'] for row in rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed store of the arenaev EV spec catalogue.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the store from the scraped CSV.")
+    build_parser.add_argument("csv_file", nargs="?", default=ARENAEV_CSV)
+    build_parser.add_argument("--store", default=STORE_FILE)
+    query_parser = subparsers.add_parser("query", help="Print versions and specs of a maker / model / year.")
+    query_parser.add_argument("maker")
+    query_parser.add_argument("model", nargs="?")
+    query_parser.add_argument("--year", type=int)
+    query_parser.add_argument("--store", default=STORE_FILE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            build_store(args.csv_file, args.store)
+        except (IOError, csv.Error, sqlite3.Error) as e:
+            print(f"Error building store from '{args.csv_file}': {e}")
+            sys.exit(1)
+    else:
+        with EvSpecStore(args.store) as store:
+            versions = store.lookup(args.maker, args.model, args.year)
+            for version in versions:
+                print(f"{version['maker_name']} {version['model_name']} ({version['year_text']}) "
+                      f"{version['version_name']}: {len(version['specs'])} specs")
+                for key, value in version['specs'].items():
+                    print(f"  {key}: {value}")
+            print(f"{len(versions)} versions found.")
@@ -0,0 +1,240 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from excel_cache import read_excel_cached # Parquet copies of the workbooks, parsed with openpyxl only when changed
+
+# --- Configuration ---
+SOURCES_FOLDER = os.path.join("..", "Sources", "EV Sales")
+OWID_FOLDER = os.path.join(SOURCES_FOLDER, "ourworldindat") # One folder per OWID chart: <chart>.csv + <chart>.metadata.json
+STORE_FILE = "ev_timeseries.parquet"
+
+# IEA Global EV Outlook workbooks: one row per (region, category, parameter, mode, powertrain, year)
+IEA_SOURCES = {
+    "iea_gevo_2025": {"file": "EV Data Explorer 2025.xlsx", "sheet": "GEVO_EV_2025", "value": "value"},
+    "iea_historical": {"file": "Data EV Historical sales.xlsx", "sheet": 0, "value": "value_number"},
+}
+# Codes of regions that have no code in the OWID charts or are named differently by the IEA;
+# other IEA regions get the code of the OWID entity with the same name, aggregates like 'Rest of the world' have none
+ENTITY_CODES = {
+    "USA": "USA", "Korea": "KOR", "Turkiye": "TUR", "Czech Republic": "CZE", "Viet Nam": "VNM", "Russia": "RUS",
+    "Bulgaria": "BGR", "Colombia": "COL", "Costa Rica": "CRI", "Croatia": "HRV", "Cyprus": "CYP", "Estonia": "EST",
+    "Hungary": "HUN", "Indonesia": "IDN", "Ireland": "IRL", "Jordan": "JOR", "Latvia": "LVA", "Lithuania": "LTU",
+    "Luxembourg": "LUX", "Malaysia": "MYS", "Romania": "ROU", "Seychelles": "SYC", "Slovakia": "SVK",
+    "Slovenia": "SVN", "South Africa": "ZAF", "Thailand": "THA", "Uzbekistan": "UZB",
+    "EU27": "OWID_EU27", "European Union (27)": "OWID_EU27",
+}
+
+# Columns of the store, in order; all text columns are dictionary (categorical) encoded
+STORE_COLUMNS = ["metric", "code", "entity", "year", "value", "unit", "mode", "powertrain", "category", "source"]
+CATEGORICAL_COLUMNS = ["metric", "code", "entity", "unit", "mode", "powertrain", "category", "source"]
+SORT_COLUMNS = ["metric", "code", "year"]
+# Rows per Parquet row group; with the sort order, a query for a few metrics reads only their row groups
+ROW_GROUP_ROWS = 8192
+
+# Rows with the same key are duplicates (e.g. the same OWID chart downloaded twice); the first one is kept
+KEY_COLUMNS = ["source", "metric", "entity", "year", "mode", "powertrain", "category"]
+
+logger = logging.getLogger("ev_timeseries_store")
+
+
+def metric_name(text):
+    """
+    'EV sales share' -> 'ev_sales_share'
+    """
+    return "_".join(re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).split())
+
+
+# --- Loading ---
+def load_owid_chart(csv_file):
+    """
+    Loads one OWID chart CSV (Entity, Code, Year, <one column per indicator>) into long format.
+    Metric names and units come from the chart's metadata JSON ('shortName', 'unit') if it exists,
+    otherwise the metric is the normalized column name.
+    """
+    metadata_file = csv_file[:-len(".csv")] + ".metadata.json"
+    columns_metadata = {}
+    if os.path.exists(metadata_file):
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            columns_metadata = json.load(f).get("columns", {})
+
+    chart = pd.read_csv(csv_file, dtype={"Entity": str, "Code": str})
+    value_columns = [col for col in chart.columns if col not in ("Entity", "Code", "Year")]
+    long = chart.melt(id_vars=["Entity", "Code", "Year"], value_vars=value_columns, var_name="column", value_name="value")
+    long["metric"] = long["column"].map(lambda col: columns_metadata.get(col, {}).get("shortName") or metric_name(col))
+    long["unit"] = long["column"].map(lambda col: columns_metadata.get(col, {}).get("unit"))
+    long = long.rename(columns={"Entity": "entity", "Code": "code", "Year": "year"}).drop(columns="column")
+    long["source"] = "owid"
+    return long
+
+
+def load_iea_workbook(source_name, sources_folder=SOURCES_FOLDER):
+    """
+    Loads one IEA workbook of IEA_SOURCES into long format: the parameter becomes the metric,
+    mode, powertrain and category (Historical / projection scenario) stay as dimensions.
+    The sheet is read through the Excel cache (excel_cache.py).
+    """
+    config = IEA_SOURCES[source_name]
+    sheet = read_excel_cached(os.path.join(sources_folder, config["file"]), sheet_name=config["sheet"])
+    sheet = sheet.rename(columns={"region_country": "region"})
+    return pd.DataFrame({
+        "entity": sheet["region"].astype(str),
+        "year": pd.to_numeric(sheet["year"], errors='coerce'),
+        "value": pd.to_numeric(sheet[config["value"]], errors='coerce'),
+        "metric": sheet["parameter"].map(metric_name),
+        "unit": sheet["unit"],
+        "mode": sheet["mode"],
+        "powertrain": sheet["powertrain"],
+        "category": sheet["category"],
+        "source": source_name,
+    })
+
+
+def load_all_sources(owid_folder=OWID_FOLDER, sources_folder=SOURCES_FOLDER, iea_sources=None):
+    """
+    Loads all OWID charts and IEA workbooks into one long DataFrame with the columns of STORE_COLUMNS.
+    Regions get their code from ENTITY_CODES or from the OWID entity with the same name
+    ('World' -> 'OWID_WRL'); aggregates such as 'Rest of the world' have no code. A source that cannot be read is skipped.
+    """
+    frames = []
+    for csv_file in sorted(glob.glob(os.path.join(owid_folder, "*", "*.csv"))):
+        try:
+            frames.append(load_owid_chart(csv_file))
+        except (IOError, ValueError, KeyError, pd.errors.ParserError) as e:
+            logger.error(f"Cannot load OWID chart '{csv_file}': {e}")
+    codes_by_entity = {}
+    if frames:
+        owid = pd.concat(frames, ignore_index=True).dropna(subset=["code"])
+        codes_by_entity = dict(zip(owid["entity"], owid["code"]))
+    codes_by_entity.update(ENTITY_CODES)
+
+    for source_name in iea_sources or IEA_SOURCES:
+        try:
+            iea = load_iea_workbook(source_name, sources_folder)
+        except (IOError, ValueError, KeyError) as e:
+            logger.error(f"Cannot load IEA source '{source_name}': {e}")
+            continue
+        iea["code"] = iea["entity"].map(codes_by_entity)
+        frames.append(iea)
+
+    if not frames:
+        return pd.DataFrame(columns=STORE_COLUMNS)
+    long = pd.concat(frames, ignore_index=True).reindex(columns=STORE_COLUMNS)
+    long["code"] = long["code"].fillna(long["entity"].map(ENTITY_CODES))
+    return long
+
+
+def to_store_types(long):
+    """
+    Drops rows without year or value and duplicates, sets the column types
+    (categorical text, int16 year, float64 value) and sorts by SORT_COLUMNS.
+    """
+    long = long.dropna(subset=["year", "value"])
+    long = long.drop_duplicates(subset=KEY_COLUMNS, keep="first")
+    long = long.astype({"year": "int16", "value": "float64"})
+    for column in CATEGORICAL_COLUMNS:
+        # Categories are sorted by name, so sorting by a categorical column is alphabetical
+        long[column] = long[column].astype("category")
+    return long.sort_values(SORT_COLUMNS, na_position="last", kind="stable").reset_index(drop=True)
+
+
+# --- Build ---
+def build_store(store_file=STORE_FILE, owid_folder=OWID_FOLDER, sources_folder=SOURCES_FOLDER):
+    """
+    Loads all sources, converts them to the typed long table and writes it as one Parquet file
+    (dictionary encoded text columns, sorted by metric, code and year, row groups of ROW_GROUP_ROWS).
+    The file is written to a temporary file first and replaces the old store only when complete.
+    Returns the number of rows.
+    """
+    start_time = time.time()
+    long = to_store_types(load_all_sources(owid_folder, sources_folder))
+    table = pa.Table.from_pandas(long, preserve_index=False)
+    temp_file = store_file + ".tmp"
+    pq.write_table(table, temp_file, row_group_size=ROW_GROUP_ROWS, compression="zstd",
+                   use_dictionary=CATEGORICAL_COLUMNS, write_statistics=True)
+    os.replace(temp_file, store_file)
+    logger.info(f"Store '{store_file}' built in {time.time() - start_time:.2f} seconds: {len(long)} rows, "
+                f"{long['metric'].nunique()} metrics, {long['source'].nunique()} sources, "
+                f"{os.path.getsize(store_file) / 1024:.0f} KiB.")
+    return len(long)
+
+
+# --- Queries ---
+def load_timeseries(metrics=None, codes=None, year_from=None, year_to=None, store_file=STORE_FILE, **dimensions):
+    """
+    Reads the rows of some metrics (and countries / years / dimensions such as source='owid' or mode='Cars')
+    from the store. The filters are pushed down to Parquet, so only the row groups of the requested
+    metrics are read. Returns a long DataFrame.
+    """
+    filters = []
+    if metrics is not None:
+        filters.append(("metric", "in", list(metrics)))
+    if codes is not None:
+        filters.append(("code", "in", list(codes)))
+    if year_from is not None:
+        filters.append(("year", ">=", year_from))
+    if year_to is not None:
+        filters.append(("year", "<=", year_to))
+    for column, value in dimensions.items():
+        filters.append((column, "in", list(value) if isinstance(value, (list, tuple, set)) else [value]))
+    return pd.read_parquet(store_file, filters=filters or None)
+
+
+def load_wide(metrics, codes=None, year_from=None, year_to=None, store_file=STORE_FILE, **dimensions):
+    """
+    Cross-metric view: one row per (code, entity, year), one column per metric.
+    The dimensions must select one value per metric, country and year (e.g. source='owid', or for the IEA
+    sources mode='Cars', powertrain='BEV', category='Historical'); raises ValueError otherwise.
+    """
+    long = load_timeseries(metrics, codes, year_from, year_to, store_file, **dimensions)
+    long = long.astype({"metric": str, "code": object, "entity": str})
+    index = ["code", "entity", "year"]
+    duplicates = long[long.duplicated(subset=index + ["metric"], keep=False)]
+    if not duplicates.empty:
+        ambiguous = [column for column in ("source", "mode", "powertrain", "category")
+                     if column not in dimensions and duplicates[column].nunique(dropna=False) > 1]
+        raise ValueError(f"{len(duplicates)} rows share a metric, country and year; "
+                         f"select one value of: {', '.join(ambiguous) or 'the dimensions'}.")
+    return long.pivot(index=index, columns="metric", values="value").reset_index().rename_axis(columns=None)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Tidy long-format store of the OWID and IEA EV time series.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the Parquet store from the OWID CSVs and IEA workbooks.")
+    build_parser.add_argument("--store", default=STORE_FILE)
+    build_parser.add_argument("--sources", default=SOURCES_FOLDER)
+    query_parser = subparsers.add_parser("query", help="Print metrics of some countries as a wide table.")
+    query_parser.add_argument("metrics", nargs="+")
+    query_parser.add_argument("--codes", nargs="+")
+    query_parser.add_argument("--source")
+    query_parser.add_argument("--mode", help="IEA mode, e.g. Cars")
+    query_parser.add_argument("--powertrain", help="IEA powertrain, e.g. BEV")
+    query_parser.add_argument("--category", help="IEA category, e.g. Historical")
+    query_parser.add_argument("--store", default=STORE_FILE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            build_store(args.store, os.path.join(args.sources, "ourworldindat"), args.sources)
+        except (IOError, pa.ArrowException) as e:
+            logger.error(f"Error building store '{args.store}': {e}")
+            sys.exit(1)
+    else:
+        dimensions = {column: getattr(args, column) for column in ("source", "mode", "powertrain", "category")
+                      if getattr(args, column)}
+        try:
+            print(load_wide(args.metrics, args.codes, store_file=args.store, **dimensions).to_string(index=False))
+        except ValueError as e:
+            logger.error(f"Ambiguous query: {e}")
+            sys.exit(1)
@@ -0,0 +1,262 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+# --- Configuration ---
+CACHE_FOLDER = "excel_cache" # Parquet copies of the sheets and the cache index
+INDEX_FILENAME = "excel_cache_index.json"
+SOURCES_ROOT = os.path.join("..", "Sources") # Searched for *.xlsx by the 'warm' and 'benchmark' commands
+
+# Excel sources parsed on every refresh
+EXCEL_SOURCES = [
+    os.path.join(SOURCES_ROOT, "EV Sales", "EV Data Explorer 2025.xlsx"),
+    os.path.join(SOURCES_ROOT, "EV Sales", "Data EV Historical sales.xlsx"),
+    os.path.join(SOURCES_ROOT, "Compare EV vs ICE", "Electricity prices for household consumers.xlsx"),
+    os.path.join(SOURCES_ROOT, "Compare EV vs ICE", "Subsidies EV car by country.xlsx"),
+    os.path.join(SOURCES_ROOT, "Manufactures EV", "ElectricCarData_Clean_DATA.xlsx"),
+]
+
+
+def _file_sha256(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(text)).strip('_') or "sheet"
+
+
+# --- Index ---
+def load_index(cache_folder=CACHE_FOLDER):
+    """
+    Loads the cache index: one entry per workbook (absolute path) with its size, modification time,
+    SHA-256 and sheet names, and the Parquet file of every cached sheet / read option combination.
+    Returns an empty index if it does not exist or is unreadable.
+    """
+    try:
+        with open(os.path.join(cache_folder, INDEX_FILENAME), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if isinstance(index.get('files'), dict):
+            return index
+    except (IOError, ValueError):
+        pass
+    return {'version': 1, 'files': {}}
+
+
+def save_index(index, cache_folder=CACHE_FOLDER):
+    """
+    Writes the index atomically (temporary file + os.replace).
+    """
+    index_path = os.path.join(cache_folder, INDEX_FILENAME)
+    temp_path = index_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=4, ensure_ascii=False)
+    os.replace(temp_path, index_path)
+
+
+def _validate_entry(index, filepath, cache_folder):
+    """
+    Returns the index entry of a workbook, valid for its current content.
+    Unchanged size and modification time are trusted without reading the file; otherwise the file is hashed,
+    and if only the modification time changed (e.g. the file was copied) the cached sheets are kept.
+    A changed content drops all cached sheets of the workbook. Returns (entry, index changed).
+    """
+    stat = os.stat(filepath)
+    entry = index['files'].get(filepath)
+    if entry and entry['size_bytes'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return entry, False
+
+    sha256 = _file_sha256(filepath)
+    if entry and entry['sha256'] == sha256:
+        entry.update({'size_bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        return entry, True
+
+    for sheet in (entry or {}).get('sheets', {}).values():
+        try:
+            os.remove(os.path.join(cache_folder, sheet['parquet']))
+        except OSError:
+            pass
+    entry = {'size_bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256,
+             'sheet_names': None, 'sheets': {}}
+    index['files'][filepath] = entry
+    return entry, True
+
+
+# --- Conversion ---
+def _to_parquet_frame(df):
+    """
+    Prepares a sheet for Parquet: column names become strings (the original names are returned to be restored
+    on load, e.g. years as int), and object columns mixing numbers and text are stored as text,
+    which Parquet requires (empty cells stay empty). Returns (frame, original column names or None).
+    """
+    original_columns = None
+    if not all(isinstance(column, str) for column in df.columns):
+        original_columns = [column if isinstance(column, (int, float, str)) else str(column) for column in df.columns]
+        df = df.set_axis([str(column) for column in df.columns], axis=1)
+    for column in df.columns:
+        if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True) in ("mixed", "mixed-integer"):
+            df[column] = df[column].map(lambda value: value if pd.isna(value) else str(value))
+    return df, original_columns
+
+
+def _sheet_key(sheet_name, read_options):
+    return json.dumps([sheet_name, read_options], sort_keys=True, default=str)
+
+
+def _load_cached_sheet(entry, sheet_key, cache_folder):
+    """
+    Returns a cached sheet, or None if it is not cached.
+    """
+    cached = entry['sheets'].get(sheet_key)
+    if not cached or not os.path.exists(os.path.join(cache_folder, cached['parquet'])):
+        return None
+    df = pd.read_parquet(os.path.join(cache_folder, cached['parquet']))
+    if cached.get('columns') is not None:
+        df.columns = cached['columns']
+    return df
+
+
+def _cache_sheet(filepath, sheet_name, sheet_key, df, entry, cache_folder):
+    """
+    Stores a parsed sheet as Parquet and registers it in the workbook's entry.
+    """
+    parquet_name = (f"{_slug(os.path.splitext(os.path.basename(filepath))[0])}__{_slug(sheet_name)}__"
+                    f"{hashlib.blake2b((filepath + sheet_key).encode('utf-8'), digest_size=4).hexdigest()}.parquet")
+    parquet_frame, original_columns = _to_parquet_frame(df.copy())
+    temp_path = os.path.join(cache_folder, parquet_name + ".tmp")
+    parquet_frame.to_parquet(temp_path, index=False)
+    os.replace(temp_path, os.path.join(cache_folder, parquet_name))
+    entry['sheets'][sheet_key] = {'parquet': parquet_name, 'sheet': sheet_name, 'columns': original_columns}
+
+
+def read_excel_cached(filepath, sheet_name=0, cache_folder=CACHE_FOLDER, **read_options):
+    """
+    Drop-in replacement of pd.read_excel: the first load of a sheet parses the workbook with openpyxl and stores
+    the sheet as Parquet, later loads read the Parquet file as long as the workbook is unchanged
+    (same size and modification time, or same SHA-256). read_options (header, usecols, skiprows, ...)
+    are part of the cache key. sheet_name can be a name, a position, a list of them or None (all sheets);
+    like pd.read_excel, a list or None returns a dict of DataFrames.
+    Unlike pd.read_excel, columns mixing numbers and text (e.g. a second header row inside the data)
+    come back as text, also on the first load.
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    filepath = os.path.abspath(filepath)
+    index = load_index(cache_folder)
+    entry, changed = _validate_entry(index, filepath, cache_folder)
+
+    if sheet_name is None and entry['sheet_names'] is None:
+        with pd.ExcelFile(filepath, engine='openpyxl') as workbook:
+            entry['sheet_names'] = list(workbook.sheet_names)
+        changed = True
+    if sheet_name is None:
+        sheet_names = entry['sheet_names']
+    else:
+        sheet_names = sheet_name if isinstance(sheet_name, list) else [sheet_name]
+
+    sheets, missing = {}, []
+    for name in sheet_names:
+        sheets[name] = _load_cached_sheet(entry, _sheet_key(name, read_options), cache_folder)
+        if sheets[name] is None:
+            missing.append(name)
+    if missing:
+        # All missing sheets in one pass, so the workbook is parsed only once
+        parsed = pd.read_excel(filepath, sheet_name=missing, engine='openpyxl', **read_options)
+        for name in missing:
+            _cache_sheet(filepath, name, _sheet_key(name, read_options), parsed[name], entry, cache_folder)
+            # Served from the cache, so the first and later loads return the same types
+            sheets[name] = _load_cached_sheet(entry, _sheet_key(name, read_options), cache_folder)
+        changed = True
+
+    if changed:
+        save_index(index, cache_folder)
+    return sheets if sheet_name is None or isinstance(sheet_name, list) else sheets[sheet_name]
+
+
+def clear_cache(cache_folder=CACHE_FOLDER):
+    """
+    Removes all cached sheets and the index. Returns the number of removed files.
+    """
+    removed = 0
+    for filepath in glob.glob(os.path.join(cache_folder, "*.parquet")) + [os.path.join(cache_folder, INDEX_FILENAME)]:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+            removed += 1
+    return removed
+
+
+# --- Benchmark ---
+def benchmark_excel_cache(filepaths=None, repeats=3, cache_folder=CACHE_FOLDER):
+    """
+    Compares loading all sheets of each workbook with pd.read_excel (openpyxl) and with read_excel_cached:
+    the first cached load (conversion to Parquet included) and the best of 'repeats' later loads.
+    The cache of the measured workbooks is cleared first. Returns {workbook: {method: seconds}}.
+    """
+    results = {}
+    for filepath in filepaths or EXCEL_SOURCES:
+        if not os.path.exists(filepath):
+            print(f"Skipping '{filepath}': file not found.")
+            continue
+        index = load_index(cache_folder)
+        if os.path.abspath(filepath) in index['files']:
+            for sheet in index['files'].pop(os.path.abspath(filepath))['sheets'].values():
+                os.remove(os.path.join(cache_folder, sheet['parquet']))
+            save_index(index, cache_folder)
+
+        timings = {}
+        start_time = time.perf_counter()
+        expected = pd.read_excel(filepath, sheet_name=None, engine='openpyxl')
+        timings['openpyxl'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        read_excel_cached(filepath, sheet_name=None, cache_folder=cache_folder)
+        timings['cache_first_load'] = time.perf_counter() - start_time
+
+        warm_timings = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            cached = read_excel_cached(filepath, sheet_name=None, cache_folder=cache_folder)
+            warm_timings.append(time.perf_counter() - start_time)
+        timings['cache'] = min(warm_timings)
+
+        same_shape = all(cached[name].shape == sheet.shape for name, sheet in expected.items())
+        results[filepath] = timings
+        print(f"{os.path.basename(filepath)}: openpyxl {timings['openpyxl']:.3f} s, "
+              f"first cached load {timings['cache_first_load']:.3f} s, cached {timings['cache']:.4f} s "
+              f"({timings['openpyxl'] / timings['cache']:.0f}x faster), same shape: {same_shape}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parquet cache of the Excel sources.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Convert all sheets of the workbooks (default: EXCEL_SOURCES).")
+    warm_parser.add_argument("files", nargs="*")
+    warm_parser.add_argument("--all", action="store_true", help=f"all *.xlsx files under {SOURCES_ROOT}")
+    benchmark_parser = subparsers.add_parser("benchmark", help="Compare openpyxl and cached load times.")
+    benchmark_parser.add_argument("files", nargs="*")
+    benchmark_parser.add_argument("--repeats", type=int, default=3)
+    subparsers.add_parser("clear", help="Remove the cache.")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        files = args.files or (glob.glob(os.path.join(SOURCES_ROOT, "**", "*.xlsx"), recursive=True)
+                               if args.all else EXCEL_SOURCES)
+        for filepath in files:
+            try:
+                sheets = read_excel_cached(filepath, sheet_name=None)
+                print(f"{filepath}: {len(sheets)} sheets cached.")
+            except (IOError, ValueError) as e:
+                print(f"Error caching '{filepath}': {e}")
+    elif args.command == "benchmark":
+        benchmark_excel_cache(args.files or None, args.repeats)
+    else:
+        print(f"Removed {clear_cache()} cached files.")
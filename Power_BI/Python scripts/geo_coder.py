@@ -7,9 +7,11 @@ import sys
 import reverse_geocoder as rg
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
-import glob
-import re
+import logging
 import pycountry
+import dataset_manifest
+from pipeline_metrics import METRICS, run_with_metrics, collect_result
+from pipeline_logging import DEFAULT_LOG_LEVEL, setup_logging, shutdown_logging, worker_init
 
 # --- CONSTANTS (PATHS ARE NOW RELATIVE TO SCRIPT LOCATION!) ---
 
@@ -24,9 +26,12 @@ FAILED_GEOCODING_LOG = os.path.join(LOGS_FOLDER, "failed_geocoding_log.json")
 # Recommended number of parallel processes.
 MAX_WORKERS = os.cpu_count() or 4
 
+# Log level of the console and the JSON lines log file; "DEBUG" also shows delimiter detection per file
+LOG_LEVEL = DEFAULT_LOG_LEVEL
+
 # --- Global CSV column configuration ---
 ALL_FIELDNAMES = [
-    'id', 'lat', 'lon', 'amenity',
+    'id', 'type', 'lat', 'lon', 'amenity',
     'city', 'state', 'country', # Column content mapping changed as per user request
     'scraped_country_code', 'scraped_country_name', # Keep original scraped info
     'authentication:nfc', 'capacity', 'capacity:car', 'motorcar', 'operator',
@@ -38,17 +43,8 @@ ALL_FIELDNAMES = [
 
 GEOCODED_COLUMNS = ['city', 'state', 'country']
 
-# --- CLASS FOR LOGGING ALL TERMINAL OUTPUT ---
-class Tee:
-    def __init__(self, *files):
-        self.files = files
-    def write(self, obj):
-        for f in self.files:
-            f.write(obj)
-            f.flush()
-    def flush(self, *args, **kwargs):
-        for f in self.files:
-            f.flush()
+# --- LOGGING (all processes log through the queue set up by pipeline_logging) ---
+logger = logging.getLogger("geo_coder")
 
 # --- Custom mapping for specific country name preferences/simplifications/parent-territory mappings ---
 COUNTRY_NAME_OVERRIDES = {
@@ -87,31 +83,23 @@ def get_full_country_name(country_code):
     except KeyError:
         return 'N/A'
     except Exception as e:
-        print(f"Warning: Error getting country name for code '{country_code}': {e}")
+        logger.warning(f"Warning: Error getting country name for code '{country_code}': {e}")
         return 'N/A'
 
 
 # --- FUNCTION FOR GEOCODING DATA ---
-def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldnames, geocoded_columns):
-    filename_base = os.path.basename(raw_csv_filepath)
-    
-    # Remove prefix 'ev_chargers_osm_raw_' and '.csv' suffix to get the core name
-    core_name_with_suffix = filename_base.replace('ev_chargers_osm_raw_', '').replace('.csv', '')
-
-    # Enhanced parsing for display purposes (for log and console output)
-    display_name = core_name_with_suffix.upper() 
-
-    # Use regex to detect and parse "[Part X]"
-    match = re.search(r'^(.*?)\s*\[Part\s*(\d+)\]$', core_name_with_suffix, re.IGNORECASE)
-    if match:
-        base_country_name = match.group(1).strip() 
-        part_number = match.group(2) 
-        display_name = f"{base_country_name.upper()} [Part {part_number}]"
-    else:
-        # If no '[Part X]' pattern, just uppercase the core name
-        display_name = core_name_with_suffix.upper()
+def geocode_single_raw_file(partition, final_output_folder, all_fieldnames, geocoded_columns):
+    """
+    Geocodes one raw OSM file. partition is its entry from the dataset manifest
+    (see dataset_manifest.resolve_partitions).
+    """
+    raw_csv_filepath = partition['path']
+    filename_base = partition['file']
+
+    # Readable name for log and console output, e.g. "GERMANY [Part 2]"
+    display_name = dataset_manifest.display_name(partition)
 
-    print(f"\n[GEOCODING] Starting geocoding for file: {filename_base} (Display Name: {display_name})...")
+    logger.info(f"\n[GEOCODING] Starting geocoding for file: {filename_base} (Display Name: {display_name})...")
     
     failed_geocodings = []
     
@@ -122,9 +110,11 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
 
     # Check if the final output file already exists
     if os.path.exists(final_output_filepath) and os.path.getsize(final_output_filepath) > 0:
-        print(f"  [GEOCODING] Final output file for {filename_base} already exists: '{final_output_filepath}'. Skipping geocoding.")
+        logger.info(f"  [GEOCODING] Final output file for {filename_base} already exists: '{final_output_filepath}'. Skipping geocoding.")
+        METRICS.inc('geocoding_files_cached_total')
         return []
 
+    file_start_time = time.time()
     try:
         raw_df = None
         delimiter_used = None
@@ -132,31 +122,32 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
 
         for delim in possible_delimiters:
             try:
-                temp_df = pd.read_csv(raw_csv_filepath, encoding='utf-8', on_bad_lines='skip', dtype=str, sep=delim)
+                with METRICS.timer('raw_file_read_seconds'):
+                    temp_df = pd.read_csv(raw_csv_filepath, encoding='utf-8', on_bad_lines='skip', dtype=str, sep=delim)
                 
                 if 'id' in temp_df.columns and 'lat' in temp_df.columns and 'lon' in temp_df.columns:
                     raw_df = temp_df
                     delimiter_used = delim
-                    print(f"  [GEOCODING] Detected delimiter '{delim}' for '{filename_base}'.")
+                    logger.debug(f"  [GEOCODING] Detected delimiter '{delim}' for '{filename_base}'.")
                     break 
                 else:
-                    print(f"  [GEOCODING] Attempted delimiter '{delim}' for '{filename_base}', but critical columns not found. Trying next.")
+                    logger.debug(f"  [GEOCODING] Attempted delimiter '{delim}' for '{filename_base}', but critical columns not found. Trying next.")
                     continue 
 
             except pd.errors.ParserError as e:
-                print(f"  [GEOCODING] ParserError with delimiter '{delim}' for '{filename_base}': {e}. Trying next.")
+                logger.debug(f"  [GEOCODING] ParserError with delimiter '{delim}' for '{filename_base}': {e}. Trying next.")
                 continue
             except Exception as e:
-                print(f"  [GEOCODING] General error with delimiter '{delim}' for '{filename_base}': {e}. Trying next.")
+                logger.debug(f"  [GEOCODING] General error with delimiter '{delim}' for '{filename_base}': {e}. Trying next.")
                 continue
 
         if raw_df is None:
             raise ValueError(f"Could not read '{filename_base}' with any of the attempted delimiters: {possible_delimiters}. Critical columns (id, lat, lon) missing or file malformed.")
 
-        print(f"  [GEOCODING] Loaded {len(raw_df)} raw records from '{filename_base}'.")
+        logger.info(f"  [GEOCODING] Loaded {len(raw_df)} raw records from '{filename_base}'.")
 
         if raw_df.empty:
-            print(f"  [GEOCODING] No data to geocode for '{filename_base}'. Raw file was empty.")
+            logger.info(f"  [GEOCODING] No data to geocode for '{filename_base}'. Raw file was empty.")
             empty_df = pd.DataFrame(columns=all_fieldnames)
             os.makedirs(final_output_folder, exist_ok=True)
             empty_df.to_csv(final_output_filepath, index=False, encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, sep=';') 
@@ -170,6 +161,7 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
         valid_coords_df = raw_df.dropna(subset=['lat_float', 'lon_float']).copy()
         invalid_coords_df = raw_df[raw_df['lat_float'].isna() | raw_df['lon_float'].isna()]
 
+        METRICS.inc('geocoding_invalid_coordinates_total', len(invalid_coords_df))
         for _, row in invalid_coords_df.iterrows():
             failed_geocodings.append({
                 'id': row.get('id', 'N/A'),
@@ -177,12 +169,13 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
                 'lon': row.get('lon', 'N/A'),
                 'raw_tags': row.get('tags', 'N/A'),
                 'source_file': filename_base,
+                'partition_id': partition['partition_id'],
                 'error': 'Invalid_Coordinates',
                 'timestamp': datetime.now().isoformat()
             })
         
         if valid_coords_df.empty:
-            print(f"  [GEOCODING] No valid coordinates to geocode for '{filename_base}'. All records have invalid coordinates.")
+            logger.warning(f"  [GEOCODING] No valid coordinates to geocode for '{filename_base}'. All records have invalid coordinates.")
             output_df = raw_df.copy()
             for col in geocoded_columns:
                 output_df[col] = 'N/A'
@@ -197,8 +190,10 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
         # --- MAIN GEOCODING LOGIC using reverse_geocoder ---
         coordinates = list(zip(valid_coords_df['lat_float'], valid_coords_df['lon_float']))
         
-        print(f"  [GEOCODING] Performing reverse geocoding for {len(coordinates)} valid records from '{filename_base}'...")
-        geocoding_results = rg.search(coordinates)
+        logger.info(f"  [GEOCODING] Performing reverse geocoding for {len(coordinates)} valid records from '{filename_base}'...")
+        METRICS.inc('geocoding_calls_total', len(coordinates))
+        with METRICS.timer('reverse_geocoder_seconds'):
+            geocoding_results = rg.search(coordinates)
 
         state_col_data = []    # Will store full country name (e.g., USA, Czech Republic)
         country_col_data = []  # Will store admin1 (e.g., California, South Moravian Region)
@@ -226,12 +221,14 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
         # Log failures if the primary country name (which goes into 'state' column) is not found
         for idx, row in valid_coords_df.iterrows():
             if pd.isna(row['state']) or row['state'] == '' or row['state'] == 'N/A':
+                METRICS.inc('geocoding_failures_total')
                 failed_geocodings.append({
                     'id': row.get('id', 'N/A'),
                     'lat': row.get('lat', 'N/A'),
                     'lon': row.get('lon', 'N/A'),
                     'raw_tags': row.get('tags', 'N/A'),
                     'source_file': filename_base,
+                    'partition_id': partition['partition_id'],
                     'error': 'Country_NotFound_By_Geocoder', 
                     'timestamp': datetime.now().isoformat()
                 })
@@ -260,13 +257,16 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
         # Write to CSV with exactly defined columns, using semicolon as separator
         final_df.to_csv(temp_final_output_filepath, index=False, encoding='utf-8', quoting=csv.QUOTE_NONNUMERIC, columns=all_fieldnames, sep=';')
         os.replace(temp_final_output_filepath, final_output_filepath) 
+        METRICS.inc('geocoded_records_total', len(final_df))
+        METRICS.observe('file_geocoding_seconds', time.time() - file_start_time)
 
-        print(f"  [GEOCODING] Successfully geocoded and saved {len(final_df)} records from '{filename_base}' to '{final_output_filepath}'.")
+        logger.info(f"  [GEOCODING] Successfully geocoded and saved {len(final_df)} records from '{filename_base}' to '{final_output_filepath}'.")
 
     except Exception as e:
-        print(f"  [GEOCODING] Error processing file '{filename_base}': {e}")
+        logger.error(f"  [GEOCODING] Error processing file '{filename_base}': {e}")
         failed_geocodings.append({
             'source_file': filename_base,
+            'partition_id': partition['partition_id'],
             'error': str(e),
             'timestamp': datetime.now().isoformat()
         })
@@ -277,74 +277,76 @@ def geocode_single_raw_file(raw_csv_filepath, final_output_folder, all_fieldname
 if __name__ == "__main__":
     total_script_start_time = time.time()
 
-    # --- Setup logging to a file ---
-    os.makedirs(LOGS_FOLDER, exist_ok=True)
-    log_filename = datetime.now().strftime("geocoding_process_log_%Y-%m-%d_%H-%M-%S.txt")
-    log_filepath = os.path.join(LOGS_FOLDER, log_filename)
-    
-    f_log = open(log_filepath, 'w', encoding='utf-8', buffering=1)
-    original_stdout = sys.stdout
-    original_stderr = sys.stderr
-    sys.stdout = Tee(original_stdout, f_log)
-    sys.stderr = Tee(original_stderr, f_log)
-
-    print(f"\n--- Starting Phase 2: Geocoding Data (Offline) ---")
-    print(f"Loading raw data from: {TEMP_OSM_DATA_FOLDER}")
-    print(f"Saving final geocoded data to: {FINAL_OUTPUT_FOLDER}")
-    print(f"Log file: {log_filepath}")
-
-    # --- Get list of RAW files to geocode ---
-    raw_files_to_process = glob.glob(os.path.join(TEMP_OSM_DATA_FOLDER, 'ev_chargers_osm_raw_*.csv'))
-    
-    raw_files_to_process.sort() 
+    # --- Setup logging to console and a JSON lines file, shared by all worker processes ---
+    log_queue, log_listener, log_filepath = setup_logging(LOGS_FOLDER, "geocoding_process_log", LOG_LEVEL)
+
+    logger.info(f"\n--- Starting Phase 2: Geocoding Data (Offline) ---")
+    logger.info(f"Loading raw data from: {TEMP_OSM_DATA_FOLDER}")
+    logger.info(f"Saving final geocoded data to: {FINAL_OUTPUT_FOLDER}")
+    logger.info(f"Log file: {log_filepath}")
+
+    # --- Get list of RAW files to geocode (registered in the dataset manifest, new files are added) ---
+    raw_files_to_process = dataset_manifest.resolve_partitions(TEMP_OSM_DATA_FOLDER, 'ev_chargers_osm_raw_*.csv',
+                                                               dataset="ev_chargers_osm_raw")
 
     if not raw_files_to_process:
-        print("No raw data files found to geocode. Please check TEMP_OSM_DATA_FOLDER and filename patterns ('ev_chargers_osm_raw_*.csv').")
+        logger.warning("No raw data files found to geocode. Please check TEMP_OSM_DATA_FOLDER and filename patterns ('ev_chargers_osm_raw_*.csv').")
+        shutdown_logging(log_listener)
         sys.exit(0)
 
-    print(f"\nFound {len(raw_files_to_process)} files to geocode. Starting processes...")
+    logger.info(f"\nFound {len(raw_files_to_process)} files to geocode. Starting processes...")
 
     # --- PHASE 2: Geocoding Data ---
     phase2_start_time = time.time()
     
     global_geocoding_failures = []
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=worker_init,
+                             initargs=(log_queue, LOG_LEVEL)) as executor:
         futures_phase2 = []
-        for raw_filepath in raw_files_to_process:
-            futures_phase2.append(executor.submit(geocode_single_raw_file,
-                                                  raw_filepath,
+        for partition in raw_files_to_process:
+            futures_phase2.append(executor.submit(run_with_metrics, geocode_single_raw_file,
+                                                  partition,
                                                   FINAL_OUTPUT_FOLDER,
                                                   ALL_FIELDNAMES,
                                                   GEOCODED_COLUMNS))
 
         for future in as_completed(futures_phase2):
             try:
-                file_failed_geocodings = future.result()
+                file_failed_geocodings = collect_result(future)
                 global_geocoding_failures.extend(file_failed_geocodings)
             except Exception as exc:
-                print(f'Geocoding process for a file generated an exception: {exc}')
+                logger.error(f'Geocoding process for a file generated an exception: {exc}')
 
     phase2_end_time = time.time()
-    print(f"\n--- PHASE 2 COMPLETED in {phase2_end_time - phase2_start_time:.2f} seconds. ---")
+    METRICS.observe('phase_geocoding_seconds', phase2_end_time - phase2_start_time)
+    logger.info(f"\n--- PHASE 2 COMPLETED in {phase2_end_time - phase2_start_time:.2f} seconds. ---")
 
     # --- Conclusion ---
     total_script_end_time = time.time()
-    print(f"\n--- Entire script completed in {total_script_end_time - total_script_start_time:.2f} seconds. ---")
+    logger.info(f"\n--- Entire script completed in {total_script_end_time - total_script_start_time:.2f} seconds. ---")
     
     # Save global geocoding failures
     if global_geocoding_failures:
         try:
             with open(FAILED_GEOCODING_LOG, 'w', encoding='utf-8') as f:
                 json.dump(global_geocoding_failures, f, indent=4)
-            print(f"Some geocoding queries failed. Details are in '{FAILED_GEOCODING_LOG}'.")
+            logger.warning(f"Some geocoding queries failed. Details are in '{FAILED_GEOCODING_LOG}'.")
         except IOError as e:
-            print(f"Error saving geocoding failures to {FAILED_GEOCODING_LOG}: {e}")
+            logger.error(f"Error saving geocoding failures to {FAILED_GEOCODING_LOG}: {e}")
     else:
-        print("All geocoding queries were successful (or were skipped because data already existed).")
+        logger.info("All geocoding queries were successful (or were skipped because data already existed).")
+
+    # Metrics summary and export (JSON and Prometheus text format)
+    logger.info("\n--- Metrics summary ---")
+    for line in METRICS.summary_lines():
+        logger.info(line)
+    try:
+        metrics_files = METRICS.export(LOGS_FOLDER, datetime.now().strftime("geocoding_metrics_%Y-%m-%d_%H-%M-%S"))
+        logger.info(f"Metrics saved to '{metrics_files[0]}' and '{metrics_files[1]}'.")
+    except IOError as e:
+        logger.error(f"Error saving metrics to {LOGS_FOLDER}: {e}")
 
-    # Restore original stdout and stderr
-    sys.stdout = original_stdout
-    sys.stderr = original_stderr
-    f_log.close() 
+    # Write out the remaining queued records and close the log file
+    shutdown_logging(log_listener)
     print(f"\nProgress has been logged to file: {log_filepath}")
\ No newline at end of file
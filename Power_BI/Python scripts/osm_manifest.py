@@ -0,0 +1,250 @@
+import csv
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+
+# --- Configuration ---
+MANIFEST_FILENAME = "osm_download_manifest.sqlite" # Stored next to the raw part files
+
+# Part status values
+PART_COMPLETE = "complete" # All squares downloaded, file written and checksummed
+PART_PARTIAL = "partial"   # File written, but some squares failed and will be re-queried on the next run
+PART_ADOPTED = "adopted"   # File from a run before the manifest: used as is, but its squares have no timestamps
+                           # for incremental refreshes, so they are downloaded again on the next full run
+
+# Square (tile) status values
+TILE_OK = "ok"
+TILE_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parts (
+    part_file    TEXT PRIMARY KEY,
+    country_code TEXT,
+    country_name TEXT,
+    num_tiles    INTEGER,
+    status       TEXT NOT NULL,
+    row_count    INTEGER NOT NULL DEFAULT 0,
+    size_bytes   INTEGER NOT NULL DEFAULT 0,
+    sha256       TEXT,
+    updated_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS tiles (
+    part_file    TEXT NOT NULL,
+    tile_index   INTEGER NOT NULL,
+    bbox         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    row_count    INTEGER NOT NULL DEFAULT 0,
+    rows_json    TEXT,
+    updated_at   TEXT,
+    last_success TEXT,
+    element_keys TEXT,
+    PRIMARY KEY (part_file, tile_index)
+);
+"""
+
+# Columns added after the first version of the manifest, added to older manifests on connect
+_TILE_COLUMN_MIGRATIONS = {
+    'last_success': "ALTER TABLE tiles ADD COLUMN last_success TEXT", # Overpass 'timestamp_osm_base' of the last successful query
+    'element_keys': "ALTER TABLE tiles ADD COLUMN element_keys TEXT", # JSON list of 'type/id' keys found in the square
+}
+
+# --- Connection ---
+def connect(folder):
+    """
+    Opens (and creates if needed) the download manifest in the given folder.
+    SQLite handles locking, so several worker processes can update it at the same time.
+    """
+    os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(folder, MANIFEST_FILENAME), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(tiles)")}
+    for column, statement in _TILE_COLUMN_MIGRATIONS.items():
+        if column not in existing_columns:
+            conn.execute(statement)
+    conn.commit()
+    return conn
+
+def element_key(element_or_row):
+    """
+    Returns the 'type/id' key of an OSM element or a raw CSV row.
+    Rows written before the 'type' column existed are treated as nodes.
+    """
+    return f"{element_or_row.get('type') or 'node'}/{element_or_row['id']}"
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+# --- File helpers ---
+def file_sha256(filepath):
+    """
+    Computes the SHA-256 checksum of a file in 1 MB blocks.
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def write_csv_atomic(filepath, fieldnames, rows):
+    """
+    Writes rows to a temporary file and atomically moves it over the target with os.replace,
+    so readers never see a truncated file. Returns (row_count, size_bytes, sha256).
+    """
+    temp_filepath = filepath + ".tmp"
+    row_count = 0
+    with open(temp_filepath, 'w', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: row.get(key, 'N/A') for key in fieldnames})
+            row_count += 1
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    sha256 = file_sha256(temp_filepath)
+    size_bytes = os.path.getsize(temp_filepath)
+    os.replace(temp_filepath, filepath)
+    return row_count, size_bytes, sha256
+
+def count_csv_rows(filepath):
+    """
+    Counts data rows of a CSV file (used only when adopting files from runs before the manifest existed).
+    """
+    with open(filepath, 'r', newline='', encoding='utf-8') as infile:
+        return sum(1 for _ in csv.DictReader(infile))
+
+# --- Parts ---
+def get_part(conn, part_file):
+    """
+    Returns the manifest record of a part as a dictionary, or None.
+    """
+    cursor = conn.execute(
+        "SELECT part_file, country_code, country_name, num_tiles, status, row_count, size_bytes, sha256, updated_at "
+        "FROM parts WHERE part_file = ?", (part_file,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    keys = ['part_file', 'country_code', 'country_name', 'num_tiles', 'status', 'row_count', 'size_bytes', 'sha256', 'updated_at']
+    return dict(zip(keys, row))
+
+def check_part(conn, part_file, filepath, verify_checksum=False):
+    """
+    Checks a part file against the manifest.
+    Returns one of: 'complete', 'partial', 'missing' (not downloaded yet),
+    'unregistered' (file exists but manifest has no record) or 'corrupt'.
+    Without verify_checksum the check is O(1): only the file size is compared.
+    """
+    part = get_part(conn, part_file)
+    file_exists = os.path.exists(filepath)
+    if part is None:
+        return 'unregistered' if file_exists else 'missing'
+    if not file_exists:
+        return 'missing' if part['status'] in (PART_PARTIAL, PART_ADOPTED) else 'corrupt'
+    if os.path.getsize(filepath) != part['size_bytes']:
+        return 'corrupt'
+    if verify_checksum and file_sha256(filepath) != part['sha256']:
+        return 'corrupt'
+    return part['status']
+
+def record_part(conn, part_file, country_code, country_name, num_tiles, status, row_count, size_bytes, sha256):
+    """
+    Records a written part file. Tile rows of complete parts are dropped from the manifest,
+    since the part file now holds them.
+    """
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO parts (part_file, country_code, country_name, num_tiles, status, row_count, size_bytes, sha256, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (part_file, country_code, country_name, num_tiles, status, row_count, size_bytes, sha256, _now()))
+        if status == PART_COMPLETE:
+            conn.execute("UPDATE tiles SET rows_json = NULL WHERE part_file = ?", (part_file,))
+
+def adopt_part_file(conn, part_file, filepath, country_code, country_name, num_tiles):
+    """
+    Registers a part file written before the manifest existed as adopted: the file stays in use,
+    but its squares are scheduled for download, so the next full run records their Overpass timestamps
+    and the part can be refreshed incrementally afterwards. Returns its row count.
+    """
+    row_count = count_csv_rows(filepath)
+    record_part(conn, part_file, country_code, country_name, num_tiles, PART_ADOPTED,
+                row_count, os.path.getsize(filepath), file_sha256(filepath))
+    return row_count
+
+def refresh_part_file(conn, part_file, filepath, row_count):
+    """
+    Updates size, checksum and row count of a part file that was rewritten
+    by a later stage (e.g. global deduplication), so it is not reported as corrupt.
+    """
+    if get_part(conn, part_file) is None:
+        return
+    with conn:
+        conn.execute(
+            "UPDATE parts SET row_count = ?, size_bytes = ?, sha256 = ?, updated_at = ? WHERE part_file = ?",
+            (row_count, os.path.getsize(filepath), file_sha256(filepath), _now(), part_file))
+
+def reset_part(conn, part_file):
+    """
+    Forgets everything about a part, so all its squares are downloaded again.
+    """
+    with conn:
+        conn.execute("DELETE FROM parts WHERE part_file = ?", (part_file,))
+        conn.execute("DELETE FROM tiles WHERE part_file = ?", (part_file,))
+
+# --- Tiles ---
+def get_tile_statuses(conn, part_file):
+    """
+    Returns {tile_index: status} for all recorded squares of a part.
+    """
+    cursor = conn.execute("SELECT tile_index, status FROM tiles WHERE part_file = ?", (part_file,))
+    return dict(cursor.fetchall())
+
+def record_tile(conn, part_file, tile_index, bbox, status, rows, timestamp=None):
+    """
+    Stores the result of one square. Rows are kept in the manifest until the part file is written,
+    so a crash in the middle of a part loses at most the square being downloaded.
+    The Overpass timestamp and element keys are kept permanently for incremental refreshes.
+    """
+    element_keys = [element_key(row) for row in rows]
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO tiles (part_file, tile_index, bbox, status, row_count, rows_json, updated_at, last_success, element_keys) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (part_file, tile_index, json.dumps(list(bbox)), status, len(rows), json.dumps(rows), _now(),
+             timestamp, json.dumps(element_keys)))
+
+def get_part_tiles(conn, part_file):
+    """
+    Returns all recorded squares of a part as a list of dictionaries, in square order.
+    """
+    cursor = conn.execute(
+        "SELECT tile_index, bbox, status, last_success, element_keys FROM tiles WHERE part_file = ? ORDER BY tile_index",
+        (part_file,))
+    return [{
+        'tile_index': tile_index,
+        'bbox': tuple(json.loads(bbox)),
+        'status': status,
+        'last_success': last_success,
+        'element_keys': json.loads(element_keys) if element_keys else [],
+    } for tile_index, bbox, status, last_success, element_keys in cursor]
+
+def update_tile_refresh(conn, part_file, tile_index, timestamp, element_keys):
+    """
+    Stores the new timestamp and element keys of a square after an incremental refresh.
+    """
+    with conn:
+        conn.execute(
+            "UPDATE tiles SET last_success = ?, element_keys = ?, row_count = ?, updated_at = ? "
+            "WHERE part_file = ? AND tile_index = ?",
+            (timestamp, json.dumps(sorted(element_keys)), len(element_keys), _now(), part_file, tile_index))
+
+def load_part_rows(conn, part_file):
+    """
+    Yields the stored rows of all successful squares of a part, in square order.
+    """
+    cursor = conn.execute(
+        "SELECT rows_json FROM tiles WHERE part_file = ? AND status = ? AND rows_json IS NOT NULL ORDER BY tile_index",
+        (part_file, TILE_OK))
+    for (rows_json,) in cursor:
+        yield from json.loads(rows_json)
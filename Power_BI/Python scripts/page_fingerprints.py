@@ -0,0 +1,186 @@
+import csv
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+
+# --- Configuration ---
+FINGERPRINT_FILE = "page_fingerprints.sqlite" # Shared by the spec crawlers, next to their output
+
+# Change status of a page
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+REMOVED = "removed" # Known page that is no longer linked from its listing page
+
+# Elements inside spec tables whose content changes on every load (ads, tracking) and must not affect the hash
+VOLATILE_TAGS = ["script", "ins", "iframe", "noscript", "style"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    url           TEXT PRIMARY KEY,
+    source        TEXT,
+    sha256        TEXT NOT NULL,
+    etag          TEXT,
+    last_modified TEXT,
+    first_seen    TEXT NOT NULL,
+    last_changed  TEXT NOT NULL,
+    last_checked  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_source ON fingerprints(source);
+"""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def fingerprint_elements(elements):
+    """
+    Returns the SHA-256 of the HTML of the relevant elements (e.g. the spec tables of a page),
+    with ads and scripts removed, so only a change of the data itself changes the fingerprint.
+    The elements are modified in place (volatile children are removed).
+    """
+    sha = hashlib.sha256()
+    for element in elements:
+        for volatile in element.find_all(VOLATILE_TAGS):
+            volatile.decompose()
+        sha.update(str(element).encode('utf-8'))
+    return sha.hexdigest()
+
+
+class FingerprintStore:
+    """
+    Persistent fingerprints of crawled leaf pages (one row per URL), used by refresh crawls to parse
+    and emit only pages that are new or whose spec table changed since the previous crawl.
+    Also keeps the ETag / Last-Modified headers of every page for conditional requests.
+    Full crawls use it with refresh=False: every page is downloaded and emitted, but its fingerprint
+    is recorded, so the first refresh after a full crawl reports only real changes.
+    Safe to use from several threads.
+    """
+    def __init__(self, path=FINGERPRINT_FILE, refresh=True):
+        self.refresh = refresh
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self.counts = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+
+    def conditional_headers(self, url):
+        """
+        Returns If-None-Match / If-Modified-Since headers for a known URL (empty for a new one,
+        and always empty in a full crawl, which needs every page).
+        A server that supports them answers 304 Not Modified without sending the page.
+        """
+        if not self.refresh:
+            return {}
+        with self.lock:
+            row = self.conn.execute("SELECT etag, last_modified FROM fingerprints WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def check(self, url, sha256, source=None, etag=None, last_modified=None):
+        """
+        Compares the fingerprint of a page with the stored one, stores the new one and returns
+        NEW, CHANGED or UNCHANGED.
+        """
+        now = _now()
+        with self.lock:
+            row = self.conn.execute("SELECT sha256, first_seen, last_changed FROM fingerprints WHERE url = ?",
+                                    (url,)).fetchone()
+            if row is None:
+                status = NEW
+            else:
+                status = UNCHANGED if row[0] == sha256 else CHANGED
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, source, sha256, etag, last_modified, row[1] if row else now,
+                 row[2] if status == UNCHANGED else now, now))
+            self.conn.commit()
+            self.counts[status] += 1
+        return status
+
+    def mark_not_modified(self, url):
+        """
+        Records a 304 Not Modified answer: the page is unchanged, only the check time is updated.
+        """
+        with self.lock:
+            self.conn.execute("UPDATE fingerprints SET last_checked = ? WHERE url = ?", (_now(), url))
+            self.conn.commit()
+            self.counts[UNCHANGED] += 1
+        return UNCHANGED
+
+    def known_urls(self, source=None):
+        """
+        Returns the set of URLs with a stored fingerprint (of one source).
+        """
+        with self.lock:
+            if source is None:
+                rows = self.conn.execute("SELECT url FROM fingerprints")
+            else:
+                rows = self.conn.execute("SELECT url FROM fingerprints WHERE source = ?", (source,))
+            return {row[0] for row in rows}
+
+    def forget(self, urls):
+        """
+        Removes the fingerprints of pages that no longer exist.
+        """
+        with self.lock:
+            self.conn.executemany("DELETE FROM fingerprints WHERE url = ?", [(url,) for url in urls])
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def delta_filename(output_file):
+    """
+    'arenaev_full_scrape.csv' -> 'arenaev_full_scrape_delta_2025-07-15_10-30-00.csv'
+    """
+    base, extension = os.path.splitext(output_file)
+    return f"{base}_delta_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{extension}"
+
+
+def merge_delta(full_file, delta_rows, key_columns, delimiter=',', encoding='utf-8'):
+    """
+    Applies delta rows (dicts with a 'change' column: new / changed / removed) to the full dataset:
+    changed rows replace the rows with the same key, new rows are appended, removed rows are dropped.
+    If the full file has several rows with one key, all of them are replaced by the single delta row.
+    Columns of the full file and of the delta are united. The file is rewritten atomically.
+    Returns the number of rows of the updated full file.
+    """
+    changes = {tuple(row.get(column, '') for column in key_columns): row for row in delta_rows}
+    rows, fieldnames = [], []
+    applied = set() # Keys whose delta row is already in rows; further rows with the key are dropped
+    if os.path.exists(full_file):
+        with open(full_file, 'r', newline='', encoding=encoding) as infile:
+            reader = csv.DictReader(infile, delimiter=delimiter)
+            fieldnames = list(reader.fieldnames or [])
+            for row in reader:
+                key = tuple(row.get(column, '') for column in key_columns)
+                change = changes.get(key)
+                if change is None:
+                    rows.append(row)
+                elif key not in applied:
+                    applied.add(key)
+                    if change['change'] != REMOVED:
+                        rows.append(change)
+    for key, change in changes.items():
+        if key not in applied and change['change'] != REMOVED:
+            rows.append(change)
+
+    for row in delta_rows:
+        fieldnames.extend(column for column in row if column not in fieldnames and column != 'change')
+    temp_file = full_file + ".tmp"
+    with open(temp_file, 'w', newline='', encoding=encoding) as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames, delimiter=delimiter, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temp_file, full_file)
+    return len(rows)
@@ -0,0 +1,125 @@
+import datetime
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import sys
+import time
+
+# --- Configuration ---
+# Log level of all pipeline scripts, can be overridden with the LOG_LEVEL environment variable.
+# Per-element and per-square messages are logged as DEBUG, so production runs stay quiet with INFO.
+DEFAULT_LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# Size of the write buffer of the log file (in bytes)
+FILE_BUFFER_SIZE = 1024 * 1024
+
+# The log file is flushed at most once per this interval (in seconds), and immediately for warnings and errors
+FLUSH_INTERVAL_SECONDS = 5.0
+
+# Attributes every LogRecord has; anything else was passed with 'extra' and goes into the JSON line
+_STANDARD_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats every record as one JSON object per line, for machine parsing of the log file.
+    Fields passed with 'extra' (e.g. extra={'country': 'CZ'}) are added as separate keys.
+    """
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+            'message': record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    File handler with a large write buffer. Unlike logging.FileHandler it does not flush after every record,
+    only every FLUSH_INTERVAL_SECONDS, on warnings and errors, and when it is closed.
+    """
+    def __init__(self, filename, buffer_size=FILE_BUFFER_SIZE, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 flush_level=logging.WARNING):
+        self.buffer_size = buffer_size # Needed by _open, which FileHandler.__init__ calls
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._last_flush = time.monotonic()
+        super().__init__(filename, mode='w', encoding='utf-8')
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, encoding=self.encoding, buffering=self.buffer_size)
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            now = time.monotonic()
+            if record.levelno >= self.flush_level or now - self._last_flush >= self.flush_interval:
+                self.stream.flush()
+                self._last_flush = now
+        except Exception:
+            self.handleError(record)
+
+
+def _install_queue_handler(log_queue, level):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def setup_logging(logs_folder, log_name_prefix, level=DEFAULT_LOG_LEVEL):
+    """
+    Starts the logging subsystem in the main process.
+
+    All processes (the main process and pool workers initialized with worker_init) only put records
+    into one multiprocessing queue. A single listener thread in the main process writes them
+    to the console (plain messages) and to a buffered JSON lines file, so output of parallel
+    workers never interleaves inside a line and logging never blocks a worker on file I/O.
+
+    Returns (log_queue, listener, log_filepath). Pass log_queue and level to worker_init
+    and call shutdown_logging(listener) at the end of the script.
+    """
+    os.makedirs(logs_folder, exist_ok=True)
+    log_filename = datetime.datetime.now().strftime(f"{log_name_prefix}_%Y-%m-%d_%H-%M-%S.jsonl")
+    log_filepath = os.path.join(logs_folder, log_filename)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    file_handler = BufferedFileHandler(log_filepath)
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    log_queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler)
+    listener.start()
+
+    _install_queue_handler(log_queue, level)
+    logging.captureWarnings(True)
+    return log_queue, listener, log_filepath
+
+
+def worker_init(log_queue, level=DEFAULT_LOG_LEVEL):
+    """
+    Initializer for ProcessPoolExecutor workers: sends all records of the worker to the main process.
+    Records below the level are dropped in the worker, before they are formatted or sent.
+    """
+    _install_queue_handler(log_queue, level)
+
+
+def shutdown_logging(listener):
+    """
+    Processes the remaining records in the queue and flushes and closes the log file.
+    """
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,197 @@
+import bisect
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+# Default histogram buckets (upper bounds) for durations in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 180.0, 600.0, 3600.0)
+# Histogram buckets for response sizes in bytes
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Histogram buckets for element counts (e.g. elements per square)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+logger = logging.getLogger("pipeline_metrics")
+
+
+class Metrics:
+    """
+    In-process counters and histograms.
+
+    Every process records into its own module-level METRICS instance. Pool workers send
+    their measurements back with the result of every job (see run_with_metrics), and the
+    main process merges them, so no shared state or locks between processes are needed.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.bucket_mismatches = {} # histogram name -> observations of merged snapshots dropped for other buckets
+
+    def inc(self, name, value=1):
+        """
+        Increases a counter.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        """
+        Records one value in a histogram. The buckets of a histogram are fixed by its first observation.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = {'buckets': list(buckets), 'counts': [0] * (len(buckets) + 1),
+                         'count': 0, 'sum': 0.0, 'min': value, 'max': value}
+            self.histograms[name] = histogram
+        histogram['counts'][bisect.bisect_left(histogram['buckets'], value)] += 1
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['min'] = min(histogram['min'], value)
+        histogram['max'] = max(histogram['max'], value)
+
+    @contextmanager
+    def timer(self, name, buckets=LATENCY_BUCKETS):
+        """
+        Measures the duration of a 'with' block into a histogram (also when the block raises).
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, buckets)
+
+    def snapshot(self):
+        """
+        Returns all measurements as a plain (picklable, JSON-serializable) dictionary.
+        """
+        return {
+            'counters': dict(self.counters),
+            'histograms': {name: {**histogram, 'buckets': list(histogram['buckets']), 'counts': list(histogram['counts'])}
+                           for name, histogram in self.histograms.items()},
+        }
+
+    def drain(self):
+        """
+        Returns a snapshot and resets all measurements (used by workers after every job).
+        """
+        snapshot = self.snapshot()
+        self.counters = {}
+        self.histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        Adds the measurements of a snapshot (e.g. from a worker) to this instance.
+        A histogram whose buckets differ from the accumulated one cannot be added up: it is dropped,
+        logged once and counted in bucket_mismatches (the same name is observed with different buckets).
+        """
+        for name, value in snapshot['counters'].items():
+            self.inc(name, value)
+        for name, other in snapshot['histograms'].items():
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                self.histograms[name] = {**other, 'buckets': list(other['buckets']), 'counts': list(other['counts'])}
+                continue
+            if histogram['buckets'] != list(other['buckets']):
+                if name not in self.bucket_mismatches:
+                    logger.warning(f"Histogram '{name}' merged with buckets {list(other['buckets'])}, "
+                                   f"but it has {histogram['buckets']}. Its observations are dropped.")
+                self.bucket_mismatches[name] = self.bucket_mismatches.get(name, 0) + other['count']
+                continue
+            histogram['counts'] = [a + b for a, b in zip(histogram['counts'], other['counts'])]
+            histogram['count'] += other['count']
+            histogram['sum'] += other['sum']
+            histogram['min'] = min(histogram['min'], other['min'])
+            histogram['max'] = max(histogram['max'], other['max'])
+
+    @staticmethod
+    def _quantile(histogram, q):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls into (capped by the maximum).
+        """
+        rank = q * histogram['count']
+        cumulative = 0
+        for upper_bound, count in zip(histogram['buckets'] + [histogram['max']], histogram['counts']):
+            cumulative += count
+            if cumulative >= rank:
+                return min(upper_bound, histogram['max'])
+        return histogram['max']
+
+    def summary_lines(self):
+        """
+        Returns a human-readable summary: counters, then histograms sorted by their total (sum),
+        so the biggest consumers of time come first.
+        """
+        lines = ["Counters:"]
+        for name in sorted(self.counters):
+            lines.append(f"  {name}: {self.counters[name]}")
+        lines.append("Histograms (sorted by total):")
+        for name, histogram in sorted(self.histograms.items(), key=lambda item: item[1]['sum'], reverse=True):
+            if not histogram['count']:
+                continue
+            lines.append(f"  {name}: count={histogram['count']}, total={histogram['sum']:.2f}, "
+                         f"mean={histogram['sum'] / histogram['count']:.3f}, "
+                         f"p50<={self._quantile(histogram, 0.5):.3f}, p95<={self._quantile(histogram, 0.95):.3f}, "
+                         f"max={histogram['max']:.3f}")
+        for name, dropped in sorted(self.bucket_mismatches.items()):
+            lines.append(f"  {name}: {dropped} merged observations dropped (different buckets)")
+        return lines
+
+    def to_prometheus(self):
+        """
+        Returns the measurements in the Prometheus text exposition format.
+        """
+        lines = []
+        for name in sorted(self.counters):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {self.counters[name]}")
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for upper_bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{upper_bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{name}_sum {histogram['sum']}")
+            lines.append(f"{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, folder, name_prefix):
+        """
+        Writes the measurements to <name_prefix>.json and <name_prefix>.prom in the folder.
+        Returns the two file paths.
+        """
+        os.makedirs(folder, exist_ok=True)
+        json_filepath = os.path.join(folder, f"{name_prefix}.json")
+        prometheus_filepath = os.path.join(folder, f"{name_prefix}.prom")
+        with open(json_filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4)
+        with open(prometheus_filepath, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        return json_filepath, prometheus_filepath
+
+
+# Measurements of the current process
+METRICS = Metrics()
+
+
+def run_with_metrics(func, *args, **kwargs):
+    """
+    Runs a job in a pool worker and returns (result, metrics snapshot of the job).
+    Use collect_result in the main process to unpack it.
+    """
+    METRICS.drain() # Drop anything left over from a job that raised
+    result = func(*args, **kwargs)
+    return result, METRICS.drain()
+
+
+def collect_result(future):
+    """
+    Returns the result of a job submitted with run_with_metrics and merges its measurements
+    into the METRICS of the main process. Exceptions of the job are raised as with future.result().
+    """
+    result, snapshot = future.result()
+    METRICS.merge(snapshot)
+    return result
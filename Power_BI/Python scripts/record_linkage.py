@@ -0,0 +1,245 @@
+import logging
+import os
+import re
+import sys
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# --- Configuration ---
+SPECS_FILE = "Complete_ICE_EV_car_data.csv" # Output of Scrap_API_Auto_data.py (';' separated)
+PRICE_FOLDER = os.path.join("..", "Sources", "Compare EV vs ICE", "price")
+OUTPUT_FILE = "car_prices_linked.csv"
+
+# Minimum similarity (0-100) of a price record and a spec record to be linked; sources that only
+# name the model and trim (e.g. 'Swift VXI') can set a lower 'min_score' in PRICE_SOURCES
+MIN_SCORE = 80
+# A price record of year Y can link to specs produced from (start - tolerance) to (end + tolerance)
+YEAR_TOLERANCE = 1
+# Similarity measure: token_set_ratio ignores word order and scores 100 if one name is contained in the other
+# (e.g. '3.2 i V6 24V (263 Hp)' in 'TL III 3.2 i V6 24V (263 Hp)')
+SCORER = fuzz.token_set_ratio
+# Number of threads of rapidfuzz cdist (-1 = all cores)
+CDIST_WORKERS = -1
+
+# Brand spellings of the price datasets mapped to the brand names of auto-data.net (after normalization)
+BRAND_ALIASES = {
+    "mercedes": "mercedes benz",
+    "vw": "volkswagen",
+    "chevy": "chevrolet",
+    "land": "land rover",
+    "maruti": "maruti suzuki",
+}
+
+# Price datasets: how to get brand, name, year and price of each record
+PRICE_SOURCES = {
+    "filtred_data_with_prices": {
+        "file": "filtred_data_with_prices.csv", "brand": "Brand", "name": ["Engine name"],
+        "year": "End_of_production", "price": "Price", "currency": "EUR",
+    },
+    "car_price": {
+        "file": "Car Price.csv", "brand": "Brand", "name": ["Model"],
+        "year": "Year", "price": "Selling_Price", "currency": "INR", "min_score": 65,
+    },
+    "usa_cars": {
+        "file": "USA_cars_datasets.csv", "brand": "brand", "name": ["model"],
+        "year": "year", "price": "price", "currency": "USD", "min_score": 65,
+    },
+    "cars24": {
+        # 'Model Name' is '<year> <brand> <model>', e.g. '2017 Maruti Swift VXI'
+        "file": "cars24data.csv", "brand": None, "name": ["Model Name"],
+        "year": "Manufacturing_year", "price": "Price", "currency": "INR", "min_score": 65,
+    },
+}
+
+logger = logging.getLogger("record_linkage")
+
+
+# --- Normalization ---
+def normalize_name(text):
+    """
+    Lowercase ASCII tokens separated by single spaces: accents removed, punctuation replaced by spaces,
+    so 'Citroën C4 Grand-Picasso' and 'citroen c4 grand picasso' compare equal.
+    Decimal points inside numbers are kept ('1.6').
+    """
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    return " ".join(re.sub(r'[^a-z0-9.]+', ' ', text).split())
+
+
+def normalize_brand(brand):
+    brand_key = normalize_name(brand)
+    return BRAND_ALIASES.get(brand_key, brand_key)
+
+
+def strip_brand(name_key, brand_key):
+    """
+    Removes the brand from the beginning of a normalized name ('maruti swift vxi' -> 'swift vxi'),
+    so the brand, which is already used for blocking, does not inflate the similarity.
+    The full brand is tried before its first word ('land rover' before 'land').
+    """
+    for prefix in (brand_key, brand_key.split(" ")[0]):
+        if prefix and name_key.startswith(prefix + " "):
+            return name_key[len(prefix) + 1:]
+    return name_key
+
+
+def parse_year(value):
+    """
+    Returns the first four-digit year in the value ('March, 2015 year' -> 2015), or None.
+    0 and empty values (e.g. End_of_production of cars still produced) are None.
+    """
+    match = re.search(r'(19|20)\d{2}', str(value)) if value is not None else None
+    return int(match.group(0)) if match else None
+
+
+# --- Loading ---
+def load_specs(specs_file=SPECS_FILE):
+    """
+    Loads the scraped specs as link targets: brand_key, name_key (model + generation + engine),
+    year_from / year_to (production years, NaN if unknown) and the original key columns.
+    """
+    columns = ["Brand", "Model", "Generation_Name", "Engine_Name", "Start_of_production", "End_of_production"]
+    specs = pd.read_csv(specs_file, sep=';', quotechar='"', dtype=str, engine='c', on_bad_lines='warn',
+                        usecols=lambda col: col in columns).fillna("")
+    specs["brand_key"] = specs["Brand"].map(normalize_brand)
+    names = (specs.get("Model", "") + " " + specs.get("Generation_Name", "") + " " + specs["Engine_Name"]).map(normalize_name)
+    specs["name_key"] = [strip_brand(name, brand) for name, brand in zip(names, specs["brand_key"])]
+    specs["year_from"] = pd.to_numeric(specs.get("Start_of_production", pd.Series(index=specs.index)).map(parse_year))
+    specs["year_to"] = pd.to_numeric(specs.get("End_of_production", pd.Series(index=specs.index)).map(parse_year))
+    return specs
+
+
+def load_price_source(source_name, price_folder=PRICE_FOLDER):
+    """
+    Loads one price dataset of PRICE_SOURCES into the common form:
+    source, brand_key, name_key, year, price, currency and the original name.
+    """
+    config = PRICE_SOURCES[source_name]
+    prices = pd.read_csv(os.path.join(price_folder, config["file"]), dtype=str, encoding='utf-8',
+                         encoding_errors='replace').fillna("")
+    original_name = prices[config["name"]].agg(" ".join, axis=1).str.strip()
+    if config["brand"]:
+        brand = prices[config["brand"]]
+        name_key = original_name.map(normalize_name)
+    else:
+        # Brand is the first word of the name after the year
+        name_key = original_name.map(normalize_name).str.replace(r'^(19|20)\d{2} ', '', regex=True)
+        brand = name_key.str.split(" ").str[0]
+
+    linked = pd.DataFrame({
+        "source": source_name,
+        "brand_key": brand.map(normalize_brand),
+        "original_name": original_name,
+        "year": pd.to_numeric(prices[config["year"]].map(parse_year)),
+        "price": pd.to_numeric(prices[config["price"]], errors='coerce'),
+        "currency": config["currency"],
+    })
+    linked["name_key"] = [strip_brand(name, brand_key) for name, brand_key in zip(name_key, linked["brand_key"])]
+    return linked
+
+
+# --- Linking ---
+def link_records(records, targets, min_score=MIN_SCORE, year_tolerance=YEAR_TOLERANCE, scorer=SCORER,
+                 workers=CDIST_WORKERS):
+    """
+    Links every record (brand_key, name_key, year) to the most similar target (brand_key, name_key,
+    year_from, year_to). Only candidates of the same brand whose production years cover the year
+    (with tolerance) are compared: records are grouped into (brand, year) blocks and every block is
+    scored against its candidates with one vectorized rapidfuzz cdist call, so the work grows with
+    the block sizes, never with all record x target pairs. Unknown years do not restrict the block.
+
+    Returns a copy of records with 'target_index' (index label in targets, or None) and 'score'.
+    """
+    result = records.copy()
+    name_keys = result["name_key"].to_numpy(dtype=object)
+    target_names = targets["name_key"].to_numpy(dtype=object)
+    target_year_from = targets["year_from"].to_numpy(dtype='float64')
+    target_year_to = targets["year_to"].to_numpy(dtype='float64')
+    matched_positions = np.full(len(result), -1)
+    best_scores = np.zeros(len(result))
+
+    targets_by_brand = targets.groupby("brand_key", sort=False).indices
+    blocks = result.groupby(["brand_key", result["year"].fillna(-1)], sort=False).indices
+    for (brand_key, year), positions in blocks.items():
+        candidates = targets_by_brand.get(brand_key)
+        if candidates is None or not brand_key:
+            continue
+        if year >= 0:
+            year_from, year_to = target_year_from[candidates], target_year_to[candidates]
+            candidates = candidates[(np.isnan(year_from) | (year_from - year_tolerance <= year)) &
+                                    (np.isnan(year_to) | (year <= year_to + year_tolerance))]
+        if not len(candidates):
+            continue
+
+        # Exact names first (scraped names often match 1:1), only the rest is scored
+        candidate_names = target_names[candidates]
+        exact_lookup = {name: i for i, name in reversed(list(enumerate(candidate_names)))}
+        exact = np.array([exact_lookup.get(name, -1) for name in name_keys[positions]])
+        matched_positions[positions[exact >= 0]] = candidates[exact[exact >= 0]]
+        best_scores[positions[exact >= 0]] = 100
+        positions = positions[exact < 0]
+        if not len(positions):
+            continue
+
+        scores = process.cdist(name_keys[positions].tolist(), candidate_names.tolist(), scorer=scorer,
+                               processor=None, score_cutoff=min_score, dtype=np.uint8, workers=workers)
+        best = scores.argmax(axis=1)
+        block_scores = scores[np.arange(len(positions)), best]
+        matched = block_scores >= min_score
+        matched_positions[positions[matched]] = candidates[best[matched]]
+        best_scores[positions] = block_scores
+
+    result["target_index"] = [targets.index[position] if position >= 0 else None for position in matched_positions]
+    result["score"] = best_scores
+    return result
+
+
+def link_prices_to_specs(specs_file=SPECS_FILE, price_folder=PRICE_FOLDER, output_file=OUTPUT_FILE,
+                         sources=None, min_score=None):
+    """
+    Links the records of all price datasets to the scraped specs and saves one table:
+    the price record (source, name, year, price, currency), the linked spec key
+    (Brand, Model, Generation_Name, Engine_Name) and the similarity score.
+    min_score overrides the thresholds of all sources. Returns the linked DataFrame.
+    """
+    start_time = time.time()
+    specs = load_specs(specs_file)
+    logger.info(f"Loaded {len(specs)} spec records from '{specs_file}'.")
+
+    linked_sources = []
+    for source_name in sources or PRICE_SOURCES:
+        try:
+            prices = load_price_source(source_name, price_folder)
+        except (IOError, KeyError) as e:
+            logger.error(f"Cannot load price source '{source_name}': {e}")
+            continue
+        source_start = time.time()
+        linked = link_records(prices, specs, min_score=min_score or PRICE_SOURCES[source_name].get("min_score", MIN_SCORE))
+        matched = linked["target_index"].notna().sum()
+        logger.info(f"  {source_name}: {matched} of {len(linked)} records linked "
+                    f"({matched / len(linked) * 100 if len(linked) else 0:.1f} %) in {time.time() - source_start:.2f} s.")
+        linked_sources.append(linked)
+
+    if not linked_sources:
+        logger.warning("No price records were linked.")
+        return None
+    linked = pd.concat(linked_sources, ignore_index=True)
+    key_columns = [col for col in ["Brand", "Model", "Generation_Name", "Engine_Name"] if col in specs.columns]
+    spec_keys = specs.loc[linked["target_index"].dropna(), key_columns].set_axis(linked["target_index"].dropna().index)
+    linked = linked.join(spec_keys)
+    linked = linked.drop(columns=["target_index", "brand_key", "name_key"])
+
+    linked.to_csv(output_file, sep=';', index=False, encoding='utf-8')
+    logger.info(f"Linked prices saved to '{output_file}' in {time.time() - start_time:.2f} seconds.")
+    return linked
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    link_prices_to_specs(sys.argv[1] if len(sys.argv) > 1 else SPECS_FILE)
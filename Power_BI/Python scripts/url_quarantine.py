@@ -0,0 +1,196 @@
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+# --- Configuration ---
+QUARANTINE_FILE = "url_quarantine.sqlite" # Shared by the spec crawlers, next to their output
+QUARANTINE_REPORT_FILE = "url_quarantine_report.json"
+
+# Failure classes
+REDIRECT_LOOP = "redirect_loop"   # requests.TooManyRedirects
+EMPTY_PAGE = "empty_page"         # 200 OK, but the page has no content or not the expected element
+CLIENT_ERROR = "client_error"     # 4xx (dead or moved page)
+SERVER_ERROR = "server_error"     # 5xx and 429 after all retries
+NETWORK_ERROR = "network_error"   # Connection errors and timeouts
+
+# How long a URL is skipped after its first failure; doubled with every further failure up to MAX_RETRY_WINDOW.
+# Transient failures come back soon, pages that look dead are retried rarely.
+RETRY_WINDOWS = {
+    REDIRECT_LOOP: datetime.timedelta(days=7),
+    EMPTY_PAGE: datetime.timedelta(days=3),
+    CLIENT_ERROR: datetime.timedelta(days=14),
+    SERVER_ERROR: datetime.timedelta(hours=6),
+    NETWORK_ERROR: datetime.timedelta(hours=1),
+}
+MAX_RETRY_WINDOW = datetime.timedelta(days=90)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quarantine (
+    url           TEXT PRIMARY KEY,
+    failure_class TEXT NOT NULL,
+    failures      INTEGER NOT NULL,
+    first_failed  TEXT NOT NULL,
+    last_failed   TEXT NOT NULL,
+    retry_after   TEXT NOT NULL,
+    last_error    TEXT,
+    source        TEXT
+);
+"""
+
+
+def _now():
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+def classify_exception(error):
+    """
+    Returns the failure class of an exception raised by requests.
+    """
+    name = type(error).__name__
+    if name == "TooManyRedirects":
+        return REDIRECT_LOOP
+    response = getattr(error, "response", None)
+    if response is not None:
+        return SERVER_ERROR if response.status_code >= 500 or response.status_code == 429 else CLIENT_ERROR
+    return NETWORK_ERROR
+
+
+class UrlQuarantine:
+    """
+    Persistent store of URLs that failed, so later runs skip known-broken pages until their retry window
+    has elapsed instead of hitting them again. A URL that succeeds again is released.
+
+    The quarantined URLs are kept in memory for fast checks, every change is written to SQLite
+    immediately (an interrupted crawl keeps what it learned). Safe to use from several threads.
+    """
+    def __init__(self, path=QUARANTINE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        self.retry_after = {url: datetime.datetime.fromisoformat(retry_after)
+                            for url, retry_after in self.conn.execute("SELECT url, retry_after FROM quarantine")}
+        self.skipped = 0
+
+    def is_quarantined(self, url):
+        """
+        Returns True if the URL failed before and its retry window has not elapsed yet (counted as skipped).
+        """
+        retry_after = self.retry_after.get(url)
+        if retry_after is None or retry_after <= _now():
+            return False
+        with self.lock:
+            self.skipped += 1
+        return True
+
+    def record_failure(self, url, failure_class, error="", source=None):
+        """
+        Registers a failure of the URL and sets its next retry time (window of the class, doubled per failure).
+        """
+        now = _now()
+        with self.lock:
+            row = self.conn.execute("SELECT failures, first_failed FROM quarantine WHERE url = ?", (url,)).fetchone()
+            failures = row[0] + 1 if row else 1
+            window = min(RETRY_WINDOWS.get(failure_class, RETRY_WINDOWS[NETWORK_ERROR]) * 2 ** (failures - 1),
+                         MAX_RETRY_WINDOW)
+            retry_after = now + window
+            self.conn.execute(
+                "INSERT OR REPLACE INTO quarantine VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, failure_class, failures, row[1] if row else now.isoformat(), now.isoformat(),
+                 retry_after.isoformat(), str(error)[:500], source))
+            self.conn.commit()
+            self.retry_after[url] = retry_after
+
+    def record_success(self, url):
+        """
+        Releases a URL that works again.
+        """
+        if url not in self.retry_after:
+            return
+        with self.lock:
+            self.conn.execute("DELETE FROM quarantine WHERE url = ?", (url,))
+            self.conn.commit()
+            self.retry_after.pop(url, None)
+
+    def report(self):
+        """
+        Returns a summary: number of quarantined URLs per failure class and source, URLs skipped in this run,
+        and the list of entries ordered by number of failures.
+        """
+        now = _now().isoformat()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, failure_class, failures, first_failed, last_failed, retry_after, last_error, source "
+                "FROM quarantine ORDER BY failures DESC, url").fetchall()
+        entries = [dict(zip(["url", "failure_class", "failures", "first_failed", "last_failed", "retry_after",
+                             "last_error", "source"], row)) for row in rows]
+        by_class, by_source = {}, {}
+        for entry in entries:
+            by_class[entry["failure_class"]] = by_class.get(entry["failure_class"], 0) + 1
+            by_source[entry["source"] or ""] = by_source.get(entry["source"] or "", 0) + 1
+        return {
+            "generated_at": now,
+            "quarantined": len(entries),
+            "active": sum(1 for entry in entries if entry["retry_after"] > now),
+            "skipped_this_run": self.skipped,
+            "by_class": by_class,
+            "by_source": by_source,
+            "entries": entries,
+        }
+
+    def save_report(self, report_file=QUARANTINE_REPORT_FILE):
+        """
+        Prints a short summary and saves the full report as JSON. Returns the report.
+        """
+        report = self.report()
+        print(f"URL quarantine: {report['quarantined']} URLs ({report['active']} still waiting for retry), "
+              f"{report['skipped_this_run']} requests skipped in this run, by class: {report['by_class']}.")
+        try:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+            print(f"URL quarantine report saved to '{report_file}'.")
+        except IOError as e:
+            print(f"Error saving URL quarantine report to {report_file}: {e}")
+        return report
+
+    def release(self, failure_class=None):
+        """
+        Releases all URLs (or all URLs of one failure class), e.g. after the site was fixed. Returns their number.
+        """
+        with self.lock:
+            if failure_class:
+                cursor = self.conn.execute("DELETE FROM quarantine WHERE failure_class = ?", (failure_class,))
+            else:
+                cursor = self.conn.execute("DELETE FROM quarantine")
+            self.conn.commit()
+            self.retry_after = {url: datetime.datetime.fromisoformat(retry_after)
+                                for url, retry_after in self.conn.execute("SELECT url, retry_after FROM quarantine")}
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+if __name__ == "__main__":
+    # python url_quarantine.py [report|release [failure_class]] [quarantine_file]
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "release":
+        failure_class = sys.argv[2] if len(sys.argv) > 2 else None
+        path = sys.argv[3] if len(sys.argv) > 3 else QUARANTINE_FILE
+    else:
+        failure_class = None
+        path = sys.argv[2] if len(sys.argv) > 2 else QUARANTINE_FILE
+    if not os.path.exists(path):
+        print(f"URL quarantine '{path}' does not exist.")
+        sys.exit(0)
+    quarantine = UrlQuarantine(path)
+    if command == "release":
+        print(f"Released {quarantine.release(failure_class)} URLs.")
+    else:
+        quarantine.save_report()
+    quarantine.close()